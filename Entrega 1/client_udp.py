@@ -1,10 +1,12 @@
+import argparse
 import socket
+import time
+from path_mtu import MAX_DATAGRAM, negotiate
 
 HOST = "127.0.0.1"
 PORT = 5000
 SERVER_ADDRESS = (HOST, PORT)
 
-BUFFER_SIZE = 1024
 
 
 def choose_file():
@@ -21,7 +23,13 @@ def choose_file():
         exit()
 
 
-filename = choose_file()
+parser = argparse.ArgumentParser(description="Cliente UDP de envio e devolução de arquivos")
+parser.add_argument("--arquivo", help="arquivo a enviar, sem perguntar (para rodar sem terminal, ex.: bench_transfer.py)")
+parser.add_argument("--datagrama", type=int, default=MAX_DATAGRAM,
+                    help="maior datagrama a propor ao servidor; o tamanho usado é sondado no caminho")
+args = parser.parse_args()
+
+filename = args.arquivo or choose_file()
 
 # Cria um socket UDP (SOCK_DGRAM) usando IPv4 (AF_INET).
 client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -29,6 +37,16 @@ client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 # -------------ENVIO DO ARQUIVO -------------------------------------
 
 try:
+    # Combina com o servidor o maior datagrama que passa pelo caminho
+    started = time.monotonic()
+    datagram_size = negotiate(client_socket, SERVER_ADDRESS, args.datagrama)
+    print(f"Datagramas de até {datagram_size} bytes")
+
+    # Buffer reaproveitado em todos os envios e recebimentos, em vez de um objeto
+    # bytes novo por pedaço
+    buffer = bytearray(datagram_size)
+    view = memoryview(buffer)
+
     print(f"Enviando {filename} para o servidor")
     # Converte o nome do arquivo para bytes e envia para o servidor.
     client_socket.sendto(filename.encode(), SERVER_ADDRESS)
@@ -36,9 +54,10 @@ try:
     # Usar o "with", abre o arquivo em modo de leitura e garante que será fechado automaticamente
     with open(filename, "rb") as f:
         while True:
-            # Lê 1024 bytes do arquivo
-            chunk = f.read(BUFFER_SIZE)
-            # Envia partes do arquivo em segmentos de 1024 bytes.
+            # Lê até um datagrama do arquivo direto no buffer reaproveitado
+            nbytes = f.readinto(buffer)
+            chunk = view[:nbytes]
+            # Envia partes do arquivo em segmentos do tamanho negociado.
             client_socket.sendto(chunk, SERVER_ADDRESS)
 
             # Se não ler dados do arquivo, encerra o laço
@@ -48,24 +67,27 @@ try:
     # ---------- RECEBENDO O ARQUIVO DE VOLTA ---------------------------
 
     # Recebe o nome do arquivo que o cliente vai enviar
-    filename, _ = client_socket.recvfrom(BUFFER_SIZE)
+    filename, _ = client_socket.recvfrom(datagram_size)
 
     # cria o nome do arquivo que será salvo no cliente!
     client_filename = "client_" + filename.decode()
 
     print(f"Recebendo {client_filename} do servidor")
-    # cria um novo arquivo no modo "append" para adicionar cada pedaço de arquivo recebido ao novo arquivo criado
-    with open(client_filename, "ab") as f:
+    # cria um novo arquivo (modo "wb", que apaga o que sobrou de uma execução anterior)
+    # e adiciona cada pedaço de arquivo recebido a ele
+    with open(client_filename, "wb") as f:
         while True:
-            # recebe um pedaço do arquivo enviado pelo servidor
-            data, _ = client_socket.recvfrom(BUFFER_SIZE)
+            # recebe um pedaço do arquivo enviado pelo servidor no buffer reaproveitado
+            nbytes, _ = client_socket.recvfrom_into(buffer)
 
             # se não receber dados do cliente, encerra o laço
-            if not data:
+            if not nbytes:
                 break
 
             # adiciona a sequencia de bytes no aquivo
-            f.write(data)
+            f.write(view[:nbytes])
+
+    print(f"Arquivo recebido! Ida e volta em {time.monotonic() - started:.2f} s")
 
 except FileNotFoundError:
     print(f"Erro: O arquivo {filename} não foi encontrado.")
@@ -0,0 +1,139 @@
+import socket
+import struct
+import sys
+import time
+from contextlib import contextmanager
+
+# --- Tamanhos de datagrama ---
+BASE_DATAGRAM = 1024  # Antigo tamanho fixo: todo caminho aceita, é o ponto de partida
+MAX_DATAGRAM = 65507  # Maior carga útil de um datagrama UDP sobre IPv4
+# Patamares testados do maior para o menor (RFC 4821): MTU do loopback do Linux,
+# jumbo frames (9000) e Ethernet (1500), descontados 28 bytes de IP + UDP
+PLATEAUS = (65507, 8972, 1472)
+
+# --- Mensagens de controle: tipo (1 byte) + valor (4 bytes) ---
+# Os tipos não colidem com os seqs do RDT 3.0 (0/1) nem com os tipos do SR (0/1)
+HELLO, HELLO_ACK, PROBE, PROBE_ACK, DONE, DONE_ACK = range(0xF0, 0xF6)
+CONTROL = struct.Struct('!BI')
+
+HANDSHAKE_TIMEOUT = 1.0   # Espera pela resposta de HELLO e DONE
+HANDSHAKE_ATTEMPTS = 5
+PROBE_ATTEMPTS = 2        # Uma sonda perdida por acaso não derruba o patamar
+MIN_PROBE_TIMEOUT = 0.05  # Espera por sonda: 4 RTTs do HELLO, dentro destes limites
+MAX_PROBE_TIMEOUT = 1.0
+
+# Bit DF (não fragmentar). O módulo socket só expõe estas constantes do Linux a
+# partir do Python 3.12; nos outros sistemas a sonda mede o que chega ao par
+IS_LINUX = sys.platform.startswith("linux")
+IP_MTU_DISCOVER = getattr(socket, "IP_MTU_DISCOVER", 10 if IS_LINUX else None)
+IP_PMTUDISC_DO = getattr(socket, "IP_PMTUDISC_DO", 2)
+
+
+def parse_control(packet):
+    # Devolve (tipo, valor) de uma mensagem de controle, ou None se não for uma
+    if len(packet) < CONTROL.size or packet[0] < HELLO or packet[0] > DONE_ACK:
+        return None
+    return CONTROL.unpack_from(packet)
+
+
+@contextmanager
+def dont_fragment(sock):
+    # Com DF ligado, um datagrama maior que o MTU do caminho é descartado (ou
+    # recusado com EMSGSIZE) em vez de fragmentado, e a sonda mede o caminho de fato
+    previous = None
+    if IP_MTU_DISCOVER is not None:
+        try:
+            previous = sock.getsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER)
+            sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, IP_PMTUDISC_DO)
+        except OSError:
+            previous = None
+    try:
+        yield
+    finally:
+        if previous is not None:
+            sock.setsockopt(socket.IPPROTO_IP, IP_MTU_DISCOVER, previous)
+
+
+def request(sock, peer, packet, reply_kind, reply_value, timeout, attempts):
+    # Envia o pacote até chegar a resposta esperada (reply_value None aceita
+    # qualquer valor). Devolve (valor, rtt) ou None se o par não respondeu
+    for _ in range(attempts):
+        sock.sendto(packet, peer)
+        sent_at = time.monotonic()
+        deadline = sent_at + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sock.settimeout(remaining)
+            try:
+                data, _ = sock.recvfrom(MAX_DATAGRAM)
+            except socket.timeout:
+                break
+            reply = parse_control(data)
+            if reply and reply[0] == reply_kind and reply_value in (None, reply[1]):
+                return reply[1], time.monotonic() - sent_at
+    return None
+
+
+def probe_path(sock, peer, ceiling, timeout):
+    # Testa os patamares do maior para o menor e fica com o primeiro que o par
+    # confirmar. Sonda sem resposta (grande demais para o caminho, descartada
+    # por um firewall ou perdida) faz cair para o próximo, até o BASE_DATAGRAM
+    candidates = [ceiling] + [size for size in PLATEAUS if size < ceiling]
+    with dont_fragment(sock):
+        for size in candidates:
+            if size <= BASE_DATAGRAM:
+                break
+            probe = CONTROL.pack(PROBE, size) + bytes(size - CONTROL.size)
+            try:
+                if request(sock, peer, probe, PROBE_ACK, size, timeout, PROBE_ATTEMPTS):
+                    return size
+            except OSError:
+                # EMSGSIZE: maior que o MTU da interface ou que o caminho já conhecido
+                continue
+    return min(ceiling, BASE_DATAGRAM)
+
+
+def negotiate(sock, peer, local_max=MAX_DATAGRAM):
+    # Lado que inicia: combina o teto com o par, sonda o caminho e anuncia o
+    # tamanho escolhido. Devolve o tamanho máximo de datagrama para os dois lados
+    previous_timeout = sock.gettimeout()
+    try:
+        reply = request(sock, peer, CONTROL.pack(HELLO, local_max), HELLO_ACK, None,
+                        HANDSHAKE_TIMEOUT, HANDSHAKE_ATTEMPTS)
+        if reply is None:
+            raise TimeoutError("O par não respondeu à negociação do tamanho dos datagramas")
+        ceiling, rtt = reply
+        timeout = min(max(4 * rtt, MIN_PROBE_TIMEOUT), MAX_PROBE_TIMEOUT)
+        size = probe_path(sock, peer, ceiling, timeout)
+        if request(sock, peer, CONTROL.pack(DONE, size), DONE_ACK, size,
+                   HANDSHAKE_TIMEOUT, HANDSHAKE_ATTEMPTS) is None:
+            raise TimeoutError("O par não confirmou o tamanho dos datagramas")
+        return size
+    finally:
+        sock.settimeout(previous_timeout)
+
+
+def accept_negotiation(sock, local_max=MAX_DATAGRAM):
+    # Lado que espera: responde HELLO, sondas e DONE até chegar o primeiro pacote
+    # que não é de controle, sinal de que o par já recebeu a confirmação (o DONE_ACK
+    # pode se perder e o DONE ser repetido). Devolve (tamanho, endereço do par,
+    # primeiro pacote), que ainda precisa ser tratado por quem chamou
+    size = None
+    while True:
+        data, address = sock.recvfrom(local_max)
+        message = parse_control(data)
+        if message is None:
+            if size is not None:
+                return size, address, data
+            continue  # Sobra de uma transferência anterior: descarta
+        kind, value = message
+        if kind == HELLO:
+            sock.sendto(CONTROL.pack(HELLO_ACK, min(value, local_max)), address)
+        elif kind == PROBE:
+            # Responde com o tamanho que chegou de fato
+            sock.sendto(CONTROL.pack(PROBE_ACK, len(data)), address)
+        elif kind == DONE:
+            size = value
+            sock.sendto(CONTROL.pack(DONE_ACK, value), address)
@@ -1,10 +1,15 @@
+import argparse
 import socket
+from path_mtu import accept_negotiation
 
 HOST = "127.0.0.1"
 PORT = 5000
-SERVER_ADDRESS = (HOST, PORT)
 
-BUFFER_SIZE = 1024
+parser = argparse.ArgumentParser(description="Servidor UDP de envio e devolução de arquivos")
+parser.add_argument("--porta", type=int, default=PORT,
+                    help="porta do servidor (outra que não a 5000 para o cliente passar pelo net_emulator.py)")
+PORT = parser.parse_args().porta
+SERVER_ADDRESS = (HOST, PORT)
 
 # criando o socket do servidor
 server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -18,26 +23,34 @@ print("Aguardando um cliente se conectar...")
 try:
     # ========== RECEBENDO ARQUIVO DO CLIENTE ==========
 
-    # recebe o nome do arquivo em bytes e o endereço de quem enviou (cliente)!! necessário para retornar o arquivo
-    filename, client_address = server_socket.recvfrom(BUFFER_SIZE)
+    # responde à negociação do tamanho dos datagramas; o primeiro pacote depois dela
+    # é o nome do arquivo, junto com o endereço de quem enviou (cliente)!! necessário para retornar o arquivo
+    datagram_size, client_address, filename = accept_negotiation(server_socket)
+    print(f"Datagramas de até {datagram_size} bytes")
+
+    # Buffer reaproveitado em todos os envios e recebimentos, em vez de um objeto
+    # bytes novo por pedaço
+    buffer = bytearray(datagram_size)
+    view = memoryview(buffer)
 
     # cria o nome do arquivo que será salvo no servidor!
     server_filename = "server_" + filename.decode()
 
     print("Iniciando recepção do arquivo...")
 
-    # cria um novo arquivo no modo "append" para adicionar cada pedaço de arquivo recebido ao novo arquivo criado
-    with open(server_filename, "ab") as f:
+    # cria um novo arquivo (modo "wb", que apaga o que sobrou de uma execução anterior)
+    # e adiciona cada pedaço de arquivo recebido a ele
+    with open(server_filename, "wb") as f:
         while True:
-            # recebe um pedaço do arquivo enviado pelo cliente
-            data, client_address = server_socket.recvfrom(BUFFER_SIZE)
+            # recebe um pedaço do arquivo enviado pelo cliente no buffer reaproveitado
+            nbytes, client_address = server_socket.recvfrom_into(buffer)
 
             # se não receber dados do cliente, encerra o laço
-            if not data:
+            if not nbytes:
                 break
 
             # adiciona a sequencia de bytes no aquivo
-            f.write(data)
+            f.write(view[:nbytes])
 
     print("Arquivo recebido com sucesso pelo servidor.")
 
@@ -51,9 +64,10 @@ try:
 
     with open(server_filename, "rb") as f:
         while True:
-            # Lê 1024 bytes do arquivo
-            chunk = f.read(BUFFER_SIZE)
-            # Envia partes do arquivo em segmentos de 1024 bytes.
+            # Lê até um datagrama do arquivo direto no buffer reaproveitado
+            nbytes = f.readinto(buffer)
+            chunk = view[:nbytes]
+            # Envia partes do arquivo em segmentos do tamanho negociado.
             server_socket.sendto(chunk, client_address)
 
             # Se não ler dados do arquivo, encerra o laço
@@ -0,0 +1,282 @@
+"""
+Benchmark das transferências de arquivo: Entrega 1 (UDP puro) e Entrega 2 (RDT).
+
+Para cada combinação de tamanho de arquivo, perda, modo, janela e datagrama,
+sobe o servidor de verdade em outra porta, o net_emulator.py na porta 5000
+(com a perda e a semente da rodada) e o cliente sem terminal (--arquivo), cada
+um em um diretório temporário. Cada rodada é repetida algumas vezes com
+sementes diferentes, e a mesma semente produz sempre as mesmas perdas. Para cada
+combinação são medidos:
+
+- tempo de ida e volta (p50, p90 e p99 entre as repetições);
+- vazão: bytes que o emulador entregou, contando ACKs, cabeçalhos e
+  retransmissões;
+- goodput: o arquivo nos dois sentidos;
+- retransmissões do cliente e do servidor;
+- sobrecarga: bytes no fio além do arquivo.
+
+Os resultados vão para JSON e CSV. Com --base, são comparados com um JSON
+anterior: piora acima de --tolerancia no goodput, no tempo ou nas
+retransmissões, ou uma rodada a mais falhando, é marcada como regressão, e o
+script termina com código 1.
+
+A Entrega 1 não retransmite, então só roda sem perda. No modo fec a janela é
+o tamanho do bloco, e os pacotes de paridade entram na sobrecarga.
+
+uso: python3 bench_transfer.py [--tamanhos 1 4] [--perdas 0 0.01] [--modos rdt3 sr]
+                               [--janelas 8 32] [--datagramas 1472 65507]
+                               [--repeticoes 3] [--saida resultados] [--base base.json]
+"""
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import re
+import shlex
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+EMULATOR = os.path.join(HERE, "net_emulator.py")
+# Entrega: (pasta, servidor, cliente)
+PROGRAMS = {1: (os.path.join(HERE, os.pardir, "Entrega 1"), "server_udp.py", "client_udp.py"),
+            2: (HERE, "server_rdt.py", "client_rdt.py")}
+SERVER_PORT = 5001          # O emulador fica na 5000, para onde os clientes apontam
+FILENAME = "bench.bin"
+STARTUP_TIMEOUT = 5.0       # Segundos para servidor e emulador ficarem prontos
+KEY_FIELDS = ("entrega", "tamanho_mb", "perda", "modo", "janela", "datagrama")
+RESULT_FIELDS = KEY_FIELDS + ("execucoes", "falhas", "tempo_p50", "tempo_p90", "tempo_p99",
+                              "vazao_mbps", "goodput_mbps", "retransmissoes", "sobrecarga")
+# Métrica: True se maior é melhor. Comparadas com a base pela mediana (tempo pelo p50)
+COMPARED = {"goodput_mbps": True, "tempo_p50": False, "retransmissoes": False}
+MIN_RETRANSMISSION_DELTA = 5  # Poucas retransmissões a mais são ruído, não regressão
+
+
+def percentile(values, fraction):
+    # Percentil pelo posto mais próximo; com poucas repetições é o que dá para dizer
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(fraction * len(ordered)))) - 1]
+
+
+def wait_for(path, text, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        with open(path, encoding="utf-8", errors="replace") as f:
+            if text in f.read():
+                return
+        time.sleep(0.05)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        raise RuntimeError(f"{os.path.basename(path)} não ficou pronto:\n{f.read()[-2000:]}")
+
+
+def stop(process):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def run_once(cell, seed, args):
+    # Uma transferência completa; devolve as métricas da rodada (ok = eco idêntico ao original)
+    folder, server_script, client_script = PROGRAMS[cell["entrega"]]
+    size = int(cell["tamanho_mb"] * 1_000_000)
+    workdir = tempfile.mkdtemp(prefix="bench_transfer_")
+    processes = []
+    try:
+        for name in os.listdir(folder):
+            if name.endswith(".py"):
+                shutil.copy(os.path.join(folder, name), workdir)
+        original = random.Random(seed).randbytes(size)
+        with open(os.path.join(workdir, FILENAME), "wb") as f:
+            f.write(original)
+
+        server = [server_script, "--porta", str(SERVER_PORT)]
+        client = [client_script, "--arquivo", FILENAME, "--datagrama", str(cell["datagrama"])]
+        if cell["entrega"] == 2:
+            rdt = ["--modo", cell["modo"], "--janela", str(cell["janela"]), "--perda", "0"]
+            server += rdt
+            client += rdt + ["--compressao", args.compressao]
+        emulator = [EMULATOR, "--servidor", f"127.0.0.1:{SERVER_PORT}", "--perda", str(cell["perda"]),
+                    "--semente", str(seed)] + shlex.split(args.emulador)
+
+        logs = {role: os.path.join(workdir, f"{role}.log") for role in ("servidor", "emulador", "cliente")}
+        for role, command, ready in (("servidor", server, "escutando"), ("emulador", emulator, "Emulador:")):
+            with open(logs[role], "w") as log:
+                process = subprocess.Popen([sys.executable, "-u"] + command, cwd=workdir,
+                                           stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT)
+            processes.append(process)
+            wait_for(logs[role], ready, process)
+        with open(logs["cliente"], "w") as log:
+            try:
+                subprocess.run([sys.executable, "-u"] + client, cwd=workdir, stdin=subprocess.DEVNULL,
+                               stdout=log, stderr=subprocess.STDOUT, timeout=args.limite)
+            except subprocess.TimeoutExpired:
+                pass
+        for process in reversed(processes):
+            stop(process)  # O emulador imprime os contadores ao receber SIGTERM
+
+        text = {}
+        for role, path in logs.items():
+            with open(path, encoding="utf-8", errors="replace") as f:
+                text[role] = f.read()
+        match = re.search(r"Ida e volta em ([\d.]+) s", text["cliente"])
+        echo = os.path.join(workdir, f"client_server_{FILENAME}")
+        ok = False
+        if match is not None and os.path.exists(echo):
+            with open(echo, "rb") as f:
+                ok = f.read() == original
+        elapsed = float(match.group(1)) if match else float(args.limite)
+        wire = sum(int(n) for n in re.findall(r"(\d+) bytes entregues", text["emulador"]))
+        retransmissions = sum(int(n) for n in re.findall(r"retransmissoes=(\d+)",
+                                                           text["cliente"] + text["servidor"]))
+        return {"ok": ok, "tempo": elapsed, "retransmissoes": retransmissions,
+                "vazao_mbps": wire * 8 / elapsed / 1e6,
+                "goodput_mbps": (2 * size * 8 / elapsed / 1e6) if ok else 0.0,
+                "sobrecarga": wire / (2 * size) - 1 if size else 0.0}
+    finally:
+        for process in processes:
+            stop(process)
+        if args.manter:
+            print(f"  arquivos da rodada em {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def build_matrix(args):
+    cells = []
+    for entrega in args.entregas:
+        if entrega == 1:
+            # UDP puro: sem modo nem janela, e perda nenhuma (ele não se recupera)
+            combos = itertools.product(args.tamanhos, [loss for loss in args.perdas if loss == 0],
+                                       ["udp"], [None], args.datagramas)
+        else:
+            combos = itertools.product(args.tamanhos, args.perdas, args.modos,
+                                       args.janelas, args.datagramas)
+        for size, loss, mode, window, datagram in combos:
+            if mode == "rdt3":
+                window = 1  # Stop-and-wait: a janela não muda nada, uma rodada basta
+            cell = dict(zip(KEY_FIELDS, (entrega, size, loss, mode, window, datagram)))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def label(cell):
+    window = {"sr": f" janela {cell['janela']}", "fec": f" bloco {cell['janela']}"}.get(cell["modo"], "")
+    return (f"entrega {cell['entrega']} {cell['modo']}{window}, {cell['tamanho_mb']:g} MB, "
+            f"perda {cell['perda']:g}, datagrama {cell['datagrama']}")
+
+
+def run_matrix(cells, args):
+    results = []
+    for cell in cells:
+        runs = []
+        for repetition in range(args.repeticoes):
+            run = run_once(cell, args.semente + repetition, args)
+            runs.append(run)
+            print(f"{label(cell)} #{repetition + 1}: {run['tempo']:.2f} s, goodput {run['goodput_mbps']:.1f} Mbit/s, "
+                  f"{run['retransmissoes']} retransmissões{'' if run['ok'] else ' FALHOU'}", flush=True)
+        good = [run for run in runs if run["ok"]] or runs
+        times = [run["tempo"] for run in good]
+        results.append(dict(cell, execucoes=len(runs), falhas=sum(not run["ok"] for run in runs),
+                            tempo_p50=round(percentile(times, 0.5), 3),
+                            tempo_p90=round(percentile(times, 0.9), 3),
+                            tempo_p99=round(percentile(times, 0.99), 3),
+                            vazao_mbps=round(statistics.median([run["vazao_mbps"] for run in good]), 2),
+                            goodput_mbps=round(statistics.median([run["goodput_mbps"] for run in good]), 2),
+                            retransmissoes=statistics.median([run["retransmissoes"] for run in good]),
+                            sobrecarga=round(statistics.median([run["sobrecarga"] for run in good]), 4)))
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Devolve quantas combinações pioraram em relação à base
+    base = {tuple(entry[field] for field in KEY_FIELDS): entry for entry in baseline["resultados"]}
+    regressions = 0
+    print(f"\nComparação com a base (tolerância {tolerance:.0%}):")
+    for entry in results:
+        old = base.get(tuple(entry[field] for field in KEY_FIELDS))
+        if old is None:
+            print(f"  {label(entry)}: sem base")
+            continue
+        problems, notes = [], []
+        if entry["falhas"] > old["falhas"]:
+            problems.append(f"falhas {old['falhas']} -> {entry['falhas']}")
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old[metric], entry[metric]
+            if not before:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            if metric == "retransmissoes" and abs(after - before) < MIN_RETRANSMISSION_DELTA:
+                worse = 0
+            text = f"{metric} {before:g} -> {after:g} ({change:+.0%})"
+            if worse > tolerance:
+                problems.append(text)
+            elif worse < -tolerance:
+                notes.append(text)
+        if problems:
+            regressions += 1
+            print(f"  REGRESSÃO {label(entry)}: {'; '.join(problems)}")
+        else:
+            print(f"  ok {label(entry)}" + (f" (melhorou: {'; '.join(notes)})" if notes else ""))
+    return regressions
+
+
+def save(results, prefix, args):
+    report = {"ambiente": {"python": platform.python_version(), "sistema": platform.platform(),
+                           "cpus": os.cpu_count(), "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+                           "emulador": args.emulador, "compressao": args.compressao,
+                           "semente": args.semente},
+              "resultados": results}
+    with open(f"{prefix}.json", "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    with open(f"{prefix}.csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\nResultados em {prefix}.json e {prefix}.csv")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das transferências das Entregas 1 e 2",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--entregas", type=int, nargs="+", choices=sorted(PROGRAMS), default=[1, 2])
+    parser.add_argument("--tamanhos", type=float, nargs="+", default=[1.0, 4.0], help="tamanhos do arquivo, em MB")
+    parser.add_argument("--perdas", type=float, nargs="+", default=[0.0, 0.01], help="perda no emulador, por sentido")
+    parser.add_argument("--modos", nargs="+", choices=["rdt3", "sr", "fec"], default=["rdt3", "sr"])
+    parser.add_argument("--janelas", type=int, nargs="+", default=[8, 32],
+                        help="janelas do modo sr (pacotes de dados por bloco no modo fec)")
+    parser.add_argument("--datagramas", type=int, nargs="+", default=[1472, 65507],
+                        help="maior datagrama proposto pelo cliente")
+    parser.add_argument("--compressao", default="nenhuma", help="compressão pedida pelo cliente da Entrega 2")
+    parser.add_argument("--emulador", default="", help='outras opções do net_emulator.py, ex.: "--atraso 5 --banda 100"')
+    parser.add_argument("--repeticoes", type=int, default=3, help="rodadas por combinação, com sementes seguidas")
+    parser.add_argument("--semente", type=int, default=0, help="semente da primeira rodada")
+    parser.add_argument("--limite", type=float, default=60.0, help="segundos até uma rodada ser dada como falha")
+    parser.add_argument("--saida", default="bench_transfer", help="prefixo dos arquivos .json e .csv")
+    parser.add_argument("--base", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.15, help="piora aceita antes de marcar regressão")
+    parser.add_argument("--manter", action="store_true", help="não apaga os diretórios temporários (logs)")
+    args = parser.parse_args()
+
+    cells = build_matrix(args)
+    print(f"{len(cells)} combinações x {args.repeticoes} repetições")
+    results = run_matrix(cells, args)
+    save(results, args.saida, args)
+    if args.base:
+        with open(args.base) as f:
+            sys.exit(1 if compare(results, json.load(f), args.tolerancia) else 0)
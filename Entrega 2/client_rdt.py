@@ -1,11 +1,23 @@
+import argparse
+import os
+import random
 import socket
-from rdt_protocol import RDT3_0_Sender, RDT3_0_Receiver
+import threading
+import time
+from rdt_protocol import (create_sender, create_receiver, send_file, format_stats, DecompressingWriter,
+                          LOSS_PROBABILITY, set_loss)
+from datagram_io import BatchedSocket, DEFAULT_RCVBUF, DEFAULT_SNDBUF
+from path_mtu import MAX_DATAGRAM, negotiate
+from congestion import DUPACK_THRESHOLD
+from multistream import MAX_STREAMS, SharedFile, pack_stream_request, split_ranges
+from resume import Manifest, ResumableFile, request_resume
+from compression import CODEC_NAMES, NONE, available, codec_name
+from packet_log import LEVELS, dump_packets, setup as setup_log
 
 HOST = "127.0.0.1"
 PORT = 5000
 SERVER_ADDRESS = (HOST, PORT)
 
-BUFFER_SIZE = 1023  # Reservando apenas 1 byte para o número de sequência
 
 
 def choose_file():
@@ -22,18 +34,137 @@ def choose_file():
         exit()
 
 
-filename = choose_file()
+parser = argparse.ArgumentParser(description="Cliente de transferência de arquivos sobre RDT")
+parser.add_argument("--modo", choices=["rdt3", "sr", "fec"], default="rdt3",
+                    help="rdt3 = stop-and-wait, sr = Selective Repeat (janela deslizante), "
+                         "fec = stop-and-wait por blocos com paridade (correção de erros adiante)")
+parser.add_argument("--janela", type=int, default=8,
+                    help="tamanho da janela no modo sr; pacotes de dados por bloco no modo fec")
+parser.add_argument("--paridade", type=int, default=None,
+                    help="pacotes de paridade por bloco no modo fec (padrão: conforme a perda observada)")
+parser.add_argument("--dupacks", type=int, default=DUPACK_THRESHOLD,
+                    help="ACKs repetidos que disparam a retransmissão rápida, sem esperar o timeout")
+parser.add_argument("--rcvbuf", type=int, default=DEFAULT_RCVBUF, help="SO_RCVBUF do socket, em bytes")
+parser.add_argument("--sndbuf", type=int, default=DEFAULT_SNDBUF, help="SO_SNDBUF do socket, em bytes")
+parser.add_argument("--datagrama", type=int, default=MAX_DATAGRAM,
+                    help="maior datagrama a propor ao servidor; o tamanho usado é sondado no caminho")
+parser.add_argument("--fluxos", type=int, default=1,
+                    help=f"fluxos RDT paralelos, cada um com um trecho do arquivo (até {MAX_STREAMS})")
+parser.add_argument("--compressao", choices=list(CODEC_NAMES), default="zlib",
+                    help="algoritmo de compressão pedido ao servidor, usado nos dois sentidos se ele aceitar")
+parser.add_argument("--perda", type=float, default=LOSS_PROBABILITY,
+                    help="perda simulada nos envios (0 para deixar as perdas com o net_emulator.py)")
+parser.add_argument("--semente", type=int, default=None, help="semente da perda simulada, para repetir as mesmas perdas")
+parser.add_argument("--log", choices=list(LEVELS), default="info",
+                    help="nível das mensagens; debug mostra uma linha por pacote (custa mais que o envio)")
+parser.add_argument("--arquivo", help="arquivo a enviar, sem perguntar (para rodar sem terminal, ex.: bench_transfer.py)")
+args = parser.parse_args()
+if not 1 <= args.fluxos <= MAX_STREAMS:
+    parser.error(f"--fluxos deve estar entre 1 e {MAX_STREAMS}")
+if CODEC_NAMES[args.compressao] not in available():
+    parser.error(f"compressão indisponível neste Python: {args.compressao}")
+set_loss(args.perda, args.semente)
+setup_log(args.log)
+
+
+def transfer_parallel(filename, count):
+    # Divide o arquivo em count trechos contíguos; cada trecho vai e volta por um
+    # fluxo RDT próprio (socket, negociação e sessão no servidor só dele), e os
+    # fluxos rodam ao mesmo tempo, cada um em uma thread
+    size = os.path.getsize(filename)
+    ranges = split_ranges(size, count)
+    transfer_id = random.getrandbits(32)  # Agrupa os fluxos no servidor
+    echo = []                             # Arquivo de volta, criado pelo primeiro fluxo que souber o nome
+    echo_lock = threading.Lock()
+    results = [None] * count
+
+    def run_stream(index):
+        offset, length = ranges[index]
+        stream_socket = BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), args.rcvbuf,
+                                      args.sndbuf, datagram_size=args.datagrama)
+        try:
+            datagram_size = negotiate(stream_socket, SERVER_ADDRESS, args.datagrama)
+            rdt_sender = create_sender(stream_socket, SERVER_ADDRESS, args.modo, args.janela,
+                                       datagram_size=datagram_size, dupacks=args.dupacks,
+                                       parity=args.paridade)
+            rdt_sender.rdt_send(pack_stream_request(transfer_id, index, count, offset, length, size, filename))
+            sent = send_file(rdt_sender, filename, [(offset, length)])
+
+            rdt_receiver = create_receiver(stream_socket, args.modo, args.janela, datagram_size)
+            received_filename = rdt_receiver.rdt_rcv(SERVER_ADDRESS).decode()
+            with echo_lock:
+                if not echo:
+                    echo.append(SharedFile("client_" + received_filename, size))
+            received = rdt_receiver.rdt_rcv_file(echo[0].range(offset), SERVER_ADDRESS)
+            results[index] = (sent, received)
+        except Exception as e:
+            print(f"Cliente: Erro no fluxo {index + 1}: {e}")
+        finally:
+            stream_socket.close()
+
+    print(f"Cliente: Enviando {filename} ({size} bytes) em {count} fluxos paralelos")
+    started = time.monotonic()
+    threads = [threading.Thread(target=run_stream, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    if echo:
+        echo[0].close()
+
+    failed = [index + 1 for index, result in enumerate(results) if result != (ranges[index][1],) * 2]
+    if failed:
+        print(f"Cliente: Os fluxos {failed} não terminaram; o arquivo de volta está incompleto")
+        dump_packets(f"fluxos {failed} não terminaram")
+    else:
+        print(f"Cliente: {size} bytes enviados e recebidos de volta em {elapsed:.2f} s "
+              f"({2 * size / elapsed / 1e6:.1f} MB/s)")
+        print(f"Cliente: Arquivo recebido com sucesso: {echo[0].filename}")
+
+
+filename = args.arquivo or choose_file()
+
+if args.fluxos > 1:
+    # Cada fluxo abre o seu próprio socket
+    try:
+        transfer_parallel(filename, args.fluxos)
+    except FileNotFoundError:
+        print(f"Erro: O arquivo {filename} não foi encontrado.")
+    exit()
 
 # Cria um socket UDP (SOCK_DGRAM) usando IPv4 (AF_INET).
-client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Lê em lote todos os datagramas prontos a cada vez que o socket acorda
+client_socket = BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), args.rcvbuf, args.sndbuf,
+                              datagram_size=args.datagrama)
 
 # -------------ENVIO DO ARQUIVO USANDO RDT3.0 -------------------------------------
 
 try:
-    print(f"RDT3.0 Cliente: Iniciando protocolo RDT3.0 para envio")
+    # Combina com o servidor o maior datagrama que passa pelo caminho
+    started = time.monotonic()
+    datagram_size = negotiate(client_socket, SERVER_ADDRESS, args.datagrama)
+    print(f"Cliente: Datagramas de até {datagram_size} bytes")
+
+    # Manifesto do arquivo (tamanho, pedaços e digest). Com ele o servidor diz
+    # quais pedaços de uma tentativa anterior já tem, e nós dizemos quais
+    # pedaços do eco já recebemos; só o que falta atravessa a rede. No mesmo
+    # pedido vai o algoritmo de compressão, que o servidor aceita ou recusa
+    manifest = Manifest.from_file(filename)
+    echo_file = ResumableFile(f"client_{manifest.name}.{manifest.key}.parcial", manifest)
+    uploaded, codec = request_resume(client_socket, SERVER_ADDRESS, manifest, echo_file.have,
+                                     CODEC_NAMES[args.compressao])
+    print(f"Cliente: Compressão: {codec_name(codec)}")
+    if any(uploaded) or any(echo_file.have):
+        print(f"Cliente: Retomando: o servidor já tem {manifest.bytes_in(uploaded)} e nós já temos "
+              f"{manifest.bytes_in(echo_file.have)} de {manifest.size} bytes")
+
+    print(f"Cliente: Iniciando protocolo {args.modo} para envio")
     
-    # Cria o sender RDT3.0
-    rdt_sender = RDT3_0_Sender(client_socket, SERVER_ADDRESS)
+    # Cria o sender no modo escolhido
+    rdt_sender = create_sender(client_socket, SERVER_ADDRESS, args.modo, args.janela,
+                               datagram_size=datagram_size, dupacks=args.dupacks,
+                               parity=args.paridade)
     
     print(f"Enviando {filename} para o servidor")
     
@@ -41,29 +172,17 @@ try:
     print(f"Cliente: Enviando nome do arquivo: {filename}")
     rdt_sender.rdt_send(filename.encode())
 
-    # Usar o "with", abre o arquivo em modo de leitura e garante que será fechado automaticamente
-    with open(filename, "rb") as f:
-        while True:
-            # Lê 1024 bytes do arquivo
-            chunk = f.read(BUFFER_SIZE)
-            
-            # Se não ler os dados do arquivo, envia pacote vazio e encerra o laço
-            if not chunk:
-                print("Cliente: Enviando pacote de finalização")
-                rdt_sender.rdt_send(b'')  # Envia pacote vazio para sinalizar fim
-                break
-            
-            # Envia partes do arquivo usando RDT3.0
-            print(f"Cliente: Enviando chunk de {len(chunk)} bytes")
-            rdt_sender.rdt_send(chunk)
+    # Lê os pedaços que faltam em buffers reaproveitados e envia o pacote vazio de fim
+    sent = send_file(rdt_sender, filename, manifest.missing_ranges(uploaded), codec)
+    print(f"Cliente: {sent} bytes enviados em {rdt_sender.packets} pacotes ({format_stats(rdt_sender)})")
 
     print("Cliente: Arquivo enviado com sucesso usando RDT3.0")
 
     # ---------- RECEBENDO O ARQUIVO DE VOLTA USANDO RDT3.0 ---------------------------
     print("Cliente: Iniciando recepção")
     
-    # Cria o receiver RDT3.0
-    rdt_receiver = RDT3_0_Receiver(client_socket)
+    # Cria o receiver no mesmo modo do sender
+    rdt_receiver = create_receiver(client_socket, args.modo, args.janela, datagram_size)
 
     # Recebe o nome do arquivo que o servidor vai enviar usando RDT3.0
     filename_data = rdt_receiver.rdt_rcv(SERVER_ADDRESS)
@@ -76,22 +195,17 @@ try:
 
     print(f"Recebendo {client_filename} do servidor")
     
-    # cria um novo arquivo no modo "write binary" para escrever o arquivo recebido
-    with open(client_filename, "wb") as f:
-        while True:
-            # recebe um pedaço do arquivo usando RDT3.0
-            data = rdt_receiver.rdt_rcv(SERVER_ADDRESS)
-
-            # se não receber dados do servidor, encerra o laço
-            if not data or len(data) == 0:
-                print("Cliente: Pacote de finalização recebido")
-                break
+    # grava cada pedaço direto na sua posição do arquivo parcial (mapeado em
+    # memória); o que chegou fica salvo se a transferência cair
+    with echo_file:
+        writer = DecompressingWriter(echo_file) if codec != NONE else echo_file
+        received = rdt_receiver.rdt_rcv_file(writer, SERVER_ADDRESS)
+    print(f"Cliente: {received} bytes recebidos ({echo_file.size} descomprimidos)")
 
-            # adiciona a sequencia de bytes no arquivo
-            f.write(data)
-            print(f"Cliente: chunk de {len(data)} bytes recebido")
+    # Confere o digest do arquivo montado antes de dar a ele o nome final
+    echo_file.publish(client_filename)
 
-    print("Cliente: Arquivo recebido com sucesso!")
+    print(f"Cliente: Arquivo recebido com sucesso! Ida e volta em {time.monotonic() - started:.2f} s")
 
 except FileNotFoundError:
     print(f"Erro: O arquivo {filename} não foi encontrado.")
@@ -102,6 +216,7 @@ except Exception as e:
     print(f"Erro durante execução: {e}")
     import traceback
     traceback.print_exc()
+    dump_packets(f"erro: {e}")
 
 finally:
     client_socket.close()
@@ -0,0 +1,112 @@
+import zlib
+
+# lzma e bz2 dependem de bibliotecas que nem todo Python traz compiladas
+try:
+    import lzma
+except ImportError:
+    lzma = None
+try:
+    import bz2
+except ImportError:
+    bz2 = None
+
+# --- Algoritmos de compressão ---
+# O id vai nas mensagens de negociação e no cabeçalho de cada bloco ou
+# mensagem comprimida; NONE marca dados enviados como estão
+NONE, ZLIB, LZMA, BZ2 = range(4)
+CODEC_NAMES = {"nenhuma": NONE, "zlib": ZLIB, "lzma": LZMA, "bz2": BZ2}
+
+ZLIB_LEVEL = 6
+# Formato cru, sem o cabeçalho .xz, e dicionário do tamanho do maior bloco
+# comprimido aqui (256 kB) em vez dos MBs do padrão, alocados a cada chamada
+LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 2, "dict_size": 256 * 1024}] if lzma else None
+BZ2_LEVEL = 3  # Blocos de 300 kB: os dados chegam aqui em pedaços menores que isso
+
+# --- Quando não vale a pena comprimir ---
+MIN_SIZE = 32          # Menos que isso não compensa nem com dicionário
+SAMPLE_SIZE = 4096     # Amostra comprimida antes de um bloco grande
+SAMPLE_RATIO = 0.9     # Amostra que não encolhe 10% (JPEG, dados já comprimidos): vai como está
+
+# Erros de dados corrompidos de cada biblioteca
+DECOMPRESS_ERRORS = (zlib.error, OSError, EOFError) + ((lzma.LZMAError,) if lzma else ())
+
+
+def available():
+    # Algoritmos que este Python consegue usar
+    codecs = {NONE, ZLIB}
+    if lzma is not None:
+        codecs.add(LZMA)
+    if bz2 is not None:
+        codecs.add(BZ2)
+    return codecs
+
+
+def codec_name(codec):
+    return next(name for name, value in CODEC_NAMES.items() if value == codec)
+
+
+def negotiate_codec(requested, allowed):
+    # O que quem responde à negociação aceita: o pedido, se puder usá-lo
+    return requested if requested in allowed and requested in available() else NONE
+
+
+def worth_compressing(data):
+    # Heurística barata: dados curtos ficam como estão, e de um bloco grande só
+    # uma amostra é comprimida (zlib no nível mais rápido) para ver se encolhe
+    if len(data) < MIN_SIZE:
+        return False
+    if len(data) <= SAMPLE_SIZE:
+        return True
+    sample = data[:SAMPLE_SIZE]
+    return len(zlib.compress(sample, 1)) <= SAMPLE_RATIO * len(sample)
+
+
+def compress(codec, data, dictionary=None):
+    # Devolve (algoritmo usado, dados). Se os dados não encolherem, saem como
+    # estão, com NONE. dictionary (só zlib) é um texto conhecido pelas duas
+    # pontas que ajuda a comprimir mensagens curtas
+    if codec == NONE or not worth_compressing(data):
+        return NONE, data
+    if codec == ZLIB:
+        if dictionary is not None:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary)
+            packed = compressor.compress(data) + compressor.flush()
+        else:
+            packed = zlib.compress(data, ZLIB_LEVEL)
+    elif codec == LZMA:
+        packed = lzma.compress(data, format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+    elif codec == BZ2:
+        packed = bz2.compress(data, BZ2_LEVEL)
+    else:
+        raise ValueError(f"algoritmo de compressão desconhecido: {codec}")
+    if len(packed) >= len(data):
+        return NONE, data
+    return codec, packed
+
+
+def decompress(codec, data, max_size, dictionary=None):
+    # Inverso de compress. Nunca produz mais que max_size bytes: dados que
+    # descomprimem para mais do que isso (ou corrompidos) geram ValueError
+    if codec == NONE:
+        return data
+    try:
+        if codec == ZLIB:
+            decompressor = zlib.decompressobj(zdict=dictionary) if dictionary is not None \
+                else zlib.decompressobj()
+            raw = decompressor.decompress(data, max_size)
+            complete = decompressor.eof and not decompressor.unconsumed_tail
+        elif codec == LZMA and lzma is not None:
+            decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_RAW, filters=LZMA_FILTERS)
+            raw = decompressor.decompress(data, max_size)
+            complete = decompressor.eof
+        elif codec == BZ2 and bz2 is not None:
+            decompressor = bz2.BZ2Decompressor()
+            raw = decompressor.decompress(data, max_size)
+            complete = decompressor.eof
+        else:
+            raise ValueError(f"algoritmo de compressão indisponível: {codec}")
+    except DECOMPRESS_ERRORS as e:
+        raise ValueError(f"dados comprimidos inválidos: {e}") from e
+    if not complete:
+        raise ValueError(f"dados comprimidos incompletos ou maiores que {max_size} bytes")
+    return raw
@@ -0,0 +1,172 @@
+import select
+import socket
+import time
+from collections import deque
+
+# --- Configuração dos buffers ---
+DEFAULT_RCVBUF = 1024 * 1024  # SO_RCVBUF pedido ao kernel (Linux limita em net.core.rmem_max)
+DEFAULT_SNDBUF = 1024 * 1024  # SO_SNDBUF pedido ao kernel (Linux limita em net.core.wmem_max)
+POOL_SIZE = 64                # Datagramas lidos por vez antes de alguém consumi-los
+DATAGRAM_SIZE = 2048          # Maior datagrama aceito em cada posição do pool
+
+
+class BatchedSocket:
+    # Envolve um socket UDP para que cada vez que ele acorda todos os datagramas
+    # prontos sejam lidos de uma vez (recvfrom_into, modo não bloqueante) para um
+    # pool de buffers pré-alocados; quem chama recvfrom depois os consome sem
+    # nenhuma chamada ao sistema. Os envios que o kernel recusa por falta de
+    # espaço ficam em uma fila e são despachados juntos quando o socket volta a
+    # aceitar escrita. Imita a parte da API de socket usada pelos protocolos
+    # (sendto, sendmsg, recvfrom, recvfrom_into, settimeout, gettimeout).
+
+    def __init__(self, sock, rcvbuf=DEFAULT_RCVBUF, sndbuf=DEFAULT_SNDBUF,
+                 pool_size=POOL_SIZE, datagram_size=DATAGRAM_SIZE):
+        self.sock = sock
+        self.rcvbuf = self.set_buffer(socket.SO_RCVBUF, rcvbuf)
+        self.sndbuf = self.set_buffer(socket.SO_SNDBUF, sndbuf)
+        sock.setblocking(False)
+        self.timeout = None  # Timeout emulado de recvfrom (None = espera para sempre)
+        self.buffers = [bytearray(datagram_size) for _ in range(pool_size)]
+        self.views = [memoryview(buffer) for buffer in self.buffers]
+        self.free = list(range(pool_size))  # Posições do pool livres
+        self.pending = deque()              # (posição, tamanho, endereço) na ordem de chegada
+        self.outbox = deque()               # (dados, endereço) aguardando espaço no kernel
+        self.on_backlog = None              # Chamado quando um envio fica na fila (ex.: loop.add_writer)
+
+    def set_buffer(self, option, size):
+        # Pede o tamanho ao kernel e devolve o que ele realmente concedeu
+        if size:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, option, size)
+            except OSError:
+                pass
+        return self.sock.getsockopt(socket.SOL_SOCKET, option)
+
+    # --- Recebimento ---
+    def drain(self):
+        # Lê sem bloquear todos os datagramas prontos (até encher o pool)
+        count = 0
+        while self.free:
+            slot = self.free[-1]
+            try:
+                nbytes, address = self.sock.recvfrom_into(self.buffers[slot])
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionError:
+                # Erro ICMP de um envio anterior: só interrompe quem ainda não tem dados
+                if count or self.pending:
+                    break
+                raise
+            self.free.pop()
+            self.pending.append((slot, nbytes, address))
+            count += 1
+        return count
+
+    def wait(self, timeout=None):
+        # Espera até haver um datagrama guardado, despachando a fila de envio
+        # enquanto isso. Levanta socket.timeout se o prazo vencer
+        # Vai direto ao select: ler antes de saber se há algo pronto só gastaria
+        # uma chamada ao sistema a mais no caso comum (stop-and-wait)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.pending:
+            if self.outbox:
+                self.flush()
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            writers = [self.sock] if self.outbox else []
+            readable, _, _ = select.select([self.sock], writers, [], remaining)
+            if readable:
+                self.drain()
+            elif remaining == 0 or (remaining is not None and not writers):
+                raise socket.timeout("timed out")
+
+    def pop(self):
+        # Próximo datagrama já lido, como (bytes, endereço), ou None sem chamar o kernel
+        if not self.pending:
+            return None
+        slot, nbytes, address = self.pending.popleft()
+        data = bytes(self.views[slot][:nbytes])
+        self.free.append(slot)
+        return data, address
+
+    def recvfrom(self, bufsize):
+        self.wait(self.timeout)
+        data, address = self.pop()
+        return data[:bufsize], address
+
+    def recvfrom_into(self, buffer, nbytes=0):
+        self.wait(self.timeout)
+        slot, size, address = self.pending.popleft()
+        size = min(size, nbytes or len(buffer))
+        buffer[:size] = self.views[slot][:size]
+        self.free.append(slot)
+        return size, address
+
+    def unread(self, data, address):
+        # Devolve um datagrama para a frente da fila (ex.: lido pela negociação
+        # do tamanho dos datagramas, mas que pertence ao protocolo seguinte)
+        slot = self.free.pop()
+        self.buffers[slot][:len(data)] = data
+        self.pending.appendleft((slot, len(data), address))
+
+    # --- Envio ---
+    def sendto(self, data, address):
+        self.outbox.append((data, address))
+        self.flush()
+        return len(data)
+
+    def sendmsg(self, buffers, ancdata=(), flags=0, address=None):
+        # Cabeçalho e dados seguem separados até o kernel (ver send_parts)
+        self.outbox.append((tuple(buffers), address))
+        self.flush()
+        return sum(len(buffer) for buffer in buffers)
+
+    def flush(self):
+        # Envia em sequência tudo o que o kernel aceitar; devolve True se a fila esvaziou
+        while self.outbox:
+            data, address = self.outbox[0]
+            try:
+                if isinstance(data, tuple):
+                    self.sock.sendmsg(data, (), 0, address)
+                else:
+                    self.sock.sendto(data, address)
+            except (BlockingIOError, InterruptedError):
+                if self.on_backlog:
+                    self.on_backlog()
+                return False
+            except OSError:
+                # Erro definitivo deste envio: descarta para não travar o resto da fila
+                self.outbox.popleft()
+                raise
+            self.outbox.popleft()
+        return True
+
+    # --- Restante da API de socket ---
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def setsockopt(self, *args):
+        self.sock.setsockopt(*args)
+
+    def getsockopt(self, *args):
+        return self.sock.getsockopt(*args)
+
+    def bind(self, address):
+        self.sock.bind(address)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def getsockname(self):
+        return self.sock.getsockname()
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,94 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# --- Cache do eco ---
+ECHO_CACHE_BYTES = 256 * 1024 * 1024  # Soma dos arquivos mantidos mapeados
+
+
+class CachedFile:
+    # Um arquivo publicado, mapeado só para leitura
+    __slots__ = ("digest", "map", "view", "size", "users", "evicted")
+
+    def __init__(self, filename, digest):
+        self.digest = digest
+        self.size = os.path.getsize(filename)
+        self.map = None
+        if self.size:
+            with open(filename, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map) if self.map is not None else memoryview(b"")
+        self.users = 0        # Sessões enviando deste mapa agora
+        self.evicted = False  # Fora do cache: fecha quando o último usuário terminar
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass  # Ainda há uma fatia viva; o mapa fecha quando ela for coletada
+
+
+class EchoCache:
+    # Arquivos recém-recebidos (ou pedidos de novo), mapeados em memória para o
+    # eco sair direto do page cache, sem reler o arquivo nem copiar os pedaços.
+    # A chave é o nome publicado mais o digest do conteúdo, então um arquivo
+    # substituído por outro upload não é servido com o conteúdo antigo. Os menos
+    # usados recentemente saem quando a soma passa de max_bytes; um mapa em uso
+    # por outra sessão só é fechado quando ela termina
+
+    def __init__(self, max_bytes=ECHO_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # {nome: CachedFile}, do menos para o mais recente
+        self.size = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextmanager
+    def open(self, filename, digest, source=None):
+        # Dá o conteúdo do arquivo como memoryview enquanto durar o with. Se ele
+        # não estiver no cache, é mapeado a partir de source (por padrão, o
+        # próprio filename), que precisa ter o conteúdo do digest
+        entry = self.acquire(filename, digest, source or filename)
+        try:
+            yield entry.view
+        finally:
+            self.release(entry)
+
+    def acquire(self, filename, digest, source):
+        with self.lock:
+            entry = self.entries.get(filename)
+            if entry is not None and entry.digest == digest:
+                self.entries.move_to_end(filename)
+                self.hits += 1
+            else:
+                if entry is not None:
+                    self.evict(filename)
+                entry = CachedFile(source, digest)
+                self.misses += 1
+                if entry.size <= self.max_bytes:
+                    self.entries[filename] = entry
+                    self.size += entry.size
+                    while self.size > self.max_bytes:
+                        self.evict(next(iter(self.entries)))
+                else:
+                    entry.evicted = True  # Grande demais para o cache: serve só esta vez
+            entry.users += 1
+            return entry
+
+    def release(self, entry):
+        with self.lock:
+            entry.users -= 1
+            if entry.evicted and entry.users == 0:
+                entry.close()
+
+    def evict(self, filename):
+        entry = self.entries.pop(filename)
+        self.size -= entry.size
+        entry.evicted = True
+        if entry.users == 0:
+            entry.close()
@@ -0,0 +1,162 @@
+import struct
+from functools import lru_cache
+from math import comb
+
+# --- Correção de erros adiante (FEC): Reed-Solomon sobre GF(2^8) ---
+# Cada bloco tem n pedaços de dados e k de paridade, e quaisquer n dos n + k
+# bastam para reconstruir os dados. A paridade j é uma combinação linear dos
+# pedaços com os coeficientes da linha j de uma matriz de Cauchy, escalada
+# para que a primeira linha seja só de 1: com k = 1 a paridade é o XOR dos
+# pedaços. Toda submatriz quadrada de uma matriz de Cauchy é inversível, então
+# o código é MDS (nenhuma combinação de n pacotes recebidos fica sem solução)
+PRIMITIVE_POLYNOMIAL = 0x11D
+MAX_PACKETS = 64      # n + k por bloco (o ACK leva um mapa de 64 bits)
+MAX_PARITY = 16       # Paridade máxima escolhida automaticamente
+TARGET_FAILURE = 0.01  # Chance aceita de um bloco precisar de uma rodada de reparo
+INITIAL_LOSS = 0.01   # Perda suposta antes do primeiro ACK
+LOSS_WEIGHT = 1 / 8   # Peso de cada bloco na média da perda observada
+# Cada pedaço é codificado com o seu tamanho na frente: o último pedaço de um
+# fluxo é menor que os outros, e um pedaço reconstruído precisa saber onde acaba
+LENGTH = struct.Struct('!H')
+
+EXP = [0] * 512
+LOG = [0] * 256
+_value = 1
+for _power in range(255):
+    EXP[_power] = _value
+    LOG[_value] = _power
+    _value <<= 1
+    if _value & 0x100:
+        _value ^= PRIMITIVE_POLYNOMIAL
+for _power in range(255, 512):
+    EXP[_power] = EXP[_power - 255]
+
+
+def gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return EXP[LOG[a] + LOG[b]]
+
+
+def gf_inv(a):
+    return EXP[255 - LOG[a]]
+
+
+@lru_cache(maxsize=256)
+def mul_table(coefficient):
+    # Tabela de bytes.translate: o byte x vira coefficient * x
+    return bytes(gf_mul(coefficient, x) for x in range(256))
+
+
+@lru_cache(maxsize=256)
+def parity_matrix(n, k):
+    # Coeficientes da paridade j (linha) para o pedaço i (coluna): 1/(x_j + y_i)
+    # com x_j = n + j e y_i = i, colunas escaladas para a linha 0 ser só de 1
+    rows = [[gf_inv((n + j) ^ i) for i in range(n)] for j in range(k)]
+    if rows:
+        scale = [gf_inv(value) for value in rows[0]]
+        rows = [[gf_mul(value, factor) for value, factor in zip(row, scale)] for row in rows]
+    return tuple(tuple(row) for row in rows)
+
+
+def invert(matrix):
+    # Inversa em GF(2^8) por Gauss-Jordan (matrizes pequenas: até n x n)
+    size = len(matrix)
+    rows = [list(row) + [int(i == j) for j in range(size)] for i, row in enumerate(matrix)]
+    for column in range(size):
+        pivot = next(r for r in range(column, size) if rows[r][column])
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        factor = gf_inv(rows[column][column])
+        rows[column] = [gf_mul(value, factor) for value in rows[column]]
+        for r in range(size):
+            if r != column and rows[r][column]:
+                factor = rows[r][column]
+                rows[r] = [value ^ gf_mul(factor, pivot_value)
+                           for value, pivot_value in zip(rows[r], rows[column])]
+    return [row[size:] for row in rows]
+
+
+def combine(matrix, rows, width):
+    # Cada linha de matrix vira a soma (XOR) de rows multiplicadas pelos
+    # coeficientes dela. rows são pedaços de width bytes. A multiplicação de um
+    # pedaço inteiro é um bytes.translate e a soma é o XOR de inteiros grandes,
+    # os dois em C: mais rápido que indexar tabelas com NumPy (medido)
+    combined = []
+    for coefficients in matrix:
+        total = 0
+        for coefficient, row in zip(coefficients, rows):
+            if coefficient == 1:
+                total ^= int.from_bytes(row, "little")
+            elif coefficient:
+                total ^= int.from_bytes(row.translate(mul_table(coefficient)), "little")
+        combined.append(total.to_bytes(width, "little"))
+    return combined
+
+
+def framed(chunks, width):
+    # Pedaços com o tamanho na frente, completados com zeros até width bytes
+    return [(LENGTH.pack(len(chunk)) + bytes(chunk)).ljust(width, b"\0") for chunk in chunks]
+
+
+def encode(chunks, k):
+    # Os k pacotes de paridade de um bloco (todos do tamanho do maior pedaço + 2)
+    if not k or not chunks:
+        return []
+    width = LENGTH.size + max(len(chunk) for chunk in chunks)
+    return combine(parity_matrix(len(chunks), k), framed(chunks, width), width)
+
+
+def decode(n, k, packets):
+    # Reconstrói os n pedaços de dados a partir de quaisquer n dos n + k
+    # pacotes ({índice: carga}; de 0 a n - 1 são os dados, o resto paridade)
+    missing = [i for i in range(n) if i not in packets]
+    if not missing:
+        return [bytes(packets[i]) for i in range(n)]
+    parity = [j for j in range(k) if n + j in packets][:len(missing)]
+    if len(parity) < len(missing):
+        raise ValueError(f"bloco com {len(packets)} de {n} pacotes necessários")
+    width = len(packets[n + parity[0]])
+    known = [i for i in range(n) if i in packets]
+    matrix = parity_matrix(n, k)
+    # Tirando da paridade a parte dos pedaços recebidos, sobra um sistema
+    # quadrado nos pedaços que faltam
+    residual = combine([[matrix[j][i] for i in known] + [int(j == other) for other in parity] for j in parity],
+                       framed([packets[i] for i in known], width) + [bytes(packets[n + j]) for j in parity],
+                       width)
+    recovered = combine(invert([[matrix[j][i] for i in missing] for j in parity]), residual, width)
+    chunks = dict(zip(missing, recovered))
+    result = []
+    for i in range(n):
+        if i in packets:
+            result.append(bytes(packets[i]))
+        else:
+            length, = LENGTH.unpack_from(chunks[i])
+            result.append(chunks[i][LENGTH.size:LENGTH.size + length])
+    return result
+
+
+def block_failure(n, k, loss):
+    # Chance de mais de k dos n + k pacotes se perderem (o bloco não se reconstrói sozinho)
+    total = n + k
+    return 1 - sum(comb(total, lost) * loss ** lost * (1 - loss) ** (total - lost) for lost in range(k + 1))
+
+
+def choose_parity(n, loss, target=TARGET_FAILURE, max_parity=MAX_PARITY):
+    # Menor paridade que deixa a chance de uma rodada de reparo abaixo de target
+    max_parity = min(max_parity, MAX_PACKETS - n)
+    for k in range(max_parity + 1):
+        if block_failure(n, k, loss) <= target:
+            return k
+    return max_parity
+
+
+class LossEstimator:
+    # Perda observada: média móvel da fração de pacotes perdidos por bloco
+
+    def __init__(self, initial=INITIAL_LOSS, weight=LOSS_WEIGHT):
+        self.rate = initial
+        self.weight = weight
+
+    def update(self, sent, lost):
+        if sent:
+            self.rate += self.weight * (lost / sent - self.rate)
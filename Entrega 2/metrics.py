@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- Métricas: contadores, medidores e histogramas de latência ---
+# Tudo fica em memória, no processo, e é lido sob demanda (snapshot): registrar
+# custa um lock e uma soma em um dicionário, então as métricas podem ficar
+# sempre ligadas, ao contrário das mensagens impressas a cada pacote
+SUB_BUCKET_BITS = 4                  # 16 faixas por potência de 2: erro relativo de até 1/16
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def bucket_index(value):
+    # Faixa de um valor inteiro (em µs), no estilo do HdrHistogram: até
+    # 2 * SUB_BUCKETS cada valor tem a sua faixa; acima disso, cada potência de 2
+    # é dividida em SUB_BUCKETS faixas de mesma largura
+    if value < 2 * SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_limit(index):
+    # Maior valor (em µs) que cai na faixa index
+    if index < 2 * SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+
+class Histogram:
+    # Distribuição de durações em faixas logarítmicas: memória e custo fixos por
+    # amostra, qualquer que seja o número de amostras, e percentis com erro
+    # relativo de até 1/SUB_BUCKETS
+
+    def __init__(self):
+        self.counts = {}  # {faixa: amostras}
+        self.count = 0
+        self.total = 0    # Soma das amostras, em µs
+        self.max = 0
+
+    def record(self, seconds):
+        value = max(0, int(seconds * 1_000_000))
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        # Em µs: o limite superior da faixa que contém o percentil
+        if not self.count:
+            return 0
+        rank = max(1, round(fraction * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_limit(index), self.max)
+        return self.max
+
+    def summary(self):
+        summary = {"n": self.count, "media_ms": round(self.total / self.count / 1000, 3) if self.count else 0}
+        for fraction in PERCENTILES:
+            summary[f"p{fraction * 100:g}_ms"] = round(self.percentile(fraction) / 1000, 3)
+        summary["max_ms"] = round(self.max / 1000, 3)
+        return summary
+
+
+class Metrics:
+    # Registro das métricas de um processo. Contadores e histogramas são
+    # atualizados por quem mede; os medidores (tamanho de filas, sessões ativas)
+    # são funções lidas só quando alguém pede um snapshot
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.counters = {}    # {nome: valor}
+        self.gauges = {}      # {nome: função sem argumentos}
+        self.histograms = {}  # {nome: Histogram}
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    def gauge(self, name, read):
+        self.gauges[name] = read
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(sorted(self.counters.items()))
+            histograms = {name: self.histograms[name].summary() for name in sorted(self.histograms)}
+        # Os medidores são lidos fora do lock: eles podem tomar os locks de outras estruturas
+        gauges = {}
+        for name, read in sorted(self.gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception as exc:
+                gauges[name] = f"erro: {exc}"
+        return {"tempo_ativo_s": round(time.monotonic() - self.started, 1),
+                "contadores": counters, "medidores": gauges, "histogramas": histograms}
+
+    def format(self):
+        # Snapshot em texto, uma métrica por linha
+        snapshot = self.snapshot()
+        lines = [f"tempo ativo: {snapshot['tempo_ativo_s']} s"]
+        lines += [f"{name}: {value}" for name, value in snapshot["contadores"].items()]
+        lines += [f"{name}: {value}" for name, value in snapshot["medidores"].items()]
+        for name, summary in snapshot["histogramas"].items():
+            lines.append(f"{name}: " + ", ".join(f"{key}={value}" for key, value in summary.items()))
+        return "\n".join(lines)
+
+
+# Registro único do processo, usado pelos protocolos e pelos servidores
+METRICS = Metrics()
+
+
+def serve_http(port, host="127.0.0.1", metrics=METRICS):
+    # Porta de administração: GET devolve o snapshot em JSON (ex.: curl
+    # localhost:PORTA). Roda em uma thread própria, fora do caminho dos pacotes
+    class StatsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(metrics.snapshot(), indent=2, ensure_ascii=False).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Sem uma linha por consulta
+
+    server = ThreadingHTTPServer((host, port), StatsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
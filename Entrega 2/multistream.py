@@ -0,0 +1,108 @@
+import os
+import struct
+import threading
+from rdt_protocol import MmapFileWriter
+
+# --- Transferência em vários fluxos paralelos ---
+# Cada fluxo é uma sessão RDT comum (socket próprio, negociação própria) cuja
+# primeira mensagem, no lugar do nome do arquivo, é este cabeçalho seguido do
+# nome: marca, id da transferência, índice do fluxo, total de fluxos, início e
+# tamanho do trecho e tamanho do arquivo inteiro
+STREAM_MAGIC = b'MSTR'
+STREAM_HEADER = struct.Struct('!4sIHHQQQ')
+MAX_STREAMS = 16  # Fluxos por transferência
+
+
+def pack_stream_request(transfer_id, index, count, offset, length, size, filename):
+    return STREAM_HEADER.pack(STREAM_MAGIC, transfer_id, index, count, offset, length, size) + filename.encode()
+
+
+def parse_stream_request(data):
+    # Devolve (transfer_id, índice, total, início, tamanho, tamanho do arquivo,
+    # nome), ou None se a mensagem for só o nome de um arquivo (um fluxo único)
+    if len(data) < STREAM_HEADER.size or data[:len(STREAM_MAGIC)] != STREAM_MAGIC:
+        return None
+    _, *fields = STREAM_HEADER.unpack_from(data)
+    return (*fields, bytes(data[STREAM_HEADER.size:]).decode())
+
+
+def split_ranges(size, count):
+    # Divide size bytes em count trechos contíguos de tamanhos quase iguais: [(início, tamanho)]
+    base, extra = divmod(size, count)
+    ranges = []
+    offset = 0
+    for index in range(count):
+        length = base + (1 if index < extra else 0)
+        ranges.append((offset, length))
+        offset += length
+    return ranges
+
+
+class SharedFile:
+    # Arquivo montado por vários fluxos ao mesmo tempo. É pré-alocado com o
+    # tamanho final e mapeado uma única vez, então o mapa nunca é refeito
+    # enquanto outro fluxo escreve; cada fluxo grava pela sua RangeWriter
+
+    def __init__(self, filename, size):
+        self.filename = filename
+        self.writer = MmapFileWriter(filename, size)
+        self.lock = threading.Lock()
+
+    def range(self, offset):
+        return RangeWriter(self, offset)
+
+    def close(self):
+        self.writer.close()
+
+
+class RangeWriter:
+    # Um trecho de um SharedFile com a interface que rdt_rcv_file espera
+    # (write, write_at e size), com posições relativas ao início do trecho
+
+    def __init__(self, shared, offset):
+        self.shared = shared
+        self.offset = offset
+        self.size = 0
+
+    def write_at(self, offset, data):
+        with self.shared.lock:
+            self.shared.writer.write_at(self.offset + offset, data)
+        self.size = max(self.size, offset + len(data))
+
+    def write(self, data):
+        self.write_at(self.size, data)
+
+
+class StreamTable:
+    # Transferências em andamento no servidor, por (IP do cliente, id). O
+    # primeiro fluxo a chegar cria o arquivo parcial; quando o último termina
+    # o arquivo é publicado com o nome final, ou apagado se algum fluxo falhou
+
+    def __init__(self):
+        self.transfers = {}  # {(ip, id): [SharedFile, nome final, total, abertos, encerrados, falhou]}
+        self.lock = threading.Lock()
+
+    def join(self, key, partial_filename, final_filename, size, count):
+        with self.lock:
+            entry = self.transfers.get(key)
+            if entry is None:
+                entry = self.transfers[key] = [SharedFile(partial_filename, size), final_filename, count, 0, 0, False]
+            entry[3] += 1
+            return entry[0]
+
+    def leave(self, key, ok):
+        with self.lock:
+            entry = self.transfers[key]
+            entry[4] += 1
+            entry[5] = entry[5] or not ok
+            shared, final_filename, count, opened, closed, failed = entry
+            # Com uma falha, basta os fluxos já abertos terminarem para descartar
+            if closed < count and not (failed and closed == opened):
+                return None
+            del self.transfers[key]
+        shared.close()
+        if failed:
+            os.remove(shared.filename)
+            return None
+        os.replace(shared.filename, final_filename)
+        return final_filename
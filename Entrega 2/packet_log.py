@@ -0,0 +1,135 @@
+import atexit
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import deque
+
+# --- Registro de eventos: níveis, formatação preguiçosa e anel de pacotes ---
+# Imprimir uma linha por pacote no terminal custa mais que o próprio envio.
+# As mensagens agora passam por LOG, que descarta na hora o que está abaixo do
+# nível e só formata o texto na thread de escrita, fora do caminho dos pacotes.
+# Cada pacote também vira um evento em RING, um anel em memória com os últimos
+# eventos, gravado em arquivo quando algo dá errado ou ao receber SIGUSR1
+DEBUG = 10    # Uma linha por pacote
+INFO = 20     # Andamento da transferência
+WARNING = 30
+ERROR = 40
+LEVELS = {"debug": DEBUG, "info": INFO, "aviso": WARNING, "erro": ERROR}
+RING_SIZE = 8192  # Eventos de pacote guardados (os mais antigos saem primeiro)
+
+
+class Logger:
+    # Mensagens com nível e formatação preguiçosa: log(nível, "seq=%d", seq)
+    # só guarda o modelo e os argumentos; o texto é montado e escrito por uma
+    # thread própria, que esvazia a fila de uma vez a cada acordar
+
+    def __init__(self, level=INFO, stream=None):
+        self.level = level
+        self.stream = stream
+        self.pending = queue.Queue()
+        self.writer = None
+        self.writer_lock = threading.Lock()
+
+    def log(self, level, template, *args):
+        if level < self.level:
+            return
+        if self.writer is None:
+            self.start()
+        self.pending.put((template, args))
+
+    def debug(self, template, *args):
+        self.log(DEBUG, template, *args)
+
+    def info(self, template, *args):
+        self.log(INFO, template, *args)
+
+    def warning(self, template, *args):
+        self.log(WARNING, template, *args)
+
+    def error(self, template, *args):
+        self.log(ERROR, template, *args)
+
+    def start(self):
+        with self.writer_lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.write_forever, name="log", daemon=True)
+                self.writer.start()
+
+    def write_forever(self):
+        while True:
+            lines = [self.pending.get()]
+            # O que mais estiver na fila sai junto, em uma única escrita
+            while True:
+                try:
+                    lines.append(self.pending.get_nowait())
+                except queue.Empty:
+                    break
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("".join((template % args if args else template) + "\n" for template, args in lines))
+                stream.flush()
+            except Exception as exc:
+                sys.stderr.write(f"Log: falha ao escrever: {exc}\n")
+            finally:
+                for _ in lines:
+                    self.pending.task_done()
+
+    def flush(self):
+        # Espera a thread de escrita esvaziar a fila
+        if self.writer is not None:
+            self.pending.join()
+
+
+class PacketRing:
+    # Os últimos eventos de pacote: (instante, direção, seq, tamanho, resultado,
+    # endereço). deque.append é atômico, então o registro não precisa de lock
+
+    def __init__(self, size=RING_SIZE):
+        self.events = deque(maxlen=size)
+
+    def record(self, direction, seq, size, outcome, address=None):
+        self.events.append((time.monotonic(), direction, seq, size, outcome, address))
+
+    def dump(self, filename=None, reason=""):
+        # Grava os eventos em um arquivo (com o horário de cada um) e devolve o nome
+        filename = filename or f"pacotes_{os.getpid()}.log"
+        events = list(self.events)
+        offset = time.time() - time.monotonic()
+        with open(filename, "w") as f:
+            f.write(f"# {len(events)} eventos de pacote{': ' + reason if reason else ''}\n")
+            f.write("# horario direcao seq tamanho resultado endereco\n")
+            for moment, direction, seq, size, outcome, address in events:
+                clock = time.strftime("%H:%M:%S", time.localtime(moment + offset))
+                fraction = f"{(moment + offset) % 1:.6f}"[1:]
+                peer = f"{address[0]}:{address[1]}" if address else "-"
+                f.write(f"{clock}{fraction} {direction} {'-' if seq is None else seq} {size} {outcome} {peer}\n")
+        return filename
+
+
+LOG = Logger()
+RING = PacketRing()
+
+
+def dump_packets(reason):
+    # Grava o anel e avisa onde ele ficou (em caso de erro ou de sinal). O aviso
+    # vai direto para stderr, sem passar pela fila: um sinal pode chegar com a
+    # thread principal no meio de um LOG.log, segurando o lock da fila
+    try:
+        filename = RING.dump(reason=reason)
+    except OSError as exc:
+        sys.stderr.write(f"Log: não foi possível gravar os eventos de pacote: {exc}\n")
+        return None
+    sys.stderr.write(f"Log: últimos {len(RING.events)} eventos de pacote gravados em {filename} ({reason})\n")
+    return filename
+
+
+def setup(level_name="info"):
+    # Nível das mensagens, SIGUSR1 para gravar o anel a qualquer momento e
+    # escrita do que estiver pendente ao sair
+    LOG.level = LEVELS[level_name]
+    if hasattr(signal, "SIGUSR1"):  # Não existe no Windows
+        signal.signal(signal.SIGUSR1, lambda signum, frame: dump_packets("SIGUSR1"))
+    atexit.register(LOG.flush)
@@ -1,34 +1,77 @@
+import os
 import socket
 import time
 import struct
 import random 
+import mmap
+from collections import deque
+from rdt_timer import INITIAL_RTO, RtoEstimator, RetransmissionTimer
+from path_mtu import BASE_DATAGRAM
+from compression import NONE, compress, decompress
+from congestion import CongestionController, DUPACK_THRESHOLD
+from fec import LENGTH, MAX_PACKETS, MAX_PARITY, LossEstimator, choose_parity, decode, encode
+from metrics import METRICS
+from packet_log import LOG, RING
 
 # --- Simulação do canal não confiável ---
 LOSS_PROBABILITY = 0.005
+# Gerador próprio da perda simulada: com uma semente, as perdas se repetem
+LOSS_RNG = random.Random()
+
+def set_loss(probability, seed=None):
+    # Para os experimentos com o emulador de rede (net_emulator.py), em geral com probability = 0
+    global LOSS_PROBABILITY
+    LOSS_PROBABILITY = probability
+    LOSS_RNG.seed(seed)
 
 def udt_send_with_loss( socket_obj, packet, address):
-    if random.random() < LOSS_PROBABILITY:
-        print(f"Simulação de perda: Pacote perdido")
+    if LOSS_RNG.random() < LOSS_PROBABILITY:
+        LOG.debug("Simulação de perda: Pacote perdido")
+        RING.record("saida", None, packet_size(packet), "perdido", address)
         # Não fazemos nada, o pacote simplesmente não é enviado
+    elif isinstance(packet, tuple):
+        send_parts(socket_obj, packet, address)
     else:
         socket_obj.sendto(packet, address)
 
+def packet_size(packet):
+    return sum(len(part) for part in packet) if isinstance(packet, tuple) else len(packet)
+
+# sendmsg não existe em todas as plataformas (ex.: Windows)
+HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+def send_parts(socket_obj, parts, address):
+    # Scatter-gather: o kernel junta cabeçalho e dados, sem concatenar em Python
+    if HAS_SENDMSG:
+        socket_obj.sendmsg(parts, (), 0, address)
+    else:
+        socket_obj.sendto(b"".join(parts), address)
+
 class RDT3_0_Sender:
-    def __init__(self, socket_obj, server_address, timeout=2.0):
+    def __init__(self, socket_obj, server_address, timeout=INITIAL_RTO, rto=None,
+                 datagram_size=BASE_DATAGRAM, dupacks=DUPACK_THRESHOLD):
         self.socket = socket_obj
         self.server_address = server_address
-        self.timeout = timeout
+        # Maior carga útil por pacote (1 byte reservado para o seq_num), a partir
+        # do tamanho de datagrama negociado com o par
+        self.max_data = datagram_size - 1
+        # O timeout deixa de ser fixo: é estimado a partir do RTT medido
+        self.rto = rto or RtoEstimator(initial_rto=timeout)
+        self.timer = RetransmissionTimer()
         self.sndpkt = None
         self.seq_num = 0  # Inicia com número de sequência 0
-        self.timer_start = None
+        self.packets = 0  # Pacotes enviados, sem contar retransmissões
+        self.retransmissions = 0
+        # ACKs repetidos do pacote anterior que denunciam a perda do atual
+        self.dupacks = dupacks
         
     def make_pkt(self, seq, data):
         # Formato: seq_num (1 byte) + data
-        # Limita dados a 1023 bytes para deixar espaço para cabeçalho
-        if len(data) > 1023:
-            data = data[:1023]
-        pkt = struct.pack('!B', seq) + data
-        return pkt
+        # Limita os dados para deixar espaço para cabeçalho
+        if len(data) > self.max_data:
+            data = data[:self.max_data]
+        # Cabeçalho e dados ficam separados: enviados juntos por send_parts, sem cópia
+        return (struct.pack('!B', seq), data)
     
     def extract_seq(self, pkt):
         if len(pkt) < 1:
@@ -40,73 +83,115 @@ class RDT3_0_Sender:
         return seq == expected_seq
     
     def start_timer(self):
-        self.timer_start = time.time()
+        self.timer.start(self.seq_num, self.rto.timeout)
     
     def stop_timer(self):
-        self.timer_start = None
+        self.timer.cancel(self.seq_num)
     
     def is_timeout(self):
-        if self.timer_start is None:
-            return False
-        return (time.time() - self.timer_start) >= self.timeout
+        return self.timer.time_left() == 0
     
     def rdt_send(self, data):
-        print(f"RDT3.0 Sender: Enviando dados com seq={self.seq_num}")
+        LOG.debug("RDT3.0 Sender: Enviando dados com seq=%d", self.seq_num)
         
         # Estado: Esperar chamada 0 de cima (ou 1 de cima)
         # make_pkt(seq_num, data)
         self.sndpkt = self.make_pkt(self.seq_num, data)
+        self.packets += 1
+        RING.record("saida", self.seq_num, len(self.sndpkt[1]), "enviado", self.server_address)
+        METRICS.incr("rdt.pacotes_enviados")
         
         # udt_send(sndpkt)
         #self.socket.sendto(self.sndpkt, self.server_address)
         udt_send_with_loss(self.socket, self.sndpkt, self.server_address)
+        sent_at = time.monotonic()
+        last_sent = sent_at   # Último envio do pacote, contando as retransmissões
+        retransmitted = False
+        duplicate_acks = 0
         
         # start_timer
         self.start_timer()
         
         # Estado: Esperar ACK
         while True:
+            if self.is_timeout():
+                LOG.debug("RDT3.0 Sender: Timeout! Reenviando pacote seq=%d", self.seq_num)
+                RING.record("saida", self.seq_num, len(self.sndpkt[1]), "timeout", self.server_address)
+                # Dobra o RTO e reenvia o pacote
+                self.rto.backoff()
+                #self.socket.sendto(self.sndpkt, self.server_address)
+                udt_send_with_loss(self.socket, self.sndpkt, self.server_address)
+                last_sent = time.monotonic()
+                retransmitted = True
+                self.retransmissions += 1
+                METRICS.incr("rdt.timeouts")
+                METRICS.incr("rdt.retransmissoes")
+                # Reinicia o timer
+                self.start_timer()
+                continue
+
             try:
-                # Configura timeout no socket
-                self.socket.settimeout(0.1)  # Timeout curto para verificar periodicamente
+                # Dorme só até o prazo do timer, sem acordar periodicamente
+                self.socket.settimeout(self.timer.time_left())
                 
                 # rdt_rcv(rcvpkt)
                 rcvpkt, addr = self.socket.recvfrom(1024)
                 
-                print(f"Sender: ACK recebido de {addr}")
+                LOG.debug("Sender: ACK recebido de %s", addr)
                 
                 # Verifica se é ACK correto (sem corrupt/notcorrupt - assumimos UDP checksum)
                 if self.has_seq(rcvpkt, self.seq_num):
-                    print(f"Sender: ACK correto para seq={self.seq_num}")
+                    LOG.debug("Sender: ACK correto para seq=%d", self.seq_num)
+                    RING.record("entrada", self.seq_num, len(rcvpkt), "ack", addr)
+                    # Regra de Karn: só mede o RTT de pacotes não retransmitidos
+                    if not retransmitted:
+                        rtt = time.monotonic() - sent_at
+                        self.rto.sample(rtt)
+                        METRICS.observe("rdt.rtt", rtt)
                     # stop_timer
                     self.stop_timer()
                     # Alterna número de sequência
                     self.seq_num = 1 - self.seq_num
                     break
                 else:
-                    print(f"Sender: ACK incorreto, esperando seq={self.seq_num}")
+                    LOG.debug("Sender: ACK incorreto, esperando seq=%d", self.seq_num)
+                    RING.record("entrada", self.extract_seq(rcvpkt), len(rcvpkt), "ack_incorreto", addr)
+                    METRICS.incr("rdt.acks_incorretos")
+                    # O receptor repete o ACK do pacote anterior a cada pacote que não
+                    # é o esperado: com dupacks desses, o atual é dado como perdido e
+                    # reenviado sem esperar o timeout, no máximo uma vez por RTT
+                    if self.has_seq(rcvpkt, 1 - self.seq_num):
+                        duplicate_acks += 1
+                    if duplicate_acks >= self.dupacks and not self.rto.within_rtt(last_sent):
+                        LOG.debug("RDT3.0 Sender: Retransmissão rápida do pacote seq=%d", self.seq_num)
+                        RING.record("saida", self.seq_num, len(self.sndpkt[1]), "rapida", self.server_address)
+                        udt_send_with_loss(self.socket, self.sndpkt, self.server_address)
+                        last_sent = time.monotonic()
+                        retransmitted = True
+                        duplicate_acks = 0
+                        self.retransmissions += 1
+                        METRICS.incr("rdt.retransmissoes")
+                        METRICS.incr("rdt.retransmissoes_rapidas")
+                        self.start_timer()
                     # Continua esperando ACK correto
                     
             except socket.timeout:
-                # Verifica se houve timeout
-                if self.is_timeout():
-                    print(f"RDT3.0 Sender: Timeout! Reenviando pacote seq={self.seq_num}")
-                    # Reenvia o pacote
-                    #self.socket.sendto(self.sndpkt, self.server_address)
-                    udt_send_with_loss(self.socket, self.sndpkt, self.server_address)
-                    # Reinicia o timer
-                    self.start_timer()
-                # Continua o loop
+                # O timer venceu; a retransmissão acontece no início do laço
                 continue
         
         # Restaura socket para modo bloqueante
         self.socket.settimeout(None)
 
+    def stats(self):
+        return {"pacotes": self.packets, "retransmissoes": self.retransmissions}
+
 class RDT3_0_Receiver:
-    def __init__(self, socket_obj):
+    def __init__(self, socket_obj, datagram_size=BASE_DATAGRAM):
         self.socket = socket_obj
+        self.datagram_size = datagram_size
         self.expected_seq = 0  # Inicia esperando sequência 0
         self.sndpkt = None
+        self.peer_address = None  # Endereço de quem enviou o último pacote entregue
         
     def make_pkt(self, seq, data=b''):
         # Formato: seq_num (1 byte) + data
@@ -132,27 +217,30 @@ class RDT3_0_Receiver:
     
     def rdt_rcv(self, client_address=None):
         while True:
-            print(f"Receiver: Esperando pacote seq={self.expected_seq}")
+            LOG.debug("Receiver: Esperando pacote seq=%d", self.expected_seq)
             
             # Estado: Esperar 0 de baixo (ou 1 de baixo)
             # rdt_rcv(rcvpkt)
-            rcvpkt, addr = self.socket.recvfrom(1024)
+            rcvpkt, addr = self.socket.recvfrom(self.datagram_size)
             
             # Se client_address não foi fornecido, usa o endereço de quem enviou
             if client_address is None:
                 client_address = addr
             
-            print(f"Receiver: Pacote recebido de {addr}")
+            LOG.debug("Receiver: Pacote recebido de %s", addr)
             
             # Verifica se é o pacote esperado (sem corrupt/notcorrupt - assumimos UDP checksum)
             if self.has_seq(rcvpkt, self.expected_seq):
-                print(f"Receiver: Pacote correto seq={self.expected_seq}")
+                LOG.debug("Receiver: Pacote correto seq=%d", self.expected_seq)
+                RING.record("entrada", self.expected_seq, len(rcvpkt), "recebido", addr)
+                METRICS.incr("rdt.pacotes_recebidos")
                 
                 # extract(rcvpkt, data)
                 data = self.extract_data(rcvpkt)
                 
                 # deliver_data(data)
                 delivered_data = self.deliver_data(data)
+                self.peer_address = client_address
                 
                 # sndpkt = make_pkt(ACK, expected_seq)
                 self.sndpkt = self.make_pkt(self.expected_seq, b'')
@@ -160,7 +248,7 @@ class RDT3_0_Receiver:
                 # udt_send(sndpkt)
                 #self.socket.sendto(self.sndpkt, client_address)
                 udt_send_with_loss(self.socket, self.sndpkt, client_address)
-                print(f"Receiver: ACK enviado para seq={self.expected_seq}")
+                LOG.debug("Receiver: ACK enviado para seq=%d", self.expected_seq)
                 
                 # Alterna número de sequência esperado
                 self.expected_seq = 1 - self.expected_seq
@@ -168,7 +256,9 @@ class RDT3_0_Receiver:
                 return delivered_data
                 
             else:
-                print(f"Receiver: Pacote incorreto, esperava seq={self.expected_seq}")
+                LOG.debug("Receiver: Pacote incorreto, esperava seq=%d", self.expected_seq)
+                RING.record("entrada", self.extract_seq(rcvpkt), len(rcvpkt), "duplicado", addr)
+                METRICS.incr("rdt.duplicados")
                 
                 # sndpkt = make_pkt(ACK, 1-expected_seq)
                 wrong_seq = 1 - self.expected_seq
@@ -177,7 +267,960 @@ class RDT3_0_Receiver:
                 # udt_send(sndpkt)
                 #self.socket.sendto(self.sndpkt, client_address)
                 udt_send_with_loss(self.socket, self.sndpkt, client_address)
-                print(f"Receiver: ACK reenviado para seq={wrong_seq}")
+                LOG.debug("Receiver: ACK reenviado para seq=%d", wrong_seq)
                 
                 # Continua esperando o pacote correto
                 continue
+
+
+    def rdt_rcv_file(self, writer, client_address=None):
+        # Como rdt_rcv, mas até o pacote vazio de fim: cada pacote é recebido em um
+        # buffer reaproveitado e os dados vão direto para o arquivo mapeado (writer)
+        buffer = bytearray(self.datagram_size)
+        view = memoryview(buffer)
+        while True:
+            nbytes, addr = self.socket.recvfrom_into(buffer)
+            if nbytes < 1:
+                continue
+            if client_address is None:
+                client_address = addr
+
+            if buffer[0] == self.expected_seq:
+                METRICS.incr("rdt.pacotes_recebidos")
+                RING.record("entrada", buffer[0], nbytes, "recebido", addr)
+                udt_send_with_loss(self.socket, self.make_pkt(self.expected_seq, b''), client_address)
+                self.peer_address = client_address
+                self.expected_seq = 1 - self.expected_seq
+                # Pacote só com o cabeçalho: fim do arquivo
+                if nbytes == 1:
+                    return writer.size
+                writer.write(view[1:nbytes])
+            else:
+                # Duplicado: reconhece de novo o último pacote entregue
+                METRICS.incr("rdt.duplicados")
+                RING.record("entrada", buffer[0], nbytes, "duplicado", addr)
+                udt_send_with_loss(self.socket, self.make_pkt(1 - self.expected_seq, b''), client_address)
+
+# --- Selective Repeat (janela deslizante) ---
+# Cabeçalho: tipo (1 byte) + seq_num (4 bytes). Com 32 bits de sequência
+# vários pacotes podem ficar em trânsito ao mesmo tempo sem ambiguidade.
+# O ACK é cumulativo: leva o próximo seq que o receptor espera (todos os
+# anteriores chegaram), a borda da janela do receptor (o primeiro seq que ele
+# ainda não tem espaço para aceitar, controle de fluxo) e um mapa SACK de 64
+# bits com os pacotes que chegaram depois do que falta (bit i = seq + 1 + i)
+SR_DATA = 0
+SR_ACK = 1
+SR_HEADER = struct.Struct('!BI')
+SR_ACK_HEADER = struct.Struct('!BIIQ')
+SACK_BITS = 64
+SR_MAX_RETRIES = 20  # Retransmissões de um mesmo pacote antes de desistir
+SR_FIN_RETRIES = 5   # O par pode já ter encerrado após receber o FIN
+# ACKs atrasados: pacotes em ordem são confirmados juntos, a cada ACK_EVERY ou
+# depois de ACK_DELAY (bem abaixo do RTO mínimo, para não provocar timeouts)
+ACK_EVERY = 2
+ACK_DELAY = 0.005
+
+
+class SR_Sender:
+    def __init__(self, socket_obj, server_address, window_size=8, timeout=INITIAL_RTO, rto=None,
+                 peer_last_seq=None, datagram_size=BASE_DATAGRAM, dupacks=DUPACK_THRESHOLD):
+        self.socket = socket_obj
+        self.server_address = server_address
+        self.window_size = window_size
+        self.max_data = datagram_size - SR_HEADER.size
+        # Último seq do fluxo que o par nos enviou antes (None se não houve)
+        self.peer_last_seq = peer_last_seq
+        self.rto = rto or RtoEstimator(initial_rto=timeout)
+        self.timer = RetransmissionTimer()  # Um prazo por pacote em trânsito
+        self.base = 0      # Pacote mais antigo ainda sem ACK
+        self.next_seq = 0  # Próximo número de sequência a ser usado
+        # Pacotes em trânsito: {seq: [pacote, instante do último envio, retransmissões]}
+        self.unacked = {}
+        self.packets = 0  # Pacotes enviados, sem contar retransmissões
+        self.retransmissions = 0
+        # Quantos pacotes podem estar em trânsito: o menor entre a janela de
+        # congestionamento (cc), a borda anunciada pelo receptor e window_size
+        self.cc = CongestionController(window_size)
+        self.peer_edge = window_size  # Antes do primeiro ACK: a janela inteira do receptor
+        self.dupacks = dupacks        # Pacotes posteriores confirmados que denunciam a perda do base
+
+    def make_pkt(self, seq, data):
+        if len(data) > self.max_data:
+            data = data[:self.max_data]
+        # (cabeçalho, dados): os dados podem ser um memoryview do buffer de leitura
+        return (SR_HEADER.pack(SR_DATA, seq), data)
+
+    @staticmethod
+    def is_fin(pkt):
+        return len(pkt[1]) == 0
+
+    def can_send(self):
+        if self.next_seq >= self.base + self.window_size:
+            return False
+        # Sem nada em trânsito sempre sai um pacote, mesmo com a janela do
+        # receptor fechada: é ele que traz o ACK com a janela reaberta
+        return not self.unacked or (self.next_seq < self.peer_edge and len(self.unacked) < self.cc.window)
+
+    def rdt_send(self, data):
+        # Só bloqueia enquanto a janela estiver cheia ou até a vez do pacote no
+        # espaçamento ao longo do RTT; os ACKs continuam sendo tratados
+        paced = False
+        while True:
+            if not self.can_send():
+                self.wait_event()
+                continue
+            delay = self.cc.pacing_delay(time.monotonic())
+            if delay <= 0:
+                break
+            paced = True
+            self.wait_event(delay)
+        if paced:
+            self.cc.paced += 1
+
+        LOG.debug("SR Sender: Enviando dados com seq=%d", self.next_seq)
+        pkt = self.make_pkt(self.next_seq, data)
+        RING.record("saida", self.next_seq, len(pkt[1]), "enviado", self.server_address)
+        udt_send_with_loss(self.socket, pkt, self.server_address)
+        now = time.monotonic()
+        self.unacked[self.next_seq] = [pkt, now, 0]
+        self.timer.start(self.next_seq, self.rto.timeout)
+        self.cc.on_send(self.rto.srtt, now)
+        self.next_seq += 1
+        self.packets += 1
+        METRICS.incr("rdt.pacotes_enviados")
+
+        # Pacote vazio sinaliza fim: espera todos os ACKs antes de retornar
+        if not data:
+            self.flush()
+
+    def flush(self):
+        try:
+            while self.unacked:
+                self.wait_event()
+        finally:
+            # Restaura socket para modo bloqueante
+            self.socket.settimeout(None)
+
+    def wait_event(self, max_wait=None):
+        # Dorme até chegar um pacote, vencer o timer mais próximo ou passar max_wait
+        time_left = self.timer.time_left()
+        if time_left == 0:
+            self.retransmit_expired()
+            return
+        if max_wait is not None and (time_left is None or max_wait < time_left):
+            time_left = max_wait
+        self.socket.settimeout(time_left)
+        try:
+            rcvpkt, addr = self.socket.recvfrom(1024)
+        except socket.timeout:
+            self.retransmit_expired()
+            return
+        except ConnectionRefusedError:
+            # O par fechou o socket; se só falta o FIN, a transferência acabou
+            if self.only_fin_pending():
+                self.finish()
+                return
+            raise
+        self.handle_pkt(rcvpkt, addr)
+
+    def handle_pkt(self, rcvpkt, addr):
+        if len(rcvpkt) < SR_HEADER.size:
+            return
+        kind, seq = SR_HEADER.unpack_from(rcvpkt)
+
+        if kind == SR_DATA:
+            # Dado atrasado do fluxo anterior do par (ex.: FIN retransmitido
+            # porque nosso ACK se perdeu): reconhece de novo para liberá-lo.
+            # Qualquer outro dado já é do próximo fluxo do par: fica sem ACK
+            # para ser retransmitido quando o nosso receptor estiver ouvindo
+            if self.peer_last_seq is not None and seq <= self.peer_last_seq:
+                udt_send_with_loss(self.socket, SR_ACK_HEADER.pack(SR_ACK, seq + 1, seq + 1, 0), addr)
+            return
+        if kind != SR_ACK or len(rcvpkt) < SR_ACK_HEADER.size:
+            return  # Controle atrasado da negociação do tamanho dos datagramas
+        _, cumulative, edge, sack = SR_ACK_HEADER.unpack_from(rcvpkt)
+        # A borda só avança: um ACK atrasado não fecha a janela de novo
+        self.peer_edge = max(self.peer_edge, edge)
+
+        # Confirmados: tudo abaixo do ACK cumulativo e os marcados no mapa SACK
+        acked = [seq for seq in self.unacked
+                 if seq < cumulative or (seq > cumulative and sack >> (seq - cumulative - 1) & 1)]
+        sent_at = None
+        for seq in sorted(acked):
+            entry = self.unacked.pop(seq)
+            LOG.debug("SR Sender: ACK recebido para seq=%d", seq)
+            RING.record("entrada", seq, len(rcvpkt), "ack", addr)
+            self.timer.cancel(seq)
+            self.cc.on_ack(seq)
+            # Regra de Karn: só mede o RTT de pacotes não retransmitidos; de um
+            # ACK que confirma vários, só o do pacote enviado por último vale
+            if entry[2] == 0 and (sent_at is None or entry[1] > sent_at):
+                sent_at = entry[1]
+        if sent_at is not None:
+            rtt = time.monotonic() - sent_at
+            self.rto.sample(rtt)
+            METRICS.observe("rdt.rtt", rtt)
+        # Avança a base da janela até o primeiro pacote sem ACK
+        while self.base < self.next_seq and self.base not in self.unacked:
+            self.base += 1
+        if self.base not in self.unacked:
+            return
+        # O mais antigo segue sem ACK e dupacks posteriores já foram confirmados
+        # (pelo SACK): ele é dado como perdido sem esperar o timeout. Um ACK
+        # repetido também pode disparar, se o último reenvio já tem mais de um
+        # RTT (ele também se perdeu); antes disso o reenvio é suprimido
+        later_acked = (self.next_seq - self.base - 1) - (len(self.unacked) - 1)
+        if later_acked >= self.dupacks and not self.rto.within_rtt(self.unacked[self.base][1]):
+            self.fast_retransmit()
+        # RFC 6298 (5.3): um ACK novo reinicia o timer. O pacote mais antigo pode ter
+        # sido enviado durante um backoff; sem isso ele seguiria esperando aquele
+        # prazo longo mesmo depois de o RTO voltar ao normal, travando a janela
+        if acked:
+            deadline = self.timer.deadline(self.base)
+            if deadline is not None and deadline > time.monotonic() + self.rto.timeout:
+                self.timer.start(self.base, self.rto.timeout)
+
+    def fast_retransmit(self):
+        # Reenvia o pacote mais antigo e entra em recuperação rápida: a janela
+        # de congestionamento cai pela metade, e não para 1 como num timeout
+        seq = self.base
+        entry = self.unacked[seq]
+        entry[1] = time.monotonic()
+        entry[2] += 1
+        self.retransmissions += 1
+        METRICS.incr("rdt.retransmissoes")
+        METRICS.incr("rdt.retransmissoes_rapidas")
+        self.cc.on_loss(len(self.unacked), self.next_seq - 1)
+        LOG.debug("SR Sender: Retransmissão rápida do pacote seq=%d", seq)
+        RING.record("saida", seq, len(entry[0][1]), "rapida", self.server_address)
+        udt_send_with_loss(self.socket, entry[0], self.server_address)
+        self.timer.start(seq, self.rto.timeout)
+
+    def retransmit_expired(self):
+        expired = self.timer.pop_expired()
+        if not expired:
+            return
+        # Um único backoff (e um único corte da janela) por rodada de timeouts,
+        # mesmo com vários pacotes vencidos
+        self.rto.backoff()
+        self.cc.on_timeout(len(self.unacked))
+        METRICS.incr("rdt.timeouts")
+        for seq in expired:
+            entry = self.unacked[seq]
+            entry[2] += 1
+            if self.is_fin(entry[0]) and entry[2] > SR_FIN_RETRIES:
+                LOG.info("SR Sender: Sem ACK para o FIN, assumindo que o par encerrou")
+                self.finish()
+                return
+            if entry[2] > SR_MAX_RETRIES:
+                raise TimeoutError(f"SR Sender: pacote seq={seq} sem ACK após {SR_MAX_RETRIES} retransmissões")
+            LOG.debug("SR Sender: Timeout! Reenviando pacote seq=%d", seq)
+            RING.record("saida", seq, len(entry[0][1]), "timeout", self.server_address)
+            udt_send_with_loss(self.socket, entry[0], self.server_address)
+            entry[1] = time.monotonic()
+            self.retransmissions += 1
+            METRICS.incr("rdt.retransmissoes")
+            self.timer.start(seq, self.rto.timeout)
+
+    def only_fin_pending(self):
+        return all(self.is_fin(entry[0]) for entry in self.unacked.values())
+
+    def finish(self):
+        self.unacked.clear()
+        self.timer.clear()
+        self.base = self.next_seq
+
+    def stats(self):
+        return {"pacotes": self.packets, "retransmissoes": self.retransmissions, **self.cc.stats()}
+
+
+class SR_Receiver:
+    def __init__(self, socket_obj, window_size=8, datagram_size=BASE_DATAGRAM):
+        self.socket = socket_obj
+        self.window_size = window_size
+        self.datagram_size = datagram_size
+        self.max_data = datagram_size - SR_HEADER.size  # Carga útil de cada pacote do par
+        self.rcv_base = 0     # Próximo seq a ser entregue para a aplicação
+        self.buffer = {}      # Pacotes fora de ordem: {seq: dados}
+        self.ready = deque()  # Dados já em ordem aguardando rdt_rcv
+        self.peer_address = None
+        self.delayed = 0          # Pacotes recebidos desde o último ACK
+        self.pending_ack = None   # (endereço, prazo) do ACK atrasado, se houver
+
+    def send_ack(self, address, received):
+        # ACK cumulativo com o mapa SACK dos pacotes já recebidos à frente de
+        # rcv_base (received). Anuncia também a borda da janela: pacotes já em
+        # ordem que a aplicação ainda não leu (ready) ocupam espaço e fecham a
+        # janela até serem lidos
+        sack = 0
+        for seq in received:
+            offset = seq - self.rcv_base - 1
+            if 0 <= offset < SACK_BITS:
+                sack |= 1 << offset
+        edge = self.rcv_base + self.window_size - len(self.ready)
+        udt_send_with_loss(self.socket, SR_ACK_HEADER.pack(SR_ACK, self.rcv_base, edge, sack), address)
+        self.delayed = 0
+        self.pending_ack = None
+
+    def acknowledge(self, address, received, now):
+        # Pacotes em ordem esperam o próximo (até ACK_EVERY) ou ACK_DELAY; fora de
+        # ordem, duplicados, buracos preenchidos e o FIN são confirmados na hora,
+        # para o remetente descobrir logo pelo SACK o que se perdeu
+        self.delayed += 1
+        if now or self.delayed >= ACK_EVERY:
+            self.send_ack(address, received)
+            return
+        METRICS.incr("rdt.acks_adiados")
+        if self.pending_ack is None:
+            self.pending_ack = (address, time.monotonic() + ACK_DELAY)
+
+    def wait_packet(self, receive, received):
+        # Espera o próximo pacote; se o prazo do ACK atrasado vencer antes, ele sai
+        if self.pending_ack is None:
+            return receive()
+        previous_timeout = self.socket.gettimeout()
+        try:
+            while self.pending_ack is not None:
+                address, deadline = self.pending_ack
+                time_left = deadline - time.monotonic()
+                if time_left <= 0:
+                    self.send_ack(address, received)
+                    break
+                self.socket.settimeout(time_left)
+                try:
+                    return receive()
+                except socket.timeout:
+                    self.send_ack(address, received)
+        finally:
+            self.socket.settimeout(previous_timeout)
+        return receive()
+
+    def rdt_rcv(self, client_address=None):
+        while not self.ready:
+            rcvpkt, addr = self.wait_packet(lambda: self.socket.recvfrom(self.datagram_size), self.buffer)
+            if len(rcvpkt) < SR_HEADER.size:
+                continue
+            kind, seq = SR_HEADER.unpack_from(rcvpkt)
+
+            # ACKs atrasados do nosso fluxo de envio anterior são ignorados
+            if kind != SR_DATA:
+                continue
+
+            if self.peer_address is None:
+                self.peer_address = client_address or addr
+            ack_address = client_address or addr
+
+            if self.rcv_base <= seq < self.rcv_base + self.window_size:
+                in_order = seq == self.rcv_base and not self.buffer
+                if seq not in self.buffer:
+                    self.buffer[seq] = rcvpkt[SR_HEADER.size:]
+                    METRICS.incr("rdt.pacotes_recebidos")
+                    RING.record("entrada", seq, len(rcvpkt), "recebido" if seq == self.rcv_base else "fora_de_ordem", addr)
+                else:
+                    in_order = False
+                    METRICS.incr("rdt.duplicados")
+                    RING.record("entrada", seq, len(rcvpkt), "duplicado", addr)
+                if seq != self.rcv_base:
+                    LOG.debug("SR Receiver: Pacote seq=%d guardado fora de ordem", seq)
+                # Entrega todos os pacotes consecutivos a partir da base
+                while self.rcv_base in self.buffer:
+                    self.ready.append(self.buffer.pop(self.rcv_base))
+                    self.rcv_base += 1
+                self.acknowledge(ack_address, self.buffer, not in_order or len(rcvpkt) == SR_HEADER.size)
+            elif self.rcv_base - self.window_size <= seq < self.rcv_base:
+                # Já entregue, mas o ACK se perdeu: reconhece novamente
+                METRICS.incr("rdt.duplicados")
+                RING.record("entrada", seq, len(rcvpkt), "duplicado", addr)
+                self.send_ack(ack_address, self.buffer)
+            # Fora da janela: descarta
+
+        return self.ready.popleft()
+
+
+    def rdt_rcv_file(self, writer, client_address=None):
+        # Recebe um arquivo até o pacote vazio de fim. Todo pedaço, menos o último,
+        # tem max_data bytes (ver send_file), então cada pacote é gravado
+        # direto na sua posição do arquivo assim que chega, mesmo fora de ordem,
+        # sem passar pelo buffer de reordenação
+        start = self.rcv_base - len(self.ready)  # seq do primeiro pedaço do arquivo
+        received = set()                          # seqs já gravados à frente de rcv_base
+        fin_seq = None
+
+        def store(seq, data):
+            nonlocal fin_seq
+            if len(data) == 0:
+                fin_seq = seq
+            else:
+                writer.write_at((seq - start) * self.max_data, data)
+
+        # Pedaços que chegaram antes (junto com o nome do arquivo) já estão em memória
+        for seq, data in enumerate(self.ready, start):
+            store(seq, data)
+        self.ready.clear()
+        for seq, data in self.buffer.items():
+            store(seq, data)
+            received.add(seq)
+        self.buffer.clear()
+
+        buffer = bytearray(self.datagram_size)
+        view = memoryview(buffer)
+        while fin_seq is None or self.rcv_base <= fin_seq:
+            nbytes, addr = self.wait_packet(lambda: self.socket.recvfrom_into(buffer), received)
+            if nbytes < SR_HEADER.size:
+                continue
+            kind, seq = SR_HEADER.unpack_from(buffer)
+            if kind != SR_DATA:
+                continue
+
+            if self.peer_address is None:
+                self.peer_address = client_address or addr
+            ack_address = client_address or addr
+
+            if self.rcv_base <= seq < self.rcv_base + self.window_size:
+                in_order = seq == self.rcv_base and not received
+                if seq not in received:
+                    store(seq, view[SR_HEADER.size:nbytes])
+                    received.add(seq)
+                    METRICS.incr("rdt.pacotes_recebidos")
+                    RING.record("entrada", seq, nbytes, "recebido" if seq == self.rcv_base else "fora_de_ordem", addr)
+                else:
+                    in_order = False
+                    METRICS.incr("rdt.duplicados")
+                    RING.record("entrada", seq, nbytes, "duplicado", addr)
+                while self.rcv_base in received:
+                    received.discard(self.rcv_base)
+                    self.rcv_base += 1
+                self.acknowledge(ack_address, received, not in_order or nbytes == SR_HEADER.size)
+            elif self.rcv_base - self.window_size <= seq < self.rcv_base:
+                # Já gravado, mas o ACK se perdeu: reconhece novamente
+                METRICS.incr("rdt.duplicados")
+                RING.record("entrada", seq, nbytes, "duplicado", addr)
+                self.send_ack(ack_address, received)
+
+        return writer.size
+
+
+# --- Correção de erros adiante (FEC) sobre o RDT 3.0 ---
+# Em enlaces com perda, o stop-and-wait gasta um timeout inteiro por pacote
+# perdido. Aqui ele passa a esperar por blocos: cada bloco leva n pacotes de
+# dados e k de paridade (ver fec.py) e basta chegarem quaisquer n dos n + k
+# para o receptor reconstruir os dados, sem retransmissão. k é escolhido pela
+# perda observada nos blocos anteriores (ou fixo, com parity).
+# Cabeçalho: tipo (1 byte) + bloco (4 bytes) + índice no bloco, n e k (1 byte
+# cada); os índices de 0 a n - 1 são dados e de n a n + k - 1 paridade. O
+# último pacote de cada rajada sai como FEC_PROBE: se o bloco ainda não se
+# reconstrói, o receptor responde com FEC_STATUS e o mapa dos pacotes que já
+# tem, e o remetente reenvia só o que falta. O bloco completo é confirmado
+# com FEC_ACK (mesmo formato: tipo, bloco e mapa de 64 bits)
+FEC_DATA = 0
+FEC_ACK = 1
+FEC_STATUS = 2
+FEC_PROBE = 3
+FEC_HEADER = struct.Struct('!BIBBB')
+FEC_ACK_HEADER = struct.Struct('!BIQ')
+FEC_MAX_BLOCK = MAX_PACKETS - MAX_PARITY  # Pacotes de dados por bloco
+
+
+class FEC_Sender:
+    def __init__(self, socket_obj, server_address, block_size=8, parity=None, timeout=INITIAL_RTO,
+                 rto=None, peer_last_block=None, datagram_size=BASE_DATAGRAM):
+        self.socket = socket_obj
+        self.server_address = server_address
+        # window_size é o tamanho do bloco: send_file mantém um buffer por pedaço ainda sem ACK
+        self.window_size = min(max(block_size, 1), FEC_MAX_BLOCK)
+        # O pacote de paridade leva o tamanho do pedaço (2 bytes) além dos dados
+        self.max_data = datagram_size - FEC_HEADER.size - LENGTH.size
+        self.parity = parity  # None: escolhida pela perda observada
+        self.loss = LossEstimator()
+        # Último bloco do fluxo que o par nos enviou antes (None se não houve)
+        self.peer_last_block = peer_last_block
+        self.rto = rto or RtoEstimator(initial_rto=timeout)
+        self.timer = RetransmissionTimer()
+        self.block = 0
+        self.chunks = []  # Pedaços do bloco em formação
+        self.packets = 0  # Pacotes de dados enviados, sem contar retransmissões
+        self.parity_packets = 0
+        self.retransmissions = 0
+        self.repairs = 0  # Blocos que precisaram de reenvio (a paridade não bastou)
+
+    def rdt_send(self, data):
+        # Junta os pedaços até completar o bloco. Um pedaço menor que max_data (o
+        # nome do arquivo, o último pedaço, o pacote vazio de fim) fecha o bloco
+        # na hora: quem chama espera a resposta dele antes de seguir
+        self.chunks.append(data)
+        if len(data) < self.max_data or len(self.chunks) == self.window_size:
+            chunks, self.chunks = self.chunks, []
+            try:
+                self.send_block(chunks)
+            finally:
+                # Restaura socket para modo bloqueante
+                self.socket.settimeout(None)
+
+    def parity_for(self, n):
+        if self.parity is not None:
+            return min(self.parity, MAX_PACKETS - n)
+        return choose_parity(n, self.loss.rate)
+
+    def send_block(self, chunks):
+        n = len(chunks)
+        k = self.parity_for(n)
+        packets = [(FEC_HEADER.pack(FEC_DATA, self.block, index, n, k), chunk)
+                   for index, chunk in enumerate(chunks)]
+        packets += [(FEC_HEADER.pack(FEC_DATA, self.block, n + j, n, k), payload)
+                    for j, payload in enumerate(encode(chunks, k))]
+        LOG.debug("FEC Sender: Enviando bloco %d (%d dados + %d paridade)", self.block, n, k)
+        self.send_burst(packets, range(n + k))
+        self.packets += n
+        self.parity_packets += k
+        METRICS.incr("rdt.pacotes_enviados", n)
+        METRICS.incr("rdt.pacotes_paridade", k)
+        sent_at = time.monotonic()
+        retransmitted = False
+        first_feedback = True
+        retries = 0
+        self.timer.start(self.block, self.rto.timeout)
+
+        # Estado: Esperar ACK do bloco
+        while True:
+            time_left = self.timer.time_left()
+            if time_left == 0:
+                # Sem resposta: reenvia o último pacote como sonda, para o
+                # receptor dizer o que falta (ou repetir o ACK que se perdeu)
+                retries += 1
+                if not chunks[-1] and retries > SR_FIN_RETRIES:
+                    LOG.info("FEC Sender: Sem ACK para o FIN, assumindo que o par encerrou")
+                    break
+                if retries > SR_MAX_RETRIES:
+                    raise TimeoutError(f"FEC Sender: bloco {self.block} sem ACK após {SR_MAX_RETRIES} retransmissões")
+                LOG.debug("FEC Sender: Timeout! Sondando o bloco %d", self.block)
+                self.rto.backoff()
+                self.send_burst(packets, [n + k - 1], "timeout")
+                retransmitted = True
+                self.retransmissions += 1
+                METRICS.incr("rdt.timeouts")
+                METRICS.incr("rdt.retransmissoes")
+                self.timer.start(self.block, self.rto.timeout)
+                continue
+
+            self.socket.settimeout(time_left)
+            try:
+                rcvpkt, addr = self.socket.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except ConnectionRefusedError:
+                # O par fechou o socket; se o bloco é o do FIN, a transferência acabou
+                if not chunks[-1]:
+                    break
+                raise
+            if len(rcvpkt) < FEC_ACK_HEADER.size:
+                continue  # Controle atrasado da negociação do tamanho dos datagramas
+            kind, block, received = FEC_ACK_HEADER.unpack_from(rcvpkt)
+
+            if kind in (FEC_DATA, FEC_PROBE):
+                # Dado atrasado do fluxo anterior do par (nosso ACK se perdeu):
+                # reconhece de novo. Dados do próximo fluxo do par ficam sem ACK
+                if self.peer_last_block is not None and block <= self.peer_last_block:
+                    _, _, _, peer_n, peer_k = FEC_HEADER.unpack_from(rcvpkt)
+                    udt_send_with_loss(self.socket, FEC_ACK_HEADER.pack(FEC_ACK, block, (1 << peer_n + peer_k) - 1), addr)
+                continue
+            if block != self.block or kind not in (FEC_ACK, FEC_STATUS):
+                continue  # Resposta atrasada de um bloco anterior
+
+            arrived = bin(received).count("1")
+            if first_feedback:
+                # Perda do bloco: buracos abaixo do último pacote que chegou. Um
+                # ACK pode sair antes de chegarem os últimos, que não contam
+                first_feedback = False
+                considered = received.bit_length() if kind == FEC_ACK else n + k
+                self.loss.update(considered, considered - arrived)
+
+            if kind == FEC_ACK:
+                RING.record("entrada", self.block, len(rcvpkt), "ack", addr)
+                # Regra de Karn: só mede o RTT de blocos sem reenvio
+                if not retransmitted:
+                    rtt = time.monotonic() - sent_at
+                    self.rto.sample(rtt)
+                    METRICS.observe("rdt.rtt", rtt)
+                break
+
+            # FEC_STATUS: faltam pacotes. O status só responde a uma sonda, o fim
+            # de uma rajada, então reflete tudo o que já foi reenviado. Reenvia o
+            # que falta (dados primeiro, que o receptor usa sem decodificar), com
+            # a mesma folga de paridade para a perda observada
+            RING.record("entrada", self.block, len(rcvpkt), "status", addr)
+            missing = [index for index in range(n + k) if not received >> index & 1]
+            needed = n - arrived
+            if needed <= 0 or not missing:
+                continue
+            resend = missing[:needed + choose_parity(needed, self.loss.rate)]
+            LOG.debug("FEC Sender: Bloco %d incompleto, reenviando %d pacotes", self.block, len(resend))
+            self.send_burst(packets, resend, "reparo")
+            retransmitted = True
+            self.repairs += 1
+            self.retransmissions += len(resend)
+            METRICS.incr("rdt.retransmissoes", len(resend))
+            self.timer.start(self.block, self.rto.timeout)
+
+        self.timer.cancel(self.block)
+        self.block += 1
+
+    def send_burst(self, packets, indexes, outcome="enviado"):
+        # Envia os pacotes de indexes; o último vai como sonda (FEC_PROBE)
+        last = indexes[-1]
+        for index in indexes:
+            header, payload = packets[index]
+            if index == last:
+                header = bytes([FEC_PROBE]) + header[1:]
+            RING.record("saida", self.block, len(payload), outcome, self.server_address)
+            udt_send_with_loss(self.socket, (header, payload), self.server_address)
+
+    def stats(self):
+        return {"pacotes": self.packets, "retransmissoes": self.retransmissions,
+                "paridade": self.parity_packets, "reparos": self.repairs,
+                "perda_estimada": round(self.loss.rate, 4)}
+
+
+class FEC_Receiver:
+    def __init__(self, socket_obj, datagram_size=BASE_DATAGRAM):
+        self.socket = socket_obj
+        self.datagram_size = datagram_size
+        self.block = 0        # Bloco que está sendo recebido
+        self.received = {}    # Pacotes do bloco atual: {índice: carga}
+        self.last_ack = 0     # Mapa do último bloco completo, para repetir o ACK
+        self.ready = deque()  # Pedaços já reconstruídos aguardando rdt_rcv
+        self.peer_address = None
+
+    def receive_block(self, client_address=None):
+        # Recebe pacotes até completar o bloco atual
+        while True:
+            rcvpkt, addr = self.socket.recvfrom(self.datagram_size)
+            if len(rcvpkt) < FEC_HEADER.size:
+                continue
+            kind, block, index, n, k = FEC_HEADER.unpack_from(rcvpkt)
+            # ACKs e status atrasados do nosso fluxo de envio anterior são ignorados
+            if kind not in (FEC_DATA, FEC_PROBE):
+                continue
+            ack_address = client_address or addr
+
+            if block < self.block:
+                # Já entregue, mas o ACK se perdeu: reconhece novamente
+                METRICS.incr("rdt.duplicados")
+                RING.record("entrada", block, len(rcvpkt), "duplicado", addr)
+                bitmap = self.last_ack if block == self.block - 1 else (1 << n + k) - 1
+                udt_send_with_loss(self.socket, FEC_ACK_HEADER.pack(FEC_ACK, block, bitmap), ack_address)
+                continue
+            if block > self.block or index >= n + k:
+                continue
+
+            if index in self.received:
+                METRICS.incr("rdt.duplicados")
+                RING.record("entrada", block, len(rcvpkt), "duplicado", addr)
+            else:
+                self.received[index] = rcvpkt[FEC_HEADER.size:]
+                RING.record("entrada", block, len(rcvpkt), "recebido" if index < n else "paridade", addr)
+            bitmap = sum(1 << i for i in self.received)
+
+            if len(self.received) >= n:
+                # Quaisquer n pacotes bastam: reconstrói os que faltam e confirma
+                recovered = sum(1 for i in range(n) if i not in self.received)
+                chunks = decode(n, k, self.received)
+                METRICS.incr("rdt.pacotes_recebidos", n - recovered)
+                if recovered:
+                    LOG.debug("FEC Receiver: %d pacotes do bloco %d reconstruídos", recovered, block)
+                    METRICS.incr("rdt.pacotes_recuperados", recovered)
+                udt_send_with_loss(self.socket, FEC_ACK_HEADER.pack(FEC_ACK, block, bitmap), ack_address)
+                if self.peer_address is None:
+                    self.peer_address = ack_address
+                self.ready.extend(chunks)
+                self.last_ack = bitmap
+                self.received = {}
+                self.block += 1
+                return
+            if kind == FEC_PROBE:
+                # Fim de uma rajada e o bloco ainda não fecha: diz o que já chegou
+                udt_send_with_loss(self.socket, FEC_ACK_HEADER.pack(FEC_STATUS, block, bitmap), ack_address)
+
+    def rdt_rcv(self, client_address=None):
+        while not self.ready:
+            self.receive_block(client_address)
+        return self.ready.popleft()
+
+    def rdt_rcv_file(self, writer, client_address=None):
+        # Recebe um arquivo até o pedaço vazio de fim, gravando os pedaços em ordem
+        while True:
+            data = self.rdt_rcv(client_address)
+            if not data:
+                return writer.size
+            writer.write(data)
+
+
+# --- Transferência de arquivos sem cópias extras ---
+MMAP_INITIAL_SIZE = 1024 * 1024  # Pré-alocação inicial do arquivo recebido
+
+
+class MmapFileWriter:
+    # Arquivo de destino pré-alocado e mapeado em memória: cada pedaço é copiado
+    # direto para a sua posição, sem um write() por pedaço e em qualquer ordem.
+    # O espaço dobra quando falta e o arquivo é cortado no tamanho real ao fechar.
+    # Com keep=True um arquivo que já existe é reaberto sem perder o conteúdo
+    # (retomada de uma transferência interrompida)
+
+    def __init__(self, filename, initial_size=MMAP_INITIAL_SIZE, keep=False):
+        self.file = open(filename, "r+b" if keep and os.path.exists(filename) else "w+b")
+        self.map = None
+        self.capacity = 0
+        self.size = os.fstat(self.file.fileno()).st_size  # Maior posição já escrita
+        self.grow(max(initial_size, self.size, 1))  # mmap não aceita tamanho 0
+
+    def grow(self, capacity):
+        if self.map is not None:
+            self.map.close()
+        self.file.truncate(capacity)
+        self.map = mmap.mmap(self.file.fileno(), capacity)
+        self.capacity = capacity
+
+    def write_at(self, offset, data):
+        end = offset + len(data)
+        if end > self.capacity:
+            self.grow(max(end, 2 * self.capacity))
+        self.map[offset:end] = data
+        self.size = max(self.size, end)
+
+    def write(self, data):
+        self.write_at(self.size, data)
+
+    def flush(self):
+        # Garante que o que já foi copiado para o mapa chegou ao arquivo
+        self.map.flush()
+
+    def close(self):
+        self.map.close()
+        self.file.truncate(self.size)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def send_file(rdt_sender, filename, ranges=None, codec=NONE):
+    # Envia o arquivo (ou só os trechos (início, tamanho) de ranges, emendados
+    # em um único fluxo) e o pacote vazio de fim. Os pedaços são lidos com
+    # readinto em buffers reaproveitados, um para cada pacote que pode estar
+    # sem ACK (a janela do SR, o bloco do FEC ou 1 no RDT 3.0) mais o que está
+    # sendo lido, para que uma retransmissão nunca envie dados já sobrescritos.
+    # Todo pacote, menos o último, sai cheio mesmo quando atravessa o fim de um trecho: o
+    # SR_Receiver grava cada pacote na posição seq * max_data. Com um algoritmo
+    # de compressão (codec), o arquivo sai em blocos comprimidos (ver send_blocks)
+    if codec != NONE:
+        with open(filename, "rb") as f:
+            if ranges is None:
+                ranges = [(0, os.fstat(f.fileno()).st_size)]
+            return send_blocks(rdt_sender, file_blocks(f, ranges), codec)
+    slots = getattr(rdt_sender, "window_size", 1) + 1
+    buffers = [bytearray(rdt_sender.max_data) for _ in range(slots)]
+    views = [memoryview(buffer) for buffer in buffers]
+    total = 0
+    with open(filename, "rb") as f:
+        pending = deque(ranges if ranges is not None else [(0, os.fstat(f.fileno()).st_size)])
+        position = 0
+        index = 0
+        while True:
+            nbytes = 0
+            while nbytes < rdt_sender.max_data and pending:
+                offset, length = pending[0]
+                if offset != position:
+                    f.seek(offset)
+                read = f.readinto(views[index][nbytes:nbytes + length])
+                position = offset + read
+                nbytes += read
+                if read == length or not read:
+                    pending.popleft()  # Trecho completo (ou o arquivo acabou antes)
+                else:
+                    pending[0] = (position, length - read)
+            if not nbytes:
+                break
+            rdt_sender.rdt_send(views[index][:nbytes])
+            total += nbytes
+            index = (index + 1) % slots
+    rdt_sender.rdt_send(b'')  # Pacote vazio sinaliza fim
+    return total
+
+
+def send_buffer(rdt_sender, data, ranges=None, codec=NONE):
+    # Como send_file, mas de um buffer já em memória (ex.: um arquivo mapeado):
+    # cada pacote é uma fatia de data, sem leitura nem cópia. Só o pacote que
+    # emenda o fim de um trecho com o começo do próximo é montado à parte
+    view = memoryview(data)
+    if ranges is None:
+        ranges = [(0, len(view))]
+    if codec != NONE:
+        blocks = (view[offset:offset + length] for offset, length in range_blocks(ranges))
+        return send_blocks(rdt_sender, blocks, codec)
+    pending = deque(ranges)
+    total = 0
+    while pending:
+        offset, length = pending[0]
+        if length >= rdt_sender.max_data or len(pending) == 1:
+            count = min(length, rdt_sender.max_data)
+            packet = view[offset:offset + count]
+            if count == length:
+                pending.popleft()
+            else:
+                pending[0] = (offset + count, length - count)
+        else:
+            parts = []
+            missing = rdt_sender.max_data
+            while missing and pending:
+                offset, length = pending.popleft()
+                count = min(length, missing)
+                parts.append(view[offset:offset + count])
+                if count < length:
+                    pending.appendleft((offset + count, length - count))
+                missing -= count
+            packet = b"".join(parts)
+        if packet:
+            rdt_sender.rdt_send(packet)
+            total += len(packet)
+    rdt_sender.rdt_send(b'')  # Pacote vazio sinaliza fim
+    return total
+
+
+# --- Compressão por blocos ---
+# Com um algoritmo combinado com o par (ver resume), o fluxo de um arquivo vira
+# uma sequência de blocos de até COMPRESSION_BLOCK bytes, cada um comprimido
+# separadamente e precedido de um cabeçalho: algoritmo (NONE se o bloco não
+# encolheu), tamanho no fluxo e tamanho original. Os blocos são emendados e
+# fatiados em pacotes cheios, como os dados de send_file, então o RDT 3.0 e o
+# SR não mudam; quem recebe passa o fluxo por um DecompressingWriter
+COMPRESSION_BLOCK = 256 * 1024
+FRAME_HEADER = struct.Struct('!BII')
+
+
+def range_blocks(ranges, block_size=COMPRESSION_BLOCK):
+    # Divide os trechos (início, tamanho) em blocos de até block_size bytes
+    for offset, length in ranges:
+        for start in range(offset, offset + length, block_size):
+            yield start, min(block_size, offset + length - start)
+
+
+def file_blocks(f, ranges, block_size=COMPRESSION_BLOCK):
+    # Blocos dos trechos do arquivo, lidos em um buffer reaproveitado: cada bloco
+    # é comprimido (ou copiado para o fluxo) antes de o próximo ser lido
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    for offset, length in range_blocks(ranges, block_size):
+        f.seek(offset)
+        nbytes = f.readinto(view[:length])
+        if not nbytes:
+            return  # O arquivo acabou antes do trecho
+        yield view[:nbytes]
+
+
+def send_blocks(rdt_sender, blocks, codec):
+    # Comprime cada bloco, emenda os blocos com seus cabeçalhos e envia o fluxo
+    # em pacotes cheios, seguido do pacote vazio de fim. Devolve os bytes
+    # originais enviados; rdt_sender.packets diz quantos pacotes foram usados
+    pending = bytearray()
+    total = 0
+    for block in blocks:
+        used, payload = compress(codec, block)
+        pending += FRAME_HEADER.pack(used, len(payload), len(block))
+        pending += payload
+        total += len(block)
+        while len(pending) >= rdt_sender.max_data:
+            rdt_sender.rdt_send(pending[:rdt_sender.max_data])
+            del pending[:rdt_sender.max_data]
+    if pending:
+        rdt_sender.rdt_send(pending)
+    rdt_sender.rdt_send(b'')  # Pacote vazio sinaliza fim
+    return total
+
+
+class DecompressingWriter:
+    # Recebe o fluxo de send_blocks e grava os dados descomprimidos, em ordem,
+    # em writer (MmapFileWriter, ResumableFile, ...). Tem a interface que
+    # rdt_rcv_file espera, em posições do fluxo comprimido; o SR pode entregar
+    # pedaços fora de ordem, que esperam em pending até o buraco ser preenchido
+    # (no máximo uma janela). size é o que já chegou em ordem pelo fio, e
+    # raw_size o que já foi gravado em writer
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.stream = bytearray()  # Início de um bloco que ainda não chegou inteiro
+        self.pending = {}          # {posição no fluxo: dados} chegados fora de ordem
+        self.size = 0
+        self.raw_size = 0
+
+    def write_at(self, offset, data):
+        if offset != self.size:
+            if offset > self.size:
+                self.pending[offset] = bytes(data)  # data pode ser o buffer de recepção
+            return
+        self.stream += data
+        self.size += len(data)
+        while self.size in self.pending:
+            data = self.pending.pop(self.size)
+            self.stream += data
+            self.size += len(data)
+        self.unpack()
+
+    def write(self, data):
+        self.write_at(self.size, data)
+
+    def unpack(self):
+        # Descomprime e grava todos os blocos que já chegaram inteiros
+        position = 0
+        while len(self.stream) - position >= FRAME_HEADER.size:
+            codec, stored, original = FRAME_HEADER.unpack_from(self.stream, position)
+            if original > COMPRESSION_BLOCK or stored > original:
+                raise ValueError(f"bloco comprimido inválido ({stored} -> {original} bytes)")
+            start = position + FRAME_HEADER.size
+            if len(self.stream) < start + stored:
+                break
+            data = decompress(codec, self.stream[start:start + stored], original)
+            if len(data) != original:
+                raise ValueError(f"bloco descomprimido com {len(data)} bytes, esperava {original}")
+            self.writer.write(data)
+            self.raw_size += original
+            position = start + stored
+        del self.stream[:position]
+
+
+def format_stats(rdt_sender):
+    # Resumo de um envio (pacotes, retransmissões, janela de congestionamento) para os logs
+    return ", ".join(f"{name}={value}" for name, value in rdt_sender.stats().items())
+
+
+def receive_file(rdt_receiver, filename, client_address=None):
+    # Recebe um arquivo enviado com send_file e devolve o tamanho gravado
+    with MmapFileWriter(filename) as writer:
+        return rdt_receiver.rdt_rcv_file(writer, client_address)
+
+def create_sender(socket_obj, address, mode="rdt3", window_size=8, receiver=None,
+                  datagram_size=BASE_DATAGRAM, dupacks=DUPACK_THRESHOLD, parity=None):
+    # Escolhe entre stop-and-wait (RDT 3.0), Selective Repeat e stop-and-wait
+    # por blocos com FEC. receiver é o receptor que já terminou de receber do
+    # mesmo par, se houver, datagram_size o tamanho negociado com o par (ver
+    # path_mtu) e dupacks quantos ACKs repetidos disparam a retransmissão
+    # rápida. No modo fec, window_size é o tamanho do bloco e parity os
+    # pacotes de paridade por bloco (None: pela perda observada)
+    if mode == "fec":
+        peer_last_block = receiver.block - 1 if receiver is not None else None
+        return FEC_Sender(socket_obj, address, window_size, parity, peer_last_block=peer_last_block,
+                          datagram_size=datagram_size)
+    if mode == "sr":
+        peer_last_seq = receiver.rcv_base - 1 if receiver is not None else None
+        return SR_Sender(socket_obj, address, window_size, peer_last_seq=peer_last_seq,
+                         datagram_size=datagram_size, dupacks=dupacks)
+    return RDT3_0_Sender(socket_obj, address, datagram_size=datagram_size, dupacks=dupacks)
+
+
+def create_receiver(socket_obj, mode="rdt3", window_size=8, datagram_size=BASE_DATAGRAM):
+    if mode == "fec":
+        return FEC_Receiver(socket_obj, datagram_size)
+    if mode == "sr":
+        return SR_Receiver(socket_obj, window_size, datagram_size)
+    return RDT3_0_Receiver(socket_obj, datagram_size)
@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import time
+
+# --- Estimativa do timeout de retransmissão (RFC 6298) ---
+ALPHA = 1 / 8        # Peso de cada nova amostra no RTT suavizado
+BETA = 1 / 4         # Peso de cada nova amostra na variação do RTT
+K = 4                # Quantas variações somar ao RTT suavizado
+GRANULARITY = 0.001  # Resolução do relógio (1 ms)
+
+INITIAL_RTO = 1.0  # Antes da primeira amostra
+MIN_RTO = 0.01     # Baixo o bastante para recuperar perdas em ms no loopback
+MAX_RTO = 60.0
+
+
+class RtoEstimator:
+    def __init__(self, initial_rto=INITIAL_RTO, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.srtt = None    # RTT suavizado
+        self.rttvar = None  # Variação do RTT
+        self.rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.backoffs = 0   # Timeouts seguidos desde a última amostra válida
+
+    @property
+    def timeout(self):
+        return self.rto
+
+    def sample(self, rtt):
+        # Regra de Karn: só deve ser chamado com o RTT de pacotes que NÃO
+        # foram retransmitidos, pois o ACK de um pacote retransmitido é ambíguo
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        rto = self.srtt + max(GRANULARITY, K * self.rttvar)
+        self.rto = min(max(rto, self.min_rto), self.max_rto)
+        self.backoffs = 0
+
+    def backoff(self):
+        # Backoff exponencial: dobra o RTO a cada timeout até chegar uma amostra nova
+        self.rto = min(self.rto * 2, self.max_rto)
+        self.backoffs += 1
+
+    def within_rtt(self, sent_at, now=None):
+        # Se um pacote enviado em sent_at ainda pode estar em trânsito (menos de
+        # um RTT suavizado; o RTO antes da primeira amostra). Reenviá-lo de novo
+        # nesse intervalo só duplicaria o tráfego: a resposta nem teve tempo de chegar
+        now = time.monotonic() if now is None else now
+        return now - sent_at < (self.srtt if self.srtt is not None else self.rto)
+
+
+# --- Timer de retransmissão orientado a eventos ---
+class RetransmissionTimer:
+    # Guarda os prazos em um heap para que quem espera durma exatamente até o
+    # próximo vencimento, em vez de acordar periodicamente para conferir
+
+    def __init__(self):
+        self._heap = []     # [(prazo, desempate, chave)]
+        self._active = {}   # {chave: prazo vigente}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, key):
+        return key in self._active
+
+    def start(self, key, timeout, now=None):
+        # (Re)inicia o timer de uma chave; entradas antigas viram lixo no heap
+        deadline = (time.monotonic() if now is None else now) + timeout
+        self._active[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+    def cancel(self, key):
+        self._active.pop(key, None)
+
+    def deadline(self, key):
+        # Prazo vigente de uma chave (None se não houver timer para ela)
+        return self._active.get(key)
+
+    def clear(self):
+        self._heap.clear()
+        self._active.clear()
+
+    def next_deadline(self):
+        # Descarta do topo do heap as entradas canceladas ou reiniciadas
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            if self._active.get(key) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def time_left(self, now=None):
+        # Segundos até o próximo vencimento (0 se já venceu, None se não há timers)
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(deadline - now, 0.0)
+
+    def pop_expired(self, now=None):
+        # Remove e retorna as chaves cujo prazo já passou, da mais antiga à mais nova
+        now = time.monotonic() if now is None else now
+        expired = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return expired
+            _, _, key = heapq.heappop(self._heap)
+            del self._active[key]
+            expired.append(key)
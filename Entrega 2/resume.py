@@ -0,0 +1,275 @@
+import hashlib
+import os
+import socket
+import struct
+import time
+from path_mtu import MAX_DATAGRAM, HANDSHAKE_TIMEOUT, parse_control
+from rdt_protocol import MmapFileWriter
+from compression import NONE
+
+# --- Retomada de transferências interrompidas ---
+# O arquivo é dividido em pedaços de tamanho fixo. Quem recebe guarda, ao lado
+# do arquivo parcial (<arquivo>.estado), quais pedaços já estão inteiros em
+# disco; numa nova tentativa só os pedaços que faltam são enviados, e o digest
+# do arquivo montado é conferido com o do manifesto antes de ele ser publicado
+CHUNK_SIZE = 1024 * 1024  # Menor unidade de retomada
+MAX_CHUNKS = 4096         # O mapa de pedaços (512 bytes) cabe em qualquer datagrama negociado
+CHECKPOINT_INTERVAL = 0.5  # Segundos entre gravações do estado durante a recepção
+RESUME_ATTEMPTS = 10       # Quem responde pode estar calculando o digest de um arquivo grande
+DIGEST_BLOCK = 1024 * 1024
+
+# --- Mensagens, antes do primeiro pacote do RDT ---
+# RESUME (cliente -> servidor): manifesto (digest, tamanho, tamanho dos pedaços,
+# nome), algoritmo de compressão pedido + mapa dos pedaços do eco que o
+# cliente já tem.
+# RESUME_ACK (servidor -> cliente): digest, algoritmo aceito (o pedido ou
+# NONE) + mapa dos pedaços do envio que o servidor já tem. A compressão vale
+# para os dois sentidos da sessão. Os tipos não colidem com os do RDT nem com
+# os de path_mtu
+RESUME, RESUME_ACK = 0xE0, 0xE1
+RESUME_HEADER = struct.Struct('!B32sQIHB')
+RESUME_ACK_HEADER = struct.Struct('!B32sB')
+STATE_HEADER = struct.Struct('!32sQI')  # Início do arquivo .estado, igual ao do manifesto
+
+
+def file_digest(filename):
+    # SHA-256 do arquivo, lido em blocos para um buffer reaproveitado
+    digest = hashlib.sha256()
+    buffer = bytearray(DIGEST_BLOCK)
+    view = memoryview(buffer)
+    with open(filename, "rb") as f:
+        while True:
+            nbytes = f.readinto(buffer)
+            if not nbytes:
+                break
+            digest.update(view[:nbytes])
+    return digest.digest()
+
+
+def has_chunk(bitmap, index):
+    return bitmap[index // 8] & (0x80 >> (index % 8)) != 0
+
+
+def mark_chunk(bitmap, index):
+    bitmap[index // 8] |= 0x80 >> (index % 8)
+
+
+class Manifest:
+    # O que identifica o conteúdo nas duas pontas: nome, tamanho, tamanho dos
+    # pedaços e digest. Arquivos grandes usam pedaços maiores para o mapa de
+    # pedaços não passar de MAX_CHUNKS bits
+
+    def __init__(self, name, size, digest, chunk_size=None):
+        self.name = name
+        self.size = size
+        self.digest = digest
+        self.chunk_size = chunk_size or max(CHUNK_SIZE, -(-size // MAX_CHUNKS))
+        self.chunks = -(-size // self.chunk_size)
+        self.key = digest[:8].hex()  # Entra no nome do arquivo parcial
+
+    @classmethod
+    def from_file(cls, filename):
+        return cls(os.path.basename(filename), os.path.getsize(filename), file_digest(filename))
+
+    def empty_bitmap(self):
+        return bytearray(-(-self.chunks // 8))
+
+    def full_bitmap(self):
+        bitmap = self.empty_bitmap()
+        for index in range(self.chunks):
+            mark_chunk(bitmap, index)
+        return bitmap
+
+    def chunk_range(self, index):
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, self.size - offset)
+
+    def missing(self, have):
+        return [index for index in range(self.chunks) if not has_chunk(have, index)]
+
+    def missing_ranges(self, have):
+        # Pedaços que faltam, com os vizinhos emendados: [(início, tamanho)]
+        ranges = []
+        for index in self.missing(have):
+            offset, length = self.chunk_range(index)
+            if ranges and ranges[-1][0] + ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + length)
+            else:
+                ranges.append((offset, length))
+        return ranges
+
+    def bytes_in(self, have):
+        return sum(self.chunk_range(index)[1] for index in range(self.chunks) if has_chunk(have, index))
+
+    def matches(self, filename):
+        # O arquivo tem exatamente este conteúdo?
+        return (os.path.isfile(filename) and os.path.getsize(filename) == self.size
+                and file_digest(filename) == self.digest)
+
+
+def pack_resume(manifest, have, codec=NONE):
+    name = manifest.name.encode()
+    return (RESUME_HEADER.pack(RESUME, manifest.digest, manifest.size, manifest.chunk_size, len(name),
+                               codec)
+            + name + bytes(have))
+
+
+def parse_resume(packet):
+    # Devolve (manifesto, mapa de pedaços do par, algoritmo de compressão
+    # pedido), ou None se não for um RESUME
+    if len(packet) < RESUME_HEADER.size or packet[0] != RESUME:
+        return None
+    _, digest, size, chunk_size, name_length, codec = RESUME_HEADER.unpack_from(packet)
+    name_end = RESUME_HEADER.size + name_length
+    manifest = Manifest(bytes(packet[RESUME_HEADER.size:name_end]).decode(), size, digest, chunk_size)
+    have = bytearray(packet[name_end:])
+    if len(have) != len(manifest.empty_bitmap()):
+        return None
+    return manifest, have, codec
+
+
+def request_resume(sock, peer, manifest, have, codec=NONE, timeout=HANDSHAKE_TIMEOUT,
+                   attempts=RESUME_ATTEMPTS):
+    # Lado que inicia: envia o manifesto, os pedaços que já tem e o algoritmo de
+    # compressão que quer usar até o par responder. Devolve (pedaços que o par
+    # já tem, algoritmo aceito pelo par)
+    packet = pack_resume(manifest, have, codec)
+    previous_timeout = sock.gettimeout()
+    try:
+        for _ in range(attempts):
+            sock.sendto(packet, peer)
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                sock.settimeout(remaining)
+                try:
+                    data, _ = sock.recvfrom(MAX_DATAGRAM)
+                except socket.timeout:
+                    break
+                if len(data) < RESUME_ACK_HEADER.size or data[0] != RESUME_ACK:
+                    continue
+                _, digest, accepted = RESUME_ACK_HEADER.unpack_from(data)
+                peer_have = bytearray(data[RESUME_ACK_HEADER.size:])
+                if digest == manifest.digest and len(peer_have) == len(have) and accepted in (NONE, codec):
+                    return peer_have, accepted
+        raise TimeoutError("O par não respondeu ao pedido de retomada")
+    finally:
+        sock.settimeout(previous_timeout)
+
+
+def answer_resume(sock, peer, manifest, have, packet, codec=NONE):
+    # Lado que espera: packet é o RESUME já lido. Responde a ele e às repetições
+    # (a resposta pode se perder) até chegar o primeiro pacote do RDT, que é
+    # devolvido a quem chamou. Sobras da negociação de path_mtu são descartadas
+    reply = RESUME_ACK_HEADER.pack(RESUME_ACK, manifest.digest, codec) + bytes(have)
+    while parse_resume(packet) is not None or parse_control(packet) is not None:
+        if parse_resume(packet) is not None:
+            sock.sendto(reply, peer)
+        packet, peer = sock.recvfrom(MAX_DATAGRAM)
+    return packet
+
+
+class ResumableFile:
+    # Arquivo parcial que sobrevive a uma transferência interrompida. have diz
+    # quais pedaços já estão em disco (lido do .estado, se for do mesmo
+    # manifesto); rdt_rcv_file recebe só os que faltam, na ordem, como um único
+    # fluxo, e cada pedaço é gravado na sua posição. Tem a interface que
+    # rdt_rcv_file espera (write, write_at e size, em posições do fluxo)
+
+    def __init__(self, filename, manifest, have=None):
+        self.filename = filename
+        self.state_filename = filename + ".estado"
+        self.manifest = manifest
+        self.have = have if have is not None else self.load_state()
+        self.writer = None
+        self.size = 0
+        self.verified = False
+
+    def load_state(self):
+        try:
+            with open(self.state_filename, "rb") as f:
+                state = f.read()
+            if os.path.getsize(self.filename) > self.manifest.size:
+                raise ValueError("arquivo parcial maior que o manifesto")
+        except (OSError, ValueError):
+            return self.manifest.empty_bitmap()
+        have = bytearray(state[STATE_HEADER.size:])
+        header = (self.manifest.digest, self.manifest.size, self.manifest.chunk_size)
+        if len(state) < STATE_HEADER.size or STATE_HEADER.unpack_from(state) != header \
+                or len(have) != len(self.manifest.empty_bitmap()):
+            return self.manifest.empty_bitmap()
+        return have
+
+    def save_state(self):
+        # O mapa só é gravado depois dos dados, e troca o anterior de uma vez:
+        # uma queda no meio faz perder pedaços, nunca marcar um que não está lá
+        self.writer.flush()
+        temporary = self.state_filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(STATE_HEADER.pack(self.manifest.digest, self.manifest.size, self.manifest.chunk_size))
+            f.write(self.have)
+        os.replace(temporary, self.state_filename)
+        self.saved_at = time.monotonic()
+
+    def __enter__(self):
+        self.writer = MmapFileWriter(self.filename, self.manifest.size, keep=True)
+        self.missing = self.manifest.missing(self.have)
+        self.filled = {}  # {pedaço: bytes já gravados} dos pedaços incompletos
+        self.saved_at = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.save_state()
+        self.writer.close()
+
+    def write_at(self, offset, data):
+        chunk_size = self.manifest.chunk_size
+        position = 0
+        while position < len(data):
+            stream_offset = offset + position
+            index = self.missing[stream_offset // chunk_size]
+            start, length = self.manifest.chunk_range(index)
+            within = stream_offset % chunk_size
+            count = min(len(data) - position, length - within)
+            self.writer.write_at(start + within, data[position:position + count])
+            filled = self.filled.get(index, 0) + count
+            if filled >= length:
+                self.filled.pop(index, None)
+                mark_chunk(self.have, index)
+                if time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL:
+                    self.save_state()
+            else:
+                self.filled[index] = filled
+            position += count
+        self.size = max(self.size, offset + len(data))
+
+    def write(self, data):
+        self.write_at(self.size, data)
+
+    def verify(self):
+        # Confere o digest do arquivo montado. Se não bater, nada do que foi
+        # recebido serve para uma nova tentativa
+        if self.manifest.missing(self.have) or file_digest(self.filename) != self.manifest.digest:
+            self.discard()
+            raise ValueError(f"{self.manifest.name}: o digest não confere com o do manifesto")
+        self.verified = True
+
+    def publish(self, final_filename):
+        # O arquivo conferido ganha o nome final
+        if not self.verified:
+            self.verify()
+        if os.path.exists(final_filename) and os.path.samefile(self.filename, final_filename):
+            # Parcial criado como segundo nome do arquivo já publicado: rename
+            # entre dois nomes do mesmo arquivo não faz nada
+            os.remove(self.filename)
+        else:
+            os.replace(self.filename, final_filename)
+        if os.path.exists(self.state_filename):
+            os.remove(self.state_filename)
+
+    def discard(self):
+        for filename in (self.filename, self.state_filename):
+            if os.path.exists(filename):
+                os.remove(filename)
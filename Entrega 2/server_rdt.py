@@ -1,125 +1,267 @@
+import argparse
+import os
 import socket
-from rdt_protocol import RDT3_0_Receiver, RDT3_0_Sender
+import threading
+import time
+from rdt_protocol import (create_sender, create_receiver, send_buffer, format_stats, DecompressingWriter,
+                          LOSS_PROBABILITY, set_loss)
+from datagram_io import BatchedSocket, DEFAULT_RCVBUF, DEFAULT_SNDBUF
+from path_mtu import MAX_DATAGRAM, accept_negotiation
+from congestion import DUPACK_THRESHOLD
+from sessions import SessionServer, MAX_SESSIONS
+from multistream import StreamTable, parse_stream_request
+from resume import ResumableFile, answer_resume, parse_resume
+from echo_cache import EchoCache, ECHO_CACHE_BYTES
+from compression import CODEC_NAMES, NONE, available, codec_name, negotiate_codec
+from metrics import METRICS, serve_http
+from packet_log import LEVELS, setup as setup_log
 
 HOST = "127.0.0.1"
 PORT = 5000
 SERVER_ADDRESS = (HOST, PORT)
 
-BUFFER_SIZE = 1023  # Reservando apenas 1 byte para o número de sequência
+parser = argparse.ArgumentParser(description="Servidor de transferência de arquivos sobre RDT")
+parser.add_argument("--modo", choices=["rdt3", "sr", "fec"], default="rdt3",
+                    help="rdt3 = stop-and-wait, sr = Selective Repeat (janela deslizante), "
+                         "fec = stop-and-wait por blocos com paridade (correção de erros adiante)")
+parser.add_argument("--janela", type=int, default=8,
+                    help="tamanho da janela no modo sr; pacotes de dados por bloco no modo fec")
+parser.add_argument("--paridade", type=int, default=None,
+                    help="pacotes de paridade por bloco no modo fec (padrão: conforme a perda observada)")
+parser.add_argument("--dupacks", type=int, default=DUPACK_THRESHOLD,
+                    help="ACKs repetidos que disparam a retransmissão rápida, sem esperar o timeout")
+parser.add_argument("--rcvbuf", type=int, default=DEFAULT_RCVBUF, help="SO_RCVBUF do socket, em bytes")
+parser.add_argument("--sndbuf", type=int, default=DEFAULT_SNDBUF, help="SO_SNDBUF do socket, em bytes")
+parser.add_argument("--datagrama", type=int, default=MAX_DATAGRAM,
+                    help="maior datagrama aceito do cliente; o tamanho usado é sondado no caminho")
+parser.add_argument("--sessoes", type=int, default=MAX_SESSIONS,
+                    help="clientes atendidos ao mesmo tempo")
+parser.add_argument("--cache-eco", type=int, default=ECHO_CACHE_BYTES,
+                    help="bytes de arquivos recentes mantidos mapeados em memória para o eco")
+parser.add_argument("--compressao", nargs="+", choices=list(CODEC_NAMES),
+                    default=[codec_name(codec) for codec in sorted(available())],
+                    help="algoritmos de compressão que o servidor aceita usar (padrão: todos os disponíveis)")
+parser.add_argument("--porta", type=int, default=PORT,
+                    help="porta do servidor (outra que não a 5000 para os clientes passarem pelo net_emulator.py)")
+parser.add_argument("--perda", type=float, default=LOSS_PROBABILITY,
+                    help="perda simulada nos envios (0 para deixar as perdas com o net_emulator.py)")
+parser.add_argument("--semente", type=int, default=None, help="semente da perda simulada, para repetir as mesmas perdas")
+parser.add_argument("--log", choices=list(LEVELS), default="info",
+                    help="nível das mensagens; debug mostra uma linha por pacote (custa mais que o envio)")
+parser.add_argument("--stats", type=int, default=None,
+                    help="porta de administração (HTTP, só em 127.0.0.1) que devolve as métricas em JSON")
+args = parser.parse_args()
+unavailable = [name for name in args.compressao if CODEC_NAMES[name] not in available()]
+if unavailable:
+    parser.error(f"compressão indisponível neste Python: {', '.join(unavailable)}")
+set_loss(args.perda, args.semente)
+setup_log(args.log)
+PORT = args.porta
+SERVER_ADDRESS = (HOST, PORT)
+
+# Transferências divididas em vários fluxos (um por sessão), montadas por posição
+streams = StreamTable()
+
+# Arquivos parciais sendo recebidos agora, de envios que podem ser retomados
+receiving = set()
+receiving_lock = threading.Lock()
+
+# Arquivos publicados há pouco, mapeados em memória para o eco e downloads repetidos
+echo_cache = EchoCache(args.cache_eco)
+
+# Algoritmos que um cliente pode pedir; sem compressão é sempre aceito
+allowed_codecs = {NONE} | {CODEC_NAMES[name] for name in args.compressao}
+
+
+def serve_client(client_socket):
+    # Atende um cliente do começo ao fim. client_socket é o socket da sessão: só
+    # recebe os datagramas deste cliente, e os sender/receiver criados aqui são
+    # só desta sessão
+    client_address = client_socket.address
+    started = time.monotonic()
+
+    # Responde à negociação do tamanho dos datagramas
+    datagram_size, peer, first_packet = accept_negotiation(client_socket, args.datagrama)
+    print(f"Servidor: Cliente {client_address} usando datagramas de até {datagram_size} bytes")
+
+    # Pedido de retomada: o cliente descreve o arquivo (manifesto) e diz quais
+    # pedaços do eco já tem; a resposta diz quais pedaços do envio já estão
+    # aqui e se a compressão pedida foi aceita. O primeiro pacote depois dele
+    # já é do RDT e volta para a fila da sessão
+    upload = None
+    codec = NONE
+    resume = parse_resume(first_packet)
+    if resume is not None:
+        manifest, echo_have, requested = resume
+        codec = negotiate_codec(requested, allowed_codecs)
+        upload = open_upload(manifest, client_address)
+        print(f"Servidor: {manifest.bytes_in(upload.have)} de {manifest.size} bytes de "
+              f"{manifest.name} já estavam aqui; compressão: {codec_name(codec)}")
+        first_packet = answer_resume(client_socket, peer, manifest, upload.have, first_packet, codec)
+    client_socket.unread(first_packet, peer)
+
+    try:
+        # ========== RECEBENDO ARQUIVO DO CLIENTE ==========
+        print(f"Servidor: Iniciando protocolo {args.modo} para recepção")
+
+        rdt_receiver = create_receiver(client_socket, args.modo, args.janela, datagram_size)
+
+        request = rdt_receiver.rdt_rcv(client_address)
+        stream = parse_stream_request(request)
+        if stream is not None:
+            serve_stream(client_socket, rdt_receiver, datagram_size, stream)
+            return
+        if upload is None:
+            raise ValueError(f"{client_address} não enviou o manifesto do arquivo")
+
+        filename = request.decode()
+        print(f"Servidor: Nome do arquivo recebido de {client_address}: {filename}")
+
+        # cria o nome do arquivo que será salvo no servidor!
+        server_filename = "server_" + os.path.basename(filename)
+
+        print("Iniciando recepção do arquivo usando RDT...")
+
+        # Só chegam os pedaços que faltam; cada um vai direto para a sua posição
+        # do arquivo parcial, e o que já chegou fica salvo se a sessão cair.
+        # Com compressão, os blocos são descomprimidos antes de ir para o parcial
+        with upload:
+            writer = DecompressingWriter(upload) if codec != NONE else upload
+            received = rdt_receiver.rdt_rcv_file(writer, client_address)
+        print(f"Servidor: {received} bytes recebidos de {client_address} ({upload.size} descomprimidos)")
+
+        # Confere o digest do arquivo montado antes de publicá-lo
+        upload.verify()
+
+        # O eco sai do arquivo mapeado em memória (ainda no page cache, sem reler
+        # nem copiar). Ele é mapeado pelo nome do parcial, que é só desta sessão,
+        # antes de ser publicado: se outro cliente publicar logo em seguida um
+        # arquivo diferente com o mesmo nome, o eco continua sendo este
+        with echo_cache.open(server_filename, manifest.digest, upload.filename) as data:
+            upload.publish(server_filename)
+
+            print("Arquivo recebido com sucesso pelo servidor usando RDT.")
+
+            # ========== PROCESSAR ARQUIVO RECEBIDO E ENVIAR PARA CLIENTE ==========
+            print("Servidor: Iniciando envio")
+
+            # Cria o sender no mesmo modo do receiver
+            rdt_sender = create_sender(client_socket, client_address, args.modo, args.janela, rdt_receiver,
+                                       datagram_size, args.dupacks, args.paridade)
+
+            # Processar arquivo recebido - enviar nome do arquivo processado para o cliente
+            print(f"Servidor: Enviando nome do arquivo: {server_filename}")
+            rdt_sender.rdt_send(server_filename.encode())
+
+            # Enviar arquivo processado de volta para o cliente
+            print("Iniciando envio do arquivo processado para o cliente usando RDT...")
+
+            # Só os pedaços do eco que o cliente ainda não tem
+            sent = send_buffer(rdt_sender, data, manifest.missing_ranges(echo_have), codec)
+        print(f"Servidor: {sent} bytes enviados para {client_address} em {rdt_sender.packets} pacotes "
+              f"({format_stats(rdt_sender)}; cache do eco: {echo_cache.hits} acertos, {echo_cache.misses} faltas)")
+
+        print("Arquivo processado enviado com sucesso para o cliente usando RDT!")
+        METRICS.incr("transferencias.concluidas")
+        METRICS.incr("transferencias.bytes_recebidos", received)
+        METRICS.incr("transferencias.bytes_enviados", sent)
+        METRICS.observe("transferencias.duracao", time.monotonic() - started)
+    finally:
+        # Um envio interrompido continua no arquivo parcial, para ser retomado
+        if upload is not None:
+            with receiving_lock:
+                receiving.discard(upload.filename)
+
+
+def open_upload(manifest, client_address):
+    # Arquivo parcial do envio descrito pelo manifesto. O nome depende do
+    # conteúdo (digest), então um cliente que volta depois de uma queda, de
+    # qualquer porta, reencontra o que já tinha enviado
+    server_filename = "server_" + os.path.basename(manifest.name)
+    partial_filename = f"{server_filename}.{manifest.key}.parcial"
+    with receiving_lock:
+        # Dois clientes enviando o mesmo arquivo ao mesmo tempo não dividem o parcial
+        if partial_filename in receiving:
+            partial_filename = f"{server_filename}.{manifest.key}.{client_address[1]}.parcial"
+        receiving.add(partial_filename)
+    if not os.path.exists(partial_filename) and os.path.exists(server_filename):
+        # Se o arquivo já foi publicado com esse conteúdo, não falta nada. O
+        # parcial vira um segundo nome (hard link) para ele, que continua com
+        # este conteúdo mesmo que outro cliente publique outro arquivo por cima
+        try:
+            os.link(server_filename, partial_filename)
+        except OSError:
+            pass
+        else:
+            if manifest.matches(partial_filename):
+                return ResumableFile(partial_filename, manifest, manifest.full_bitmap())
+            os.remove(partial_filename)
+    return ResumableFile(partial_filename, manifest)
+
+
+def serve_stream(client_socket, rdt_receiver, datagram_size, stream):
+    # Um dos fluxos de uma transferência paralela: recebe o seu trecho direto na
+    # posição dele no arquivo compartilhado e devolve o mesmo trecho ao cliente
+    client_address = client_socket.address
+    transfer_id, index, count, offset, length, size, filename = stream
+    print(f"Servidor: Fluxo {index + 1}/{count} de {client_address}: {filename}, "
+          f"bytes {offset} a {offset + length} de {size}")
+
+    server_filename = "server_" + os.path.basename(filename)
+    key = (client_address[0], transfer_id)
+    shared = streams.join(key, f"{server_filename}.{transfer_id}.parcial", server_filename, size, count)
+
+    received = None
+    try:
+        received = rdt_receiver.rdt_rcv_file(shared.range(offset), client_address)
+        print(f"Servidor: {received} bytes recebidos de {client_address}")
+
+        rdt_sender = create_sender(client_socket, client_address, args.modo, args.janela, rdt_receiver,
+                                   datagram_size, args.dupacks, args.paridade)
+        rdt_sender.rdt_send(server_filename.encode())
+        # O trecho sai direto do mapa em que acabou de ser gravado
+        sent = send_buffer(rdt_sender, shared.writer.map, [(offset, received)])
+        print(f"Servidor: {sent} bytes enviados para {client_address} ({format_stats(rdt_sender)})")
+        METRICS.incr("transferencias.fluxos_concluidos")
+        METRICS.incr("transferencias.bytes_recebidos", received)
+        METRICS.incr("transferencias.bytes_enviados", sent)
+    finally:
+        # O último fluxo a terminar publica o arquivo (ou o descarta, se algum falhou)
+        published = streams.leave(key, received == length)
+        if published:
+            print(f"Servidor: Arquivo {published} montado a partir de {count} fluxos")
+
 
 # criando o socket do servidor
-server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+# Lê em lote todos os datagramas prontos a cada vez que o socket acorda
+server_socket = BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), args.rcvbuf, args.sndbuf,
+                              datagram_size=args.datagrama)
 
 # vinculando o servidor ao endereço especificado
 server_socket.bind(SERVER_ADDRESS)
 
 print(f"Servidor UDP iniciado e escutando em {HOST}:{PORT}")
-print("Aguardando um cliente se conectar...")
+print("Aguardando clientes...")
+
+# Cada cliente ganha sua própria sessão (e thread); todas dividem este socket
+session_server = SessionServer(server_socket, serve_client, args.sessoes)
+
+# Medidores lidos só quando alguém consulta as métricas
+METRICS.gauge("sessoes.ativas", lambda: len(session_server.sessions))
+METRICS.gauge("sessoes.datagramas_na_fila",
+              lambda: sum(len(session.inbox) for session in list(session_server.sessions.values())))
+METRICS.gauge("socket.envios_na_fila", lambda: len(server_socket.outbox))
+METRICS.gauge("eco.acertos", lambda: echo_cache.hits)
+METRICS.gauge("eco.faltas", lambda: echo_cache.misses)
+if args.stats:
+    serve_http(args.stats)
+    print(f"Métricas em http://127.0.0.1:{args.stats}/")
 
 try:
-    # ========== RECEBENDO ARQUIVO DO CLIENTE ==========
-    print("Servidor: Iniciando protocolo RDT3.0 para recepção")
-    
-    # Primeiro, vamos receber uma mensagem UDP normal para obter o endereço do cliente
-    first_msg, client_address = server_socket.recvfrom(1024)
-    print(f"Servidor: Cliente conectado de {client_address}")
-    
-    # Agora processa essa primeira mensagem e as próximas usando RDT3.0
-    rdt_receiver = RDT3_0_Receiver(server_socket)
-    
-    # Processa a primeira mensagem (nome do arquivo)
-    if rdt_receiver.has_seq(first_msg, 0):  # Esperamos que seja seq=0
-        filename_data = rdt_receiver.extract_data(first_msg)
-        filename = filename_data.decode()
-        # Envia ACK
-        ack_pkt = rdt_receiver.make_pkt(0, b'')
-        server_socket.sendto(ack_pkt, client_address)
-        rdt_receiver.expected_seq = 1  # Próximo esperado é 1
-        print(f"Servidor: Nome do arquivo recebido: {filename}")
-    else:
-        print("Servidor: Erro na primeira mensagem")
-        exit()
-
-    # cria o nome do arquivo que será salvo no servidor!
-    server_filename = "server_" + filename
-
-    print("Iniciando recepção do arquivo usando RDT3.0...")
-
-    # cria um novo arquivo no modo "write binary" para escrever o arquivo recebido
-    with open(server_filename, "wb") as f:
-        while True:
-            # recebe um pedaço do arquivo usando RDT3.0
-            data = rdt_receiver.rdt_rcv(client_address)
-
-            # se não receber dados do cliente, encerra o laço
-            if not data or len(data) == 0:
-                print("Servidor: Recebido pacote de finalização")
-                break
-
-            # adiciona a sequencia de bytes no arquivo
-            f.write(data)
-            print(f"Servidor: Recebido chunk de {len(data)} bytes")
-
-    print("Arquivo recebido com sucesso pelo servidor usando RDT3.0.")
-
-    # ========== PROCESSAR ARQUIVO RECEBIDO E ENVIAR PARA CLIENTE ==========
-    print("Servidor: Iniciando envio")
-    
-    # Cria o sender RDT3.0
-    rdt_sender = RDT3_0_Sender(server_socket, client_address)
-
-    # Processar arquivo recebido - enviar nome do arquivo processado para o cliente
-    print(f"Servidor: Enviando nome do arquivo: {server_filename}")
-    rdt_sender.rdt_send(server_filename.encode())
-
-    # Enviar arquivo processado de volta para o cliente
-    print("Iniciando envio do arquivo processado para o cliente usando RDT3.0...")
-
-    with open(server_filename, "rb") as f:
-        while True:
-            # Lê 1024 bytes do arquivo
-            chunk = f.read(BUFFER_SIZE)
-            
-            # Se não ler dados do arquivo, envia pacote vazio e encerra o laço
-            if not chunk:
-                print("Servidor: Enviando pacote de finalização")
-                rdt_sender.rdt_send(b'')  # Envia pacote vazio para sinalizar fim
-                break
-            
-            # Envia partes do arquivo usando RDT3.0
-            print(f"Servidor: Enviando chunk de {len(chunk)} bytes")
-            rdt_sender.rdt_send(chunk)
-
-    print("Arquivo processado enviado com sucesso para o cliente usando RDT3.0!")
-
-    # Processar arquivo recebido - enviar nome do arquivo processado para o cliente
-    print(f"Servidor: Enviando nome do arquivo: {server_filename}")
-    rdt_sender.rdt_send(server_filename.encode())
-
-    # Enviar arquivo processado de volta para o cliente
-    print("Iniciando envio do arquivo processado para o cliente usando RDT3.0...")
-
-    with open(server_filename, "rb") as f:
-        while True:
-            # Lê 1024 bytes do arquivo
-            chunk = f.read(BUFFER_SIZE)
-            
-            # Se não ler dados do arquivo, envia pacote vazio e encerra o laço
-            if not chunk:
-                print("Servidor: Enviando pacote de finalização")
-                rdt_sender.rdt_send(b'')  # Envia pacote vazio para sinalizar fim
-                break
-            
-            # Envia partes do arquivo usando RDT3.0
-            print(f"Servidor: Enviando chunk de {len(chunk)} bytes")
-            rdt_sender.rdt_send(chunk)
-
-    print("Arquivo processado enviado com sucesso para o cliente usando RDT3.0!")
-
-except Exception as e:
-    print(f"Ocorreu um erro durante a execução: {e}")
-    import traceback
-    traceback.print_exc()
+    session_server.serve_forever()
+
+except KeyboardInterrupt:
+    print("\nServidor: Encerrando")
 
 finally:
     server_socket.close()
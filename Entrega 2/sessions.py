@@ -0,0 +1,178 @@
+import select
+import socket
+import threading
+import time
+import traceback
+from collections import deque
+from path_mtu import HELLO, parse_control
+from metrics import METRICS
+from packet_log import dump_packets
+
+# --- Configuração das sessões ---
+MAX_SESSIONS = 64            # Clientes atendidos ao mesmo tempo
+SESSION_QUEUE = 1024         # Datagramas guardados por sessão antes de descartar
+SESSION_IDLE_TIMEOUT = 30.0  # Sessão sem nenhum datagrama do cliente por esse tempo é encerrada
+
+
+class SessionExpired(Exception):
+    # O cliente ficou em silêncio por mais de SESSION_IDLE_TIMEOUT
+    pass
+
+
+class SessionSocket:
+    # O que uma sessão enxerga do socket compartilhado: só os datagramas do seu
+    # cliente, entregues pelo SessionServer, e os envios saem pelo socket único.
+    # Imita a parte da API de socket usada pelos protocolos, então cada sessão
+    # roda as máquinas de estado RDT de sempre, com estado só seu
+
+    def __init__(self, server, address, max_queue=SESSION_QUEUE, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.server = server
+        self.address = address
+        self.max_queue = max_queue
+        self.idle_timeout = idle_timeout
+        self.timeout = None  # Timeout emulado de recvfrom (None = até a sessão expirar)
+        self.inbox = deque()
+        self.ready = threading.Condition()
+        self.last_heard = time.monotonic()  # Último datagrama vindo do cliente
+        self.dropped = 0
+
+    def deliver(self, data):
+        # Chamado pelo SessionServer; com a fila cheia o datagrama é descartado,
+        # como faria o buffer do kernel, e o RDT retransmite
+        with self.ready:
+            self.last_heard = time.monotonic()
+            if len(self.inbox) >= self.max_queue:
+                self.dropped += 1
+                METRICS.incr("sessoes.datagramas_descartados")
+                return
+            self.inbox.append(data)
+            self.ready.notify()
+
+    def unread(self, data, address):
+        with self.ready:
+            self.inbox.appendleft(data)
+            self.ready.notify()
+
+    def next_datagram(self):
+        # Espera respeitando o timeout do socket, mas nunca além do prazo de inatividade
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        with self.ready:
+            while not self.inbox:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    raise socket.timeout("timed out")
+                idle_deadline = self.last_heard + self.idle_timeout
+                if now >= idle_deadline:
+                    raise SessionExpired(f"{self.address} sem enviar nada há {self.idle_timeout:.0f} s")
+                self.ready.wait(min(idle_deadline, deadline or idle_deadline) - now)
+            return self.inbox.popleft()
+
+    def recvfrom(self, bufsize):
+        return self.next_datagram()[:bufsize], self.address
+
+    def recvfrom_into(self, buffer, nbytes=0):
+        data = self.next_datagram()
+        size = min(len(data), nbytes or len(buffer))
+        buffer[:size] = data[:size]
+        return size, self.address
+
+    def sendto(self, data, address):
+        return self.server.send(self.server.sock.sendto, data, address)
+
+    def sendmsg(self, buffers, ancdata=(), flags=0, address=None):
+        return self.server.send(self.server.sock.sendmsg, buffers, ancdata, flags, address)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def getsockname(self):
+        return self.server.sock.getsockname()
+
+
+class SessionServer:
+    # Vários clientes ao mesmo tempo sobre um único socket (um BatchedSocket). Uma
+    # thread lê o socket e separa os datagramas pelo endereço de origem; cada
+    # endereço novo que começa com um HELLO (ver path_mtu) ganha um SessionSocket
+    # e uma thread rodando handler(session_socket). A sessão sai da tabela quando
+    # o handler termina ou o cliente some por SESSION_IDLE_TIMEOUT
+
+    def __init__(self, sock, handler, max_sessions=MAX_SESSIONS):
+        self.sock = sock
+        self.handler = handler
+        self.max_sessions = max_sessions
+        self.sessions = {}  # {(ip, porta): SessionSocket}
+        self.lock = threading.Lock()       # Protege a tabela de sessões
+        self.send_lock = threading.Lock()  # O BatchedSocket não é thread-safe para envio
+        # Um envio que fica na fila do BatchedSocket acorda a thread que lê o
+        # socket, para ela esperar também o socket voltar a aceitar escrita
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.wake_writer.setblocking(False)
+        sock.on_backlog = self.wake
+
+    def wake(self):
+        try:
+            self.wake_writer.send(b'\0')
+        except BlockingIOError:
+            pass  # Já há um aviso pendente
+
+    def send(self, method, *args):
+        with self.send_lock:
+            return method(*args)
+
+    def serve_forever(self):
+        while True:
+            with self.send_lock:
+                writers = [self.sock] if self.sock.outbox else []
+            readable, writable, _ = select.select([self.sock, self.wake_reader], writers, [])
+            if self.wake_reader in readable:
+                self.wake_reader.recv(4096)
+            try:
+                if writable:
+                    with self.send_lock:
+                        self.sock.flush()
+                if self.sock in readable:
+                    self.sock.drain()
+            except OSError as exc:
+                print(f"Servidor: Erro no socket: {exc}")
+            item = self.sock.pop()
+            while item is not None:
+                self.dispatch(*item)
+                item = self.sock.pop()
+
+    def dispatch(self, data, address):
+        with self.lock:
+            session = self.sessions.get(address)
+            if session is None:
+                # Só um HELLO abre sessão: restos de uma sessão encerrada são descartados
+                message = parse_control(data)
+                if message is None or message[0] != HELLO:
+                    return
+                if len(self.sessions) >= self.max_sessions:
+                    METRICS.incr("sessoes.recusadas")
+                    print(f"Servidor: Limite de {self.max_sessions} sessões, ignorando {address}")
+                    return
+                session = self.sessions[address] = SessionSocket(self, address)
+                METRICS.incr("sessoes.abertas")
+                # Contadas aqui, sob o lock: as outras threads abrem e fecham sessões ao mesmo tempo
+                active = len(self.sessions)
+                threading.Thread(target=self.run_session, args=(session, active), daemon=True).start()
+        session.deliver(data)
+
+    def run_session(self, session, active):
+        print(f"Servidor: Sessão aberta para {session.address} ({active} ativas)")
+        try:
+            self.handler(session)
+        except SessionExpired as exc:
+            print(f"Servidor: Sessão encerrada: {exc}")
+        except Exception:
+            print(f"Servidor: Erro na sessão de {session.address}")
+            traceback.print_exc()
+            dump_packets(f"erro na sessão de {session.address[0]}:{session.address[1]}")
+        finally:
+            with self.lock:
+                self.sessions.pop(session.address, None)
+            print(f"Servidor: Sessão de {session.address} encerrada")
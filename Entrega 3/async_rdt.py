@@ -0,0 +1,272 @@
+import asyncio
+import time
+from collections import deque
+from rdt_protocol import (MAX_RETRIES, FRAGMENT_WINDOW, prepare_message, ack_key, ack_window, is_ack,
+                          acked_fragments, request_ack)
+from rdt_timer import RtoEstimator
+from congestion import CongestionController, DUPACK_THRESHOLD
+from metrics import METRICS
+
+
+class OutboundSession:
+    # estado rdt de envio para um destino: fila de mensagens e janela de fragmentos em transito
+
+    def __init__(self):
+        self.queue = deque()      # (mensagem, done) aguardando envio
+        self.datagrams = ()       # fragmentos da mensagem atual
+        self.key = None           # ack_key da mensagem atual
+        self.next_index = 0       # proximo fragmento ainda nao enviado
+        self.in_flight = {}       # {indice: [ultimo envio em, retransmitido, tentativas, handle do call_later]}
+        self.done = None          # callback da mensagem atual
+        self.rto = RtoEstimator()
+        self.cc = CongestionController(FRAGMENT_WINDOW)
+        self.peer_window = FRAGMENT_WINDOW  # ultima janela anunciada pelo destino
+        self.duplicate_acks = 0             # acks seguidos sem nada novo confirmado
+        self.pacing = None                  # handle do call_later do proximo fragmento espacado
+        self.held = None                    # fragmento ja contado como segurado pelo espacamento
+
+    def window(self):
+        return min(self.cc.window, self.peer_window)
+
+    def window_open(self):
+        # sem nada em transito sempre sai um fragmento, que traz de volta a janela do destino
+        if self.next_index >= len(self.datagrams):
+            return False
+        return not self.in_flight or len(self.in_flight) < self.window()
+
+    def busy(self):
+        return bool(self.datagrams)
+
+
+class AsyncRdtEndpoint(asyncio.DatagramProtocol):
+    """
+    rdt 3.0 sobre um unico socket udp, dirigido pelo loop do asyncio.
+
+    os datagramas de dados recebidos sao repassados para on_datagram(endpoint,
+    pacote, endereco); o endpoint expoe sendto() para que receive_data possa
+    responder os acks pelo mesmo socket. os envios feitos com send_message nao
+    bloqueiam: cada destino tem sua fila, uma janela de congestionamento
+    (limitada tambem pela janela anunciada nos acks) de fragmentos da mensagem
+    atual em transito, espacados ao longo do rtt, e um timer por fragmento, e
+    done(ok) e chamado quando a mensagem e confirmada ou abandonada. os acks
+    sao cumulativos com sack, como em send_data, e dupacks acks repetidos
+    disparam a retransmissao rapida.
+    """
+
+    def __init__(self, on_datagram, dupacks=DUPACK_THRESHOLD):
+        self.on_datagram = on_datagram
+        self.dupacks = dupacks
+        self.transport = None
+        self.loop = None
+        self.sessions = {}  # {(ip, porta): OutboundSession}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+
+    def sendto(self, data, address):
+        try:
+            self.transport.sendto(data, address)
+        except OSError as exc:
+            # mesmo tratamento do transporte do asyncio: o erro vira aviso, o timer reenvia
+            self.error_received(exc)
+
+    def datagram_received(self, data, address):
+        # acks confirmam nossos envios; o resto sao dados vindos dos clientes
+        if is_ack(data):
+            self._handle_ack(data, address)
+        else:
+            self.on_datagram(self, data, address)
+
+    def error_received(self, exc):
+        print(f"aviso: erro no socket do servidor: {exc}")
+
+    def send_message(self, message, address, done=None):
+        # enfileira a mensagem para o destino e retorna imediatamente
+        session = self.sessions.get(address)
+        if session is None:
+            session = self.sessions[address] = OutboundSession()
+        session.queue.append((message, done))
+        if not session.busy():
+            self._send_next(address, session)
+
+    def send_message_to(self, address, message, done):
+        # mesma assinatura de transmissor esperada pelo FanoutEngine
+        self.send_message(message, address, done)
+
+    def forget(self, address):
+        # descarta o estado de envio de um destino (ex.: cliente desconectado)
+        session = self.sessions.pop(address, None)
+        if session is None:
+            return
+        for state in session.in_flight.values():
+            state[3].cancel()
+        if session.pacing is not None:
+            session.pacing.cancel()
+        # avisa quem esperava pelas mensagens que elas nao serao entregues
+        pending = [session.done] if session.busy() else []
+        pending.extend(done for _, done in session.queue)
+        for done in pending:
+            if done:
+                done(False)
+
+    def _send_next(self, address, session):
+        # passa para a proxima mensagem da fila e envia a primeira janela de fragmentos
+        if session.busy() and session.done:
+            session.done(True)
+        session.datagrams = ()
+        while session.queue and not session.busy():
+            message, done = session.queue.popleft()
+            datagrams = prepare_message(message)
+            if not datagrams:
+                # mensagem vazia: nao ha o que confirmar
+                if done:
+                    done(True)
+                continue
+            session.datagrams, session.done = datagrams, done
+            METRICS.incr("rdt.mensagens_enviadas")
+            session.key = ack_key(datagrams[0])
+            session.next_index = 0
+            session.held = None
+            session.duplicate_acks = 0
+            self._fill_window(address, session)
+
+    def _fill_window(self, address, session):
+        now = time.monotonic()
+        while session.window_open():
+            index = session.next_index
+            delay = session.cc.pacing_delay(now)
+            if delay > 0:
+                # ainda nao e a vez do proximo fragmento: agenda o resto da janela
+                if session.held != index:
+                    # conta uma vez por fragmento, mesmo que ele espere mais de uma vez
+                    session.held = index
+                    session.cc.paced += 1
+                if session.pacing is None:
+                    session.pacing = self.loop.call_later(delay, self._paced_fill, address)
+                return
+            session.next_index += 1
+            datagram = session.datagrams[index]
+            if session.next_index == len(session.datagrams) or len(session.in_flight) + 1 >= session.window():
+                # ultimo antes de esperar acks: pede o ack na hora (mesmo criterio de send_data)
+                datagram = request_ack(datagram)
+            self.sendto(datagram, address)
+            session.in_flight[index] = [now, False, 0, self._arm_timer(address, session, index)]
+            session.cc.on_send(session.rto.srtt, now)
+            METRICS.incr("rdt.fragmentos_enviados")
+
+    def _paced_fill(self, address):
+        session = self.sessions.get(address)
+        if session is None:
+            return
+        session.pacing = None
+        self._fill_window(address, session)
+
+    def _arm_timer(self, address, session, index):
+        return self.loop.call_later(session.rto.timeout, self._on_timeout, address, index)
+
+    def _retransmit(self, address, session, index):
+        state = session.in_flight[index]
+        state[0], state[1] = time.monotonic(), True
+        state[3].cancel()
+        METRICS.incr("rdt.retransmissoes")
+        self.sendto(request_ack(session.datagrams[index]), address)
+        state[3] = self._arm_timer(address, session, index)
+
+    def _on_timeout(self, address, index):
+        session = self.sessions.get(address)
+        if session is None or index not in session.in_flight:
+            return
+        state = session.in_flight[index]
+        state[2] += 1
+        if state[2] > MAX_RETRIES:
+            # destino inalcancavel: descarta o que estava pendente para ele
+            print(f"aviso: {address} nao confirmou o pacote, desistindo.")
+            METRICS.incr("rdt.mensagens_abandonadas")
+            self.forget(address)
+            return
+        # uma rajada de timeouts da mesma janela dobra o rto e corta a janela uma vez so
+        if index == min(session.in_flight):
+            session.rto.backoff()
+            session.cc.on_timeout(len(session.in_flight))
+            METRICS.incr("rdt.timeouts")
+        self._retransmit(address, session, index)
+
+    def _handle_ack(self, ack_packet, address):
+        session = self.sessions.get(address)
+        if session is None or not session.in_flight:
+            return
+        if ack_key(ack_packet) == session.key:
+            session.peer_window = ack_window(ack_packet)
+            acked = acked_fragments(ack_packet, session.in_flight)
+        else:
+            # ack incorreto: conta como ack repetido (mesmo comportamento de send_data)
+            METRICS.incr("rdt.acks_incorretos")
+            acked = ()
+        session.duplicate_acks = 0 if acked else session.duplicate_acks + 1
+        sent_at = None
+        for index in sorted(acked):
+            state = session.in_flight.pop(index)
+            state[3].cancel()
+            session.cc.on_ack(index)
+            # regra de karn: so o fragmento mais recente nao retransmitido vale como amostra
+            if not state[1] and (sent_at is None or state[0] > sent_at):
+                sent_at = state[0]
+        if sent_at is not None:
+            rtt = time.monotonic() - sent_at
+            session.rto.sample(rtt)
+            METRICS.observe("rdt.rtt", rtt)
+        if session.in_flight:
+            # dupacks fragmentos posteriores ao mais antigo ja confirmados, ou dupacks acks
+            # repetidos: ele e dado como perdido e reenviado sem esperar o timeout, no
+            # maximo uma vez por rtt (mesmo criterio de send_data)
+            oldest = min(session.in_flight)
+            later_acked = (session.next_index - oldest - 1) - (len(session.in_flight) - 1)
+            if (max(later_acked, session.duplicate_acks) >= self.dupacks
+                    and not session.rto.within_rtt(session.in_flight[oldest][0])):
+                session.duplicate_acks = 0
+                session.cc.on_loss(len(session.in_flight), session.next_index - 1)
+                session.in_flight[oldest][2] += 1
+                METRICS.incr("rdt.retransmissoes_rapidas")
+                self._retransmit(address, session, oldest)
+        if session.in_flight or session.next_index < len(session.datagrams):
+            self._fill_window(address, session)
+        else:
+            self._send_next(address, session)
+
+
+def attach_batched_socket(loop, io, endpoint):
+    # liga um BatchedSocket ao loop no lugar de create_datagram_endpoint: cada vez
+    # que o socket acorda todos os datagramas prontos sao lidos de uma vez e
+    # entregues ao endpoint, e os envios que o kernel recusar esperam o socket
+    # voltar a aceitar escrita
+    fd = io.fileno()
+
+    def on_readable():
+        try:
+            io.drain()
+        except OSError as exc:
+            endpoint.error_received(exc)
+        item = io.pop()
+        while item is not None:
+            endpoint.datagram_received(*item)
+            item = io.pop()
+
+    def on_writable():
+        try:
+            flushed = io.flush()
+        except OSError as exc:
+            endpoint.error_received(exc)
+            flushed = not io.outbox
+        if flushed:
+            loop.remove_writer(fd)
+
+    io.on_backlog = lambda: loop.add_writer(fd, on_writable)
+    loop.add_reader(fd, on_readable)
+    endpoint.connection_made(io)
+
+    def detach():
+        loop.remove_reader(fd)
+        loop.remove_writer(fd)
+        io.close()
+    return detach
@@ -0,0 +1,120 @@
+"""
+micro-benchmark do enquadramento dos pacotes do chat.
+
+compara o formato de texto antigo ("{seq}::{payload}" e "ACK0"/"ACK1",
+fatiado por caracteres e recodificado a cada envio) com o cabecalho binario
+de rdt_protocol. para cada mensagem mostra quantos datagramas sao gerados,
+quantos passam de PACKET_SIZE (e seriam cortados pelo recvfrom do receptor),
+os bytes no fio (dados + acks; o binario confirma em acks cumulativos, um a
+cada ACK_EVERY fragmentos) e o tempo de cpu de uma troca completa: montar,
+retransmitir uma vez, interpretar (e remontar), responder o ack e conferir o
+ack. a ultima coluna mede so o lado do servidor em um broadcast para
+BROADCAST_USERS destinatarios (montar, retransmitir uma vez e conferir os acks).
+as linhas binario+zlib/lzma/bz2 usam a compressao negociada por sessao: os
+pacotes e bytes economizados aparecem direto nas colunas, e o custo de
+comprimir e descomprimir entra nos tempos.
+
+uso: python3 bench_framing.py [repeticoes]
+"""
+import sys
+import timeit
+from rdt_protocol import (PACKET_SIZE, FLAG_ACK_NOW, prepare_message, make_ack, parse_packet, ack_key,
+                          acked_fragments, decode_message, ReassemblyBuffer)
+from compression import ZLIB, LZMA, BZ2, available
+
+BROADCAST_USERS = 100
+
+# --- enquadramento de texto antigo (para comparacao) ---
+LEGACY_DELIMITER = "::"
+
+def legacy_send(message):
+    # o codigo antigo recodificava cada segmento em todo envio e retransmissao
+    payload_size = PACKET_SIZE - len(f"0{LEGACY_DELIMITER}")
+    frames = []
+    seq = 0
+    for offset in range(0, len(message), payload_size):
+        segment = message[offset : offset + payload_size]
+        for _ in range(2):
+            datagram = f"{seq}{LEGACY_DELIMITER}{segment}".encode('utf-8')
+        frames.append(datagram)
+        seq = 1 - seq
+    return frames
+
+def legacy_receive(datagram):
+    header, payload = datagram.split(LEGACY_DELIMITER.encode('utf-8'), 1)
+    return payload, f"ACK{int(header.decode('utf-8'))}".encode('utf-8')
+
+def legacy_check_ack(index, frame, ack):
+    return ack.decode('utf-8') == f"ACK{index % 2}"
+
+# --- cabecalho binario atual ---
+def binary_send(message):
+    # montados uma vez; a retransmissao reenvia o mesmo objeto bytes
+    return prepare_message(message)
+
+REASSEMBLY = ReassemblyBuffer(history=1)
+
+def binary_receive(datagram):
+    # acks atrasados: fragmentos em sequencia so sao confirmados a cada ACK_EVERY (ack none)
+    flags, connection_id, seq, message_id, index, count, payload = parse_packet(datagram)
+    _, message, confirm = REASSEMBLY.add(None, message_id, index, count, payload, flags & FLAG_ACK_NOW)
+    if message is not None:
+        decode_message(flags, message)
+    if not confirm:
+        return payload, None
+    cumulative, sack = REASSEMBLY.acknowledgement(None, message_id)
+    return payload, make_ack(seq, connection_id, message_id, cumulative,
+                             REASSEMBLY.window(None, message_id), sack)
+
+def binary_check_ack(index, frame, ack):
+    return ack is None or (ack_key(ack) == ack_key(frame) and index in acked_fragments(ack, (index,)))
+
+def compressed_send(codec):
+    # mesmo cabecalho, com a mensagem comprimida antes de ser fragmentada
+    return lambda message: prepare_message(message, codec=codec, accept=codec)
+
+FORMATS = [("texto", legacy_send, legacy_receive, legacy_check_ack),
+           ("binario", binary_send, binary_receive, binary_check_ack)]
+FORMATS += [(f"binario+{name}", compressed_send(codec), binary_receive, binary_check_ack)
+            for name, codec in (("zlib", ZLIB), ("lzma", LZMA), ("bz2", BZ2)) if codec in available()]
+
+MESSAGES = {
+    "chat curto": "127.0.0.1:40970/~ana: ola pessoal, tudo bem? 14:15:00 18/10/2026",
+    "aviso de votacao": "servidor: votacao para banir [usuario42] - votos: 3/7.",
+    "texto com :: e acentos": "votação para banir [joão] :: não é spam " * 4,
+    "lista de 2000 usuarios": "usuarios conectados:\n" + "\n".join(f"- usuario{i}" for i in range(2000)),
+    "texto multibyte longo": "ção " * 2000,
+}
+
+def exchange(send, receive, check_ack, message):
+    for index, frame in enumerate(send(message)):
+        _, ack = receive(frame)
+        check_ack(index, frame, ack)
+
+def broadcast(send, check_ack, message, acks):
+    # o texto antigo monta os pacotes de novo para cada destinatario; o binario
+    # prepara uma vez e reaproveita (send e prepare_message para mensagens prontas)
+    prepared = message if send is legacy_send else send(message)
+    for _ in range(BROADCAST_USERS):
+        for index, frame in enumerate(send(prepared)):
+            check_ack(index, frame, acks[index])
+
+def run(repetitions):
+    print(f"{'mensagem':<24}{'formato':<14}{'pacotes':>8}{'> 1024 B':>9}{'bytes':>8}"
+          f"{'us/msg':>9}{f'us/broadcast x{BROADCAST_USERS}':>24}")
+    for name, message in MESSAGES.items():
+        for label, send, receive, check_ack in FORMATS:
+            frames = send(message)
+            acks = [receive(frame)[1] for frame in frames]
+            oversize = sum(len(frame) > PACKET_SIZE for frame in frames)
+            wire_bytes = sum(len(frame) + len(ack or b"") for frame, ack in zip(frames, acks))
+            per_message = timeit.timeit(lambda: exchange(send, receive, check_ack, message),
+                                        number=repetitions)
+            per_broadcast = timeit.timeit(lambda: broadcast(send, check_ack, message, acks),
+                                          number=max(1, repetitions // BROADCAST_USERS))
+            print(f"{name:<24}{label:<14}{len(frames):>8}{oversize:>9}{wire_bytes:>8}"
+                  f"{per_message / repetitions * 1e6:>9.1f}"
+                  f"{per_broadcast / max(1, repetitions // BROADCAST_USERS) * 1e6:>24.1f}")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
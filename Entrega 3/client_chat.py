@@ -1,7 +1,10 @@
+import random
 import socket
 from threading import Thread, Event
 from colorama import Fore, Style, init
 from rdt_protocol import send_data, receive_data
+from compression import CODEC_NAMES, NONE, available
+from datagram_io import BatchedSocket
 
 # inicializa o colorama
 init(autoreset=True)
@@ -10,14 +13,20 @@ init(autoreset=True)
 SERVER_HOST = "localhost"
 SERVER_PORT = 5000
 BUFFER_SIZE = 1024
+COMPRESSION = "zlib"  # algoritmo de compressao pedido ao servidor ("nenhuma" desliga)
 
 # estado do cliente
-client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+client_socket = BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
 client_socket.bind((SERVER_HOST, 0))
 client_socket.settimeout(5.0)
 
 CURRENT_USER = None
-RDT_SEQ_TRACKER = {'num': 0}
+# id da conexao sorteado por execucao, vai no cabecalho de cada pacote
+RDT_SEQ_TRACKER = {'num': 0, 'conn_id': random.getrandbits(16)}
+# algoritmo anunciado ao servidor em cada pacote; so passa a ser usado nos envios
+# ('codec') quando o servidor o confirma na resposta ao pedido de conexao
+RDT_SEQ_TRACKER['aceita'] = CODEC_NAMES[COMPRESSION] if CODEC_NAMES[COMPRESSION] in available() else NONE
+RDT_SEQ_TRACKER['codec'] = NONE
 
 # evento para sincronizacao
 server_response_event = Event()
@@ -26,14 +35,18 @@ server_response_event = Event()
 def listen_for_server_messages():
     # thread que aguarda e processa mensagens recebidas do servidor.
     listen_port = client_socket.getsockname()[1] + 1
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as listen_socket:
+    # le de uma vez todos os fragmentos que chegarem juntos (mensagens longas, broadcasts)
+    with BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM)) as listen_socket:
         listen_socket.bind((SERVER_HOST, listen_port))
+        server = {}  # algoritmo de compressao que o servidor aceita, das flags dos pacotes dele
         
         while True:
             try:
-                expected_seq_num_tracker = {'num': 0}
                 packet, server_address = listen_socket.recvfrom(BUFFER_SIZE)
-                message_bytes = receive_data(listen_socket, packet, server_address, expected_seq_num_tracker)
+                # cada resposta do servidor comeca no seq 0, entao nao ha bit alternado a seguir:
+                # duplicatas sao reconhecidas pelo id da mensagem e os fragmentos de mensagens
+                # longas sao remontados antes de chegar aqui
+                message_bytes = receive_data(listen_socket, packet, server_address, None, peer=server)
 
                 if message_bytes:
                     message = message_bytes.decode('utf-8')
@@ -43,12 +56,14 @@ def listen_for_server_messages():
                     global CURRENT_USER
                     if message.startswith("conexao aceita"):
                         CURRENT_USER = message.split(":")[-1].strip()
+                        RDT_SEQ_TRACKER['codec'] = server.get('aceita', NONE)
                         server_response_event.set()
                     elif message.startswith("erro: nome de usuario"):
                         server_response_event.set()
                     elif "voce foi desconectado" in message:
                         CURRENT_USER = None
                         RDT_SEQ_TRACKER['num'] = 0
+                        RDT_SEQ_TRACKER['codec'] = NONE
                         server_response_event.set()
 
                     print(f"{Fore.CYAN}>> {Style.RESET_ALL}", end='', flush=True)
@@ -99,7 +114,7 @@ def main_loop():
                 continue
             
             # comandos que exigem login
-            elif command in ["bye", "list", "mylist", "addtomylist", "rmvfrommylist", "ban"]:
+            elif command in ["bye", "list", "mylist", "addtomylist", "rmvfrommylist", "ban", "stats"]:
                  send_to_server(user_input)
             
             # se nao for um comando conhecido, e uma mensagem de chat
@@ -0,0 +1,89 @@
+# --- controle de congestionamento (RFC 5681) e espacamento dos envios ---
+INITIAL_WINDOW = 4       # pacotes em transito antes do primeiro ACK
+MIN_WINDOW = 2           # menor ssthresh depois de uma perda
+DUPACK_THRESHOLD = 3     # ACKs de pacotes posteriores que denunciam a perda do mais antigo
+PACING_GAIN_SLOW_START = 2.0  # no slow start a janela dobra por RTT: o ritmo acompanha
+PACING_GAIN = 1.25            # folga para a janela nao ficar presa ao ritmo
+MIN_PACING_INTERVAL = 0.001   # abaixo da resolucao do relogio (1 ms) os pacotes saem juntos
+
+
+class CongestionController:
+    # janela de congestionamento (cwnd) de um remetente, em pacotes:
+    # - slow start: +1 por ACK ate ssthresh (a janela dobra a cada RTT);
+    # - AIMD: depois, +1/cwnd por ACK (+1 por RTT) e metade a cada perda;
+    # - recuperacao rapida: uma perda denunciada por ACKs posteriores corta a
+    #   janela pela metade uma unica vez e ela nao cresce ate chegar o ACK de
+    #   tudo o que estava em transito (recover); um timeout volta a 1 pacote.
+    # os pacotes novos tambem sao espacados ao longo do RTT (pacing), em vez de
+    # sair em rajada sempre que a janela abre
+
+    def __init__(self, max_window, initial_window=INITIAL_WINDOW):
+        self.max_window = max_window
+        self.cwnd = float(min(initial_window, max_window))
+        self.ssthresh = float(max_window)
+        self.recover = None   # maior seq em transito quando a recuperacao comecou
+        self.next_send = 0.0  # quando o proximo pacote novo pode sair
+        # estatisticas
+        self.peak = self.cwnd
+        self.fast_recoveries = 0
+        self.timeouts = 0
+        self.paced = 0        # pacotes novos que esperaram o espacamento (contados por quem envia)
+
+    @property
+    def window(self):
+        return max(1, int(self.cwnd))
+
+    @property
+    def in_recovery(self):
+        return self.recover is not None
+
+    def on_ack(self, seq):
+        # ACK novo do pacote seq
+        if self.recover is not None:
+            if seq >= self.recover:
+                self.recover = None  # tudo o que estava em transito na perda chegou
+            return
+        if self.cwnd < self.ssthresh:
+            self.cwnd += 1
+        else:
+            self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_window)
+        self.peak = max(self.peak, self.cwnd)
+
+    def on_loss(self, flight, recover):
+        # perda detectada sem timeout. devolve False se ja estamos recuperando
+        # uma perda da mesma janela (a janela so e cortada uma vez)
+        if self.recover is not None:
+            return False
+        self.ssthresh = max(flight / 2, MIN_WINDOW)
+        self.cwnd = min(self.ssthresh, self.max_window)
+        self.recover = recover
+        self.fast_recoveries += 1
+        return True
+
+    def on_timeout(self, flight):
+        self.ssthresh = max(flight / 2, MIN_WINDOW)
+        self.cwnd = 1.0
+        self.recover = None
+        self.timeouts += 1
+
+    def pacing_interval(self, srtt):
+        # espaco entre pacotes novos para a janela se espalhar pelo RTT
+        if srtt is None:
+            return 0.0
+        gain = PACING_GAIN_SLOW_START if self.cwnd < self.ssthresh else PACING_GAIN
+        interval = srtt / (self.cwnd * gain)
+        return interval if interval >= MIN_PACING_INTERVAL else 0.0
+
+    def pacing_delay(self, now):
+        # quanto falta para o proximo pacote novo poder sair (0 = ja pode)
+        return max(0.0, self.next_send - now)
+
+    def on_send(self, srtt, now):
+        # um pacote novo saiu: o proximo espera um intervalo
+        self.next_send = max(self.next_send, now) + self.pacing_interval(srtt)
+
+    def stats(self):
+        return {"cwnd": round(self.cwnd, 1), "cwnd_max": round(self.peak, 1),
+                "ssthresh": round(self.ssthresh, 1), "recuperacoes": self.fast_recoveries,
+                "timeouts": self.timeouts, "espacados": self.paced}
@@ -0,0 +1,182 @@
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from rdt_protocol import FRAGMENT_WINDOW, send_data
+from rdt_timer import RtoEstimator
+from congestion import CongestionController, DUPACK_THRESHOLD
+from datagram_io import BatchedSocket, DEFAULT_RCVBUF, DEFAULT_SNDBUF
+
+# politicas para quando a fila de um destinatario lento esta cheia
+POLICY_DROP_OLDEST = "drop-oldest"  # descarta a mensagem mais antiga da fila
+POLICY_DROP_NEWEST = "drop-newest"  # descarta a mensagem que esta chegando
+POLICY_EVICT = "evict"              # remove o destinatario da sala
+POLICY_BLOCK = "block"              # segura o produtor ate abrir espaco (backpressure)
+POLICIES = [POLICY_DROP_OLDEST, POLICY_DROP_NEWEST, POLICY_EVICT, POLICY_BLOCK]
+
+DEFAULT_MAX_QUEUE = 64
+BLOCK_TIMEOUT = 5.0  # espera maxima do produtor na politica block
+
+
+class FanoutEngine:
+    """
+    distribui mensagens com uma fila de saida limitada por destinatario.
+
+    cada destinatario tem no maximo uma mensagem em transito; as demais esperam
+    na sua propria fila, entao um cliente lento ou inalcancavel nao atrasa os
+    outros. transmit(endereco, mensagem, done) deve iniciar o envio sem bloquear
+    quem chamou e chamar done(ok) ao terminar. release(endereco), se houver,
+    descarta o estado que o transmissor guarda para o destino (sessao rdt,
+    rtt medido, janela de congestionamento) quando ele sai da sala.
+    """
+
+    def __init__(self, transmit, max_queue=DEFAULT_MAX_QUEUE, policy=POLICY_DROP_OLDEST,
+                 on_evict=None, can_block=True, release=None):
+        self.transmit = transmit
+        self.release = release
+        self.max_queue = max_queue
+        # no modo asyncio bloquear o produtor travaria o loop inteiro
+        if policy == POLICY_BLOCK and not can_block:
+            policy = POLICY_DROP_NEWEST
+        self.policy = policy
+        self.on_evict = on_evict
+        self.queues = {}   # {endereco: deque de mensagens aguardando}
+        self.busy = set()  # destinatarios com uma mensagem em transito
+        self.closing = set()  # destinatarios esquecidos com uma ultima mensagem a entregar
+        self.dropped = 0
+        self.evicted = 0
+        self.cond = threading.Condition()
+
+    def enqueue(self, address, message):
+        # retorna false se a mensagem foi descartada pela politica
+        evict = False
+        with self.cond:
+            queue = self.queues.setdefault(address, deque())
+            if len(queue) >= self.max_queue:
+                if self.policy == POLICY_BLOCK:
+                    has_room = self.cond.wait_for(
+                        lambda: len(queue) < self.max_queue or self.queues.get(address) is not queue,
+                        BLOCK_TIMEOUT)
+                    if not has_room or self.queues.get(address) is not queue:
+                        self.dropped += 1
+                        return False
+                elif self.policy == POLICY_DROP_OLDEST:
+                    queue.popleft()
+                    self.dropped += 1
+                elif self.policy == POLICY_DROP_NEWEST:
+                    self.dropped += 1
+                    return False
+                else:
+                    self.dropped += len(queue) + 1
+                    self.evicted += 1
+                    del self.queues[address]
+                    evict = True
+
+            if not evict:
+                if address in self.busy:
+                    queue.append(message)
+                    return True
+                self.busy.add(address)
+
+        if evict:
+            if self.on_evict:
+                self.on_evict(address)
+            return False
+        self.transmit(address, message, partial(self._done, address))
+        return True
+
+    def forget(self, address, farewell=None):
+        # descarta a fila de um destinatario que saiu da sala e o estado do
+        # transmissor para ele (o que estiver em transito e abandonado, se o
+        # transmissor permitir). farewell, se houver, ainda e entregue (ex.: a
+        # resposta do bye), e o estado e liberado de novo quando ela terminar
+        with self.cond:
+            queue = self.queues.pop(address, None)
+            if queue:
+                self.dropped += len(queue)
+            self.cond.notify_all()
+        if self.release:
+            self.release(address)
+        with self.cond:
+            # o envio que nao pode ser abandonado (ou o farewell) libera o estado de
+            # novo ao terminar, ja que o transmissor pode recria-lo ate la
+            if farewell is not None or address in self.busy:
+                self.closing.add(address)
+            if farewell is not None and address in self.busy:
+                self.queues.setdefault(address, deque()).append(farewell)
+                return
+            if farewell is None:
+                return
+            self.busy.add(address)
+        self.transmit(address, farewell, partial(self._done, address))
+
+    def pending(self, address):
+        with self.cond:
+            return len(self.queues.get(address, ()))
+
+    def depth(self):
+        # mensagens esperando em todas as filas (sem contar as que estao em transito)
+        with self.cond:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def _done(self, address, ok):
+        with self.cond:
+            queue = self.queues.get(address)
+            if not ok and queue:
+                # destino nao respondeu: o que estava atras dele falharia igual
+                self.dropped += len(queue)
+                queue.clear()
+            message = None
+            if not queue:
+                self.busy.discard(address)
+                self.queues.pop(address, None)
+                release = address in self.closing
+                self.closing.discard(address)
+            else:
+                message = queue.popleft()
+            self.cond.notify_all()
+        if message is None:
+            # fila vazia: se o destino ja saiu da sala, o estado dele pode ir embora
+            if release and self.release:
+                self.release(address)
+            return
+        self.transmit(address, message, partial(self._done, address))
+
+
+class ThreadPoolTransmitter:
+    # transmissor para o modo threads: send_data em um pool fixo de threads,
+    # cada thread com o seu proprio socket
+
+    def __init__(self, bind_host, workers=32, rcvbuf=DEFAULT_RCVBUF, sndbuf=DEFAULT_SNDBUF,
+                 dupacks=DUPACK_THRESHOLD):
+        self.bind_host = bind_host
+        self.dupacks = dupacks
+        self.rcvbuf = rcvbuf
+        self.sndbuf = sndbuf
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout")
+        self.local = threading.local()
+        self.rto = {}  # {endereco: RtoEstimator} rtt medido por destino
+        self.cc = {}   # {endereco: CongestionController} janela de congestionamento por destino
+
+    def __call__(self, address, message, done):
+        self.pool.submit(self._send, address, message, done)
+
+    def forget(self, address):
+        # descarta o rtt e a janela de um destino que saiu da sala. um envio em
+        # transito nao e interrompido: ele termina com os objetos que ja tem
+        self.rto.pop(address, None)
+        self.cc.pop(address, None)
+
+    def _send(self, address, message, done):
+        sock = getattr(self.local, "sock", None)
+        if sock is None:
+            sock = self.local.sock = BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM),
+                                                   self.rcvbuf, self.sndbuf)
+            sock.bind((self.bind_host, 0))
+        # cada mensagem comeca em seq 0, mas o rtt medido e a janela de
+        # congestionamento do destino sao reaproveitados
+        rto = self.rto.setdefault(address, RtoEstimator())
+        cc = self.cc.setdefault(address, CongestionController(FRAGMENT_WINDOW))
+        ok = send_data(sock, message, address, {'num': 0, 'rto': rto, 'cc': cc, 'dupacks': self.dupacks})
+        done(ok)
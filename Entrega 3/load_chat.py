@@ -0,0 +1,404 @@
+"""
+gerador de carga sintetica para o server_chat.py.
+
+simula milhares de usuarios leves no loop do asyncio, opcionalmente
+repartidos entre --processos processos. cada usuario tem os dois sockets de
+um client_chat.py de verdade: o de envio na porta p e o de escuta em p + 1.
+ele entra na sala com "hi, meu nome eh". depois, em cada fase, age em
+intervalos exponenciais com a taxa da fase (acoes por segundo por usuario).
+a maioria das acoes e uma mensagem de chat; uma fracao roda list, adiciona
+amigos ou vota em ban. como no client_chat.py, cada usuario espera o ack de
+um comando antes de mandar o proximo; a acao que chega com o anterior ainda
+pendente conta como "adiada".
+
+cada mensagem de chat leva uma marca com a fase, o remetente e o instante
+do envio. quem recebe o broadcast mede a latencia ponta a ponta: do envio
+por um usuario ate a entrega no outro. por fase sao impressos:
+
+- as mensagens oferecidas por segundo e as entregas por segundo;
+- os percentis da latencia;
+- a perda: broadcasts que nao chegaram a usuarios que ficaram na sala ate o
+  fim;
+- a cpu do servidor, quando o pid dele e conhecido (--iniciar-servidor ou
+  --pid).
+
+a ultima linha responde quantas mensagens por segundo o servidor aguenta
+com esse numero de usuarios: e a maior fase com perda e p99 dentro dos
+limites.
+
+uso: python3 load_chat.py --usuarios 500 --taxas 0.1 0.2 0.5 --duracao 10 --iniciar-servidor
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from async_rdt import AsyncRdtEndpoint
+from compression import CODEC_NAMES, NONE, available
+from rdt_protocol import ReassemblyBuffer, prepare_message, receive_data
+
+MARK = "carga"  # mensagens de chat: "carga <fase> <remetente> <contador> <enviada em, ns>"
+MARK_PATTERN = re.compile(rf"{MARK} (\d+) (\d+) \d+ (\d+)")
+LOGIN_TIMEOUT = 15.0       # segundos para o servidor aceitar um usuario
+DRAIN_TIME = 3.0           # espera pelos broadcasts atrasados depois da ultima fase
+MAX_SAMPLES = 200_000      # amostras de latencia guardadas por fase e processo (amostragem de reservatorio)
+LISTEN_BUFFER = 256 * 1024 # buffer de remontagem de cada usuario
+BIND_ATTEMPTS = 50
+
+
+def user_name(uid):
+    return f"{MARK}{uid}"
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def bind_pair(host):
+    # socket de envio em p e de escuta em p + 1, como o client_chat.py
+    for _ in range(BIND_ATTEMPTS):
+        send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send_sock.bind((host, 0))
+        listen_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            listen_sock.bind((host, send_sock.getsockname()[1] + 1))
+            return send_sock, listen_sock
+        except OSError:
+            send_sock.close()
+            listen_sock.close()
+    raise OSError("nao foi possivel reservar um par de portas")
+
+
+class PhaseStats:
+    # contadores de uma fase em um processo; somados entre processos no final
+
+    def __init__(self):
+        self.sent = {}          # {uid do remetente: mensagens de chat enviadas}
+        self.received = {}      # {uid de quem recebeu: broadcasts recebidos}
+        self.latencies = []
+        self.seen = 0           # latencias vistas (para a amostragem de reservatorio)
+        self.deferred = 0       # acoes adiadas porque o comando anterior ainda esperava ack
+        self.failed = 0         # comandos abandonados sem ack
+
+    def sample(self, latency, rng):
+        self.seen += 1
+        if len(self.latencies) < MAX_SAMPLES:
+            self.latencies.append(latency)
+        else:
+            slot = rng.randrange(self.seen)
+            if slot < MAX_SAMPLES:
+                self.latencies[slot] = latency
+
+
+class ClientEndpoint(AsyncRdtEndpoint):
+    # como o send_data do client_chat.py, aceita o ack de qualquer endereco do
+    # servidor: no modo threads quem confirma e o socket da thread que tratou o
+    # pedido, em outra porta (e "localhost" volta como 127.0.0.1)
+    def __init__(self, server):
+        super().__init__(lambda *_: None)
+        self.server = server
+
+    def datagram_received(self, data, address):
+        super().datagram_received(data, self.server)
+
+
+class Listener(asyncio.DatagramProtocol):
+    # socket de escuta de um usuario: confirma e remonta o que o servidor manda
+    def __init__(self, user):
+        self.user = user
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        user = self.user
+        message = receive_data(self.transport, data, address, None, user.reassembly, peer=user.server)
+        if message:
+            user.on_message(message.decode('utf-8', errors='replace'))
+
+
+class SimUser:
+    def __init__(self, uid, server, accept, stats, rng):
+        self.uid = uid
+        self.name = user_name(uid)
+        self.server_address = server
+        self.accept = accept
+        self.codec = NONE
+        self.stats = stats
+        self.rng = rng
+        self.seq = 0
+        self.conn_id = rng.getrandbits(16)
+        self.counter = 0
+        self.busy = False
+        self.gone = False
+        self.server = {}  # algoritmo que o servidor aceita, das flags dos pacotes dele
+        self.reassembly = ReassemblyBuffer(max_bytes=LISTEN_BUFFER)
+        self.connected = asyncio.Event()
+        self.endpoint = None
+
+    async def open(self, loop, host):
+        send_sock, listen_sock = bind_pair(host)
+        _, self.endpoint = await loop.create_datagram_endpoint(lambda: ClientEndpoint(self.server_address),
+                                                               sock=send_sock)
+        await loop.create_datagram_endpoint(lambda: Listener(self), sock=listen_sock)
+
+    def send(self, text, phase=None):
+        # um comando por vez, como o client_chat.py (que espera o ack em send_data)
+        if self.busy:
+            if phase is not None:
+                self.stats[phase].deferred += 1
+            return False
+        self.busy = True
+        prepared = prepare_message(text, self.seq, self.conn_id, codec=self.codec, accept=self.accept)
+        self.seq = 1 - self.seq
+
+        def done(ok):
+            self.busy = False
+            if not ok and phase is not None:
+                self.stats[phase].failed += 1
+        self.endpoint.send_message(prepared, self.server_address, done)
+        return True
+
+    def on_message(self, text):
+        if text.startswith("conexao aceita"):
+            self.codec = self.server.get('aceita', NONE)
+            self.connected.set()
+        elif text.startswith("erro: nome de usuario"):
+            self.gone = True
+            self.connected.set()
+        elif "voce foi desconectado" in text:
+            self.gone = True
+        else:
+            match = MARK_PATTERN.search(text)
+            if match:
+                phase, _, sent_ns = (int(group) for group in match.groups())
+                if phase < len(self.stats):
+                    stats = self.stats[phase]
+                    stats.received[self.uid] = stats.received.get(self.uid, 0) + 1
+                    stats.sample((time.time_ns() - sent_ns) / 1e6, self.rng)
+
+    def act(self, phase, args, total_users):
+        # uma acao da fase: chat na maioria das vezes, senao list, amigo ou ban
+        choice = self.rng.random()
+        other = user_name(self.rng.randrange(total_users))
+        if choice < args.lista:
+            self.send("list", phase)
+        elif choice < args.lista + args.amigos:
+            self.send(f"addtomylist {other}", phase)
+        elif choice < args.lista + args.amigos + args.banir:
+            self.send(f"ban {other}", phase)
+        else:
+            text = f"{MARK} {phase} {self.uid} {self.counter} {time.time_ns()}"
+            if args.texto:
+                text += " " + "x" * args.texto
+            if self.send(text, phase):
+                self.counter += 1
+                sent = self.stats[phase].sent
+                sent[self.uid] = sent.get(self.uid, 0) + 1
+
+
+async def run_user(user, args, start_at, total_users):
+    for phase, rate in enumerate(args.taxas):
+        phase_end = start_at + (phase + 1) * args.duracao
+        while not user.gone:
+            wait = user.rng.expovariate(rate) if rate > 0 else args.duracao
+            if time.time() + wait >= phase_end:
+                await asyncio.sleep(max(0.0, phase_end - time.time()))
+                break
+            await asyncio.sleep(wait)
+            user.act(phase, args, total_users)
+
+
+async def simulate(worker, uids, args, start_at, total_users):
+    loop = asyncio.get_running_loop()
+    rng = random.Random(f"{args.semente}/{worker}")
+    stats = [PhaseStats() for _ in args.taxas]
+    host, port = args.servidor
+    accept = CODEC_NAMES[args.compressao]
+    users = [SimUser(uid, (host, port), accept, stats, random.Random(rng.getrandbits(64))) for uid in uids]
+
+    # entrada escalonada (--entrada usuarios por segundo no total)
+    interval = args.processos / args.entrada
+    logged = 0
+    for user in users:
+        await user.open(loop, host)
+        user.send(f"hi, meu nome eh {user.name}")
+        await asyncio.sleep(interval)
+    for user in users:
+        try:
+            await asyncio.wait_for(user.connected.wait(), max(0.1, LOGIN_TIMEOUT))
+            logged += not user.gone
+        except asyncio.TimeoutError:
+            user.gone = True
+    if time.time() > start_at:
+        print(f"aviso: processo {worker} terminou as entradas {time.time() - start_at:.1f} s depois do inicio "
+              f"das fases; aumente --aquecimento", flush=True)
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+
+    await asyncio.gather(*(run_user(user, args, start_at, total_users) for user in users if not user.gone))
+    await asyncio.sleep(DRAIN_TIME)
+    stayed = [user.uid for user in users if not user.gone]
+    for user in users:
+        if not user.gone:
+            user.busy = False
+            user.send("bye")
+    await asyncio.sleep(1.0)
+    return {"logged": logged, "stayed": stayed,
+            "phases": [{"sent": s.sent, "received": s.received, "latencies": s.latencies,
+                        "deferred": s.deferred, "failed": s.failed} for s in stats]}
+
+
+def worker_main(worker, uids, args, start_at, total_users, queue):
+    queue.put((worker, asyncio.run(simulate(worker, uids, args, start_at, total_users))))
+
+
+def cpu_seconds(pid):
+    # tempo de cpu (usuario + sistema) do processo, de /proc (linux); none se nao der para ler
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def summarize(results, args, cpu):
+    stayed = set()
+    for result in results:
+        stayed.update(result["stayed"])
+    rows = []
+    for phase, rate in enumerate(args.taxas):
+        sent, received, latencies, deferred, failed = {}, 0, [], 0, 0
+        for result in results:
+            entry = result["phases"][phase]
+            for uid, count in entry["sent"].items():
+                sent[int(uid)] = sent.get(int(uid), 0) + count
+            received += sum(count for uid, count in entry["received"].items() if int(uid) in stayed)
+            latencies += entry["latencies"]
+            deferred += entry["deferred"]
+            failed += entry["failed"]
+        # cada mensagem deveria chegar a todos os que ficaram na sala, menos o remetente
+        expected = sum(count * (len(stayed) - (uid in stayed)) for uid, count in sent.items())
+        rows.append({"fase": phase, "taxa_por_usuario": rate,
+                     "oferecidas_por_s": round(sum(sent.values()) / args.duracao, 1),
+                     "entregas_por_s": round(received / args.duracao, 1),
+                     "latencia_p50_ms": round(percentile(latencies, 0.50), 1),
+                     "latencia_p95_ms": round(percentile(latencies, 0.95), 1),
+                     "latencia_p99_ms": round(percentile(latencies, 0.99), 1),
+                     "perda": round(1 - received / expected, 4) if expected else 0.0,
+                     "adiadas": deferred, "falhas": failed,
+                     "cpu_servidor": cpu[phase]})
+    return rows, len(stayed)
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return (host or "localhost", int(port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gerador de carga para o server_chat.py",
+                                     formatter_class=argparse.RawDescriptionHelpFormatter, epilog=__doc__)
+    parser.add_argument("--servidor", type=parse_address, default=("localhost", 5000),
+                        help="endereco do servidor (pode ser o net_emulator.py)")
+    parser.add_argument("--usuarios", type=int, default=200)
+    parser.add_argument("--processos", type=int, default=1, help="processos geradores, cada um com seu loop")
+    parser.add_argument("--taxas", type=float, nargs="+", default=[0.1, 0.5, 1.0],
+                        help="acoes por segundo de cada usuario, uma fase por taxa")
+    parser.add_argument("--duracao", type=float, default=10.0, help="segundos de cada fase")
+    parser.add_argument("--entrada", type=float, default=200.0, help="usuarios entrando por segundo")
+    parser.add_argument("--aquecimento", type=float, default=None,
+                        help="segundos entre o inicio e a primeira fase (padrao: usuarios / entrada + 3)")
+    parser.add_argument("--lista", type=float, default=0.02, help="fracao das acoes que sao list")
+    parser.add_argument("--amigos", type=float, default=0.02, help="fracao das acoes que sao addtomylist")
+    parser.add_argument("--banir", type=float, default=0.005, help="fracao das acoes que sao votos de ban")
+    parser.add_argument("--texto", type=int, default=0, help="caracteres extras em cada mensagem de chat")
+    parser.add_argument("--compressao", choices=list(CODEC_NAMES), default="zlib")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--iniciar-servidor", action="store_true",
+                        help="sobe o server_chat.py (na porta de --servidor) e mede a cpu dele")
+    parser.add_argument("--args-servidor", default="", help='opcoes extras do servidor, ex.: "--modo threads"')
+    parser.add_argument("--pid", type=int, help="pid de um servidor ja rodando, para medir a cpu")
+    parser.add_argument("--perda-max", type=float, default=0.01, help="perda aceita na resposta de capacidade")
+    parser.add_argument("--p99-max", type=float, default=500.0, help="p99 aceito na resposta de capacidade, em ms")
+    parser.add_argument("--saida", help="grava as fases em json")
+    args = parser.parse_args()
+    if CODEC_NAMES[args.compressao] not in available():
+        parser.error(f"compressao indisponivel neste python: {args.compressao}")
+    if args.processos < 1 or args.usuarios < args.processos:
+        parser.error("--processos deve estar entre 1 e --usuarios")
+
+    server = None
+    pid = args.pid
+    if args.iniciar_servidor:
+        here = os.path.dirname(os.path.abspath(__file__))
+        server = subprocess.Popen([sys.executable, os.path.join(here, "server_chat.py"),
+                                   "--porta", str(args.servidor[1])] + shlex.split(args.args_servidor),
+                                  cwd=here, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.DEVNULL)
+        pid = server.pid
+        time.sleep(1.0)
+
+    warmup = args.aquecimento if args.aquecimento is not None else args.usuarios / args.entrada + 3
+    start_at = time.time() + warmup
+    print(f"{args.usuarios} usuarios em {args.processos} processo(s); fases de {args.duracao:g} s "
+          f"comecam em {warmup:.1f} s", flush=True)
+    uid_groups = [list(range(worker, args.usuarios, args.processos)) for worker in range(args.processos)]
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker_main, daemon=True,
+                                       args=(worker, uids, args, start_at, args.usuarios, queue))
+               for worker, uids in enumerate(uid_groups)]
+    try:
+        for process in workers:
+            process.start()
+        # cpu do servidor fase a fase, medida por aqui enquanto os processos geram carga
+        cpu = []
+        time.sleep(max(0.0, start_at - time.time()))
+        for phase in range(len(args.taxas)):
+            before = cpu_seconds(pid) if pid else None
+            time.sleep(max(0.0, start_at + (phase + 1) * args.duracao - time.time()))
+            after = cpu_seconds(pid) if pid else None
+            cpu.append(round(100 * (after - before) / args.duracao, 1) if None not in (before, after) else None)
+        results = [queue.get()[1] for _ in workers]
+    finally:
+        for process in workers:
+            process.join(timeout=5)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    rows, stayed = summarize(results, args, cpu)
+    logged = sum(result["logged"] for result in results)
+    print(f"{logged}/{args.usuarios} usuarios entraram, {stayed} ficaram ate o fim")
+    print(f"{'fase':>4}{'taxa/usr':>9}{'oferec/s':>10}{'entreg/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'p99 ms':>9}{'perda':>8}{'adiadas':>9}{'falhas':>8}{'cpu srv':>9}")
+    for row in rows:
+        cpu_text = "-" if row["cpu_servidor"] is None else f"{row['cpu_servidor']:.0f}%"
+        print(f"{row['fase']:>4}{row['taxa_por_usuario']:>9g}{row['oferecidas_por_s']:>10.1f}"
+              f"{row['entregas_por_s']:>10.1f}{row['latencia_p50_ms']:>9.1f}{row['latencia_p95_ms']:>9.1f}"
+              f"{row['latencia_p99_ms']:>9.1f}{row['perda']:>8.2%}{row['adiadas']:>9}{row['falhas']:>8}{cpu_text:>9}")
+    within = [row for row in rows if row["oferecidas_por_s"] > 0
+              and row["perda"] <= args.perda_max and row["latencia_p99_ms"] <= args.p99_max]
+    if within:
+        best = max(within, key=lambda row: row["oferecidas_por_s"])
+        print(f"capacidade: {stayed} usuarios com {best['oferecidas_por_s']:.1f} mensagens/s "
+              f"({best['entregas_por_s']:.0f} entregas/s), perda <= {args.perda_max:.1%} e p99 <= {args.p99_max:g} ms")
+    else:
+        print(f"capacidade: nenhuma fase ficou com perda <= {args.perda_max:.1%} e p99 <= {args.p99_max:g} ms")
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump({"usuarios": args.usuarios, "entraram": logged, "ficaram": stayed,
+                       "servidor": args.args_servidor, "fases": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
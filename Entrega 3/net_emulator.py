@@ -0,0 +1,359 @@
+import argparse
+import heapq
+import itertools
+import random
+import selectors
+import signal
+import socket
+import sys
+import time
+
+# --- emulador de rede: proxy UDP entre os clientes e o servidor ---
+# os clientes falam com o emulador como se ele fosse o servidor. cada cliente
+# ganha seus proprios sockets do lado do servidor (como em um NAT), e cada
+# datagrama, nos dois sentidos, passa pelas degradacoes configuradas: perda
+# (independente ou em rajadas, Gilbert-Elliott), duplicacao, limite de banda
+# (balde de fichas), atraso, variacao do atraso e reordenacao.
+#
+# cada sentido de cada cliente tem seu proprio gerador aleatorio, derivado da
+# semente, e os sorteios de um datagrama nao dependem do relogio: o n-esimo
+# datagrama de um sentido tem sempre o mesmo destino, entao uma execucao pode
+# ser repetida com as mesmas perdas. so o descarte por fila cheia depende do
+# ritmo em que os pacotes chegam.
+
+LISTEN_PORT = 5000
+SERVER_PORT = 5001
+MAX_DATAGRAM = 65535
+SOCKET_BUFFER = 4 * 1024 * 1024  # SO_RCVBUF/SO_SNDBUF: o emulador nao deve perder pacotes por conta propria
+FLOW_IDLE = 120.0                # segundos sem trafego ate os sockets de um cliente serem fechados
+FLOW_CHECK = 1.0                 # intervalo entre as verificacoes de clientes ociosos
+BIND_ATTEMPTS = 50               # tentativas de reservar portas consecutivas para um cliente
+UPSTREAM, DOWNSTREAM = "ida", "volta"  # cliente -> servidor e servidor -> cliente
+COUNTERS = ("recebidos", "perdidos", "duplicados", "reordenados", "descartados na fila", "entregues",
+            "bytes entregues")
+
+
+class GilbertElliott:
+    # perda em rajadas: o canal alterna entre um estado bom e um ruim, cada um
+    # com sua taxa de perda. a cada datagrama ele passa de bom para ruim com
+    # probabilidade p e de ruim para bom com probabilidade r, entao uma rajada
+    # dura em media 1/r datagramas. com p = 0 a perda e independente (loss_good)
+
+    def __init__(self, p=0.0, r=1.0, loss_good=0.0, loss_bad=1.0):
+        self.p = p
+        self.r = r
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    def lost(self, rng):
+        # sempre dois sorteios por datagrama, para a sequencia nao depender do estado
+        change = rng.random()
+        if self.bad and change < self.r:
+            self.bad = False
+        elif not self.bad and change < self.p:
+            self.bad = True
+        return rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class TokenBucket:
+    # limite de banda de um sentido, dividido por todos os clientes: fichas
+    # (bytes) chegam a rate bytes/s e ate burst ficam guardadas. um datagrama sem
+    # fichas espera na fila ate elas chegarem; se a fila passar de queue_limit
+    # bytes ele e descartado (drop-tail), como em um roteador
+
+    def __init__(self, rate, burst, queue_limit):
+        self.rate = rate
+        self.burst = burst
+        self.queue_limit = queue_limit
+        self.tokens = float(burst)
+        self.updated = 0.0  # instante a que self.tokens se refere (a ultima saida)
+
+    def departure(self, size, now):
+        # instante em que o datagrama deixa o enlace, ou None se a fila esta cheia
+        start = max(now, self.updated)
+        tokens = min(self.burst, self.tokens + (start - self.updated) * self.rate)
+        wait = max(0.0, (size - tokens) / self.rate)
+        if (start + wait - now) * self.rate > self.queue_limit:
+            return None
+        self.updated = start + wait
+        self.tokens = tokens + wait * self.rate - size
+        return self.updated
+
+
+class Link:
+    # um sentido de um cliente: decide o destino de cada datagrama
+
+    def __init__(self, rng, loss, duplicate=0.0, delay=0.0, jitter=0.0, reorder=0.0,
+                 reorder_delay=0.0, bucket=None, stats=None):
+        self.rng = rng
+        self.loss = loss
+        self.duplicate = duplicate
+        self.delay = delay
+        self.jitter = jitter
+        self.reorder = reorder
+        self.reorder_delay = reorder_delay
+        self.bucket = bucket
+        self.stats = stats if stats is not None else dict.fromkeys(COUNTERS, 0)
+        self.last = 0.0  # entrega mais tardia ate agora, fora os reordenados
+
+    def schedule(self, size, now):
+        # instantes de entrega das copias do datagrama (lista vazia = perdido)
+        stats = self.stats
+        stats["recebidos"] += 1
+        if self.loss.lost(self.rng):
+            stats["perdidos"] += 1
+            return []
+        copies = 2 if self.rng.random() < self.duplicate else 1
+        times = []
+        for _ in range(copies):
+            jitter = self.rng.uniform(-self.jitter, self.jitter)
+            reordered = self.rng.random() < self.reorder
+            departure = now if self.bucket is None else self.bucket.departure(size, now)
+            if departure is None:
+                stats["descartados na fila"] += 1
+                continue
+            deliver = departure + max(0.0, self.delay + jitter)
+            if reordered:
+                # segura o datagrama para que os seguintes passem na frente
+                deliver += self.reorder_delay
+                stats["reordenados"] += 1
+            else:
+                # a variacao do atraso sozinha nao troca a ordem dos datagramas
+                deliver = max(deliver, self.last)
+                self.last = deliver
+            times.append(deliver)
+        if len(times) > 1:
+            stats["duplicados"] += 1
+        return times
+
+
+class Flow:
+    # sockets de um cliente. upstream[i] fala com o servidor a partir da porta
+    # base + i, e downstream[i] entrega ao cliente na porta dele + i
+    # (downstream[0] e o socket de escuta do emulador). com mais de uma porta,
+    # protocolos que respondem em "porta de origem + 1", como o chat da
+    # Entrega 3, tambem passam pelo emulador
+
+    def __init__(self, index, client, upstream, downstream, server):
+        self.index = index
+        self.client = client
+        self.upstream = upstream
+        self.downstream = downstream
+        # para onde vai o que o cliente manda por cada par: o servidor no par 0,
+        # e nos outros quem falou por ultimo com upstream[i]
+        self.peers = [server] + [None] * (len(upstream) - 1)
+        self.links = {}
+        self.active = time.monotonic()
+
+
+def bind_consecutive(count):
+    # count sockets em portas consecutivas, para o par "porta + i" existir do lado do servidor
+    for _ in range(BIND_ATTEMPTS):
+        sockets = [open_socket(("", 0))]
+        base = sockets[0].getsockname()[1]
+        try:
+            for offset in range(1, count):
+                sockets.append(open_socket(("", base + offset)))
+            return sockets
+        except OSError:
+            for sock in sockets:
+                sock.close()
+    raise OSError(f"nao foi possivel reservar {count} portas consecutivas")
+
+
+def open_socket(address):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        sock.bind(address)
+    except OSError:
+        sock.close()
+        raise
+    sock.setblocking(False)
+    return sock
+
+
+class Emulator:
+    def __init__(self, listen, server, args):
+        self.server = server
+        self.args = args
+        self.ports = args.portas
+        self.selector = selectors.DefaultSelector()
+        self.listen = open_socket(listen)
+        self.selector.register(self.listen, selectors.EVENT_READ, None)
+        self.flows = {}    # {endereco do cliente: Flow}
+        self.pending = []  # heap de (instante, ordem, socket, datagrama, destino, sentido)
+        self.order = itertools.count()
+        self.flow_count = itertools.count()
+        self.stats = {direction: dict.fromkeys(COUNTERS, 0) for direction in (UPSTREAM, DOWNSTREAM)}
+        # o limite de banda vale para o sentido inteiro, nao para cada cliente
+        self.buckets = {direction: self._make_bucket(direction) for direction in (UPSTREAM, DOWNSTREAM)}
+        self.next_check = time.monotonic() + FLOW_CHECK
+
+    def _impaired(self, direction):
+        return self.args.sentido in ("ambos", direction)
+
+    def _make_bucket(self, direction):
+        if not self.args.banda or not self._impaired(direction):
+            return None
+        return TokenBucket(self.args.banda * 1e6 / 8, self.args.balde, self.args.fila)
+
+    def _make_link(self, flow, offset, direction):
+        args = self.args
+        # semente propria por (cliente, porta, sentido): a ordem de chegada dos
+        # outros clientes nao muda as perdas deste
+        rng = random.Random(f"{args.semente}/{flow.index}/{offset}/{direction}")
+        stats = self.stats[direction]
+        if not self._impaired(direction):
+            return Link(rng, GilbertElliott(), stats=stats)
+        if args.ge:
+            loss = GilbertElliott(args.ge[0], args.ge[1], args.perda, args.perda_ruim)
+        else:
+            loss = GilbertElliott(loss_good=args.perda)
+        return Link(rng, loss, args.duplicacao, args.atraso / 1000, args.variacao / 1000,
+                    args.reordem, args.atraso_reordem / 1000, self.buckets[direction], stats)
+
+    def _open_flow(self, client):
+        upstream = bind_consecutive(self.ports)
+        downstream = [self.listen] + [open_socket(("", 0)) for _ in range(1, self.ports)]
+        flow = Flow(next(self.flow_count), client, upstream, downstream, self.server)
+        for offset in range(self.ports):
+            flow.links[UPSTREAM, offset] = self._make_link(flow, offset, UPSTREAM)
+            flow.links[DOWNSTREAM, offset] = self._make_link(flow, offset, DOWNSTREAM)
+            self.selector.register(upstream[offset], selectors.EVENT_READ, (flow, offset, DOWNSTREAM))
+            if offset:
+                self.selector.register(downstream[offset], selectors.EVENT_READ, (flow, offset, UPSTREAM))
+        self.flows[client] = flow
+        print(f"Emulador: Cliente {client[0]}:{client[1]} ligado pela porta {upstream[0].getsockname()[1]}")
+        return flow
+
+    def _close_flow(self, flow):
+        del self.flows[flow.client]
+        for sock in flow.upstream + flow.downstream[1:]:
+            self.selector.unregister(sock)
+            sock.close()
+
+    def _forward(self, flow, offset, direction, packet, source, now):
+        flow.active = now
+        if direction == UPSTREAM:
+            sock, destination = flow.upstream[offset], flow.peers[offset]
+            if destination is None:
+                return  # ninguem do lado do servidor falou por este par ainda
+        else:
+            if offset:
+                flow.peers[offset] = source
+            sock, destination = flow.downstream[offset], (flow.client[0], flow.client[1] + offset)
+        for deliver in flow.links[direction, offset].schedule(len(packet), now):
+            heapq.heappush(self.pending, (deliver, next(self.order), sock, packet, destination, direction))
+
+    def _drain(self, sock, route):
+        # le tudo o que esta pronto no socket antes de voltar ao select
+        now = time.monotonic()
+        while True:
+            try:
+                packet, source = sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # ex.: ICMP de porta inalcancavel de um envio anterior
+            if route is None:
+                flow = self.flows.get(source) or self._open_flow(source)
+                self._forward(flow, 0, UPSTREAM, packet, source, now)
+            else:
+                self._forward(*route, packet, source, now)
+
+    def _deliver(self, now):
+        while self.pending and self.pending[0][0] <= now:
+            _, _, sock, packet, destination, direction = heapq.heappop(self.pending)
+            try:
+                sock.sendto(packet, destination)
+                self.stats[direction]["entregues"] += 1
+                self.stats[direction]["bytes entregues"] += len(packet)
+            except OSError:
+                pass  # destino fora do ar ou socket ja fechado: o pacote some, como na rede
+
+    def _expire(self, now):
+        if now < self.next_check:
+            return
+        self.next_check = now + FLOW_CHECK
+        for flow in [flow for flow in self.flows.values() if now - flow.active > FLOW_IDLE]:
+            print(f"Emulador: Cliente {flow.client[0]}:{flow.client[1]} ocioso, sockets fechados")
+            self._close_flow(flow)
+
+    def run(self):
+        while True:
+            now = time.monotonic()
+            timeout = FLOW_CHECK
+            if self.pending:
+                timeout = min(timeout, max(0.0, self.pending[0][0] - now))
+            for key, _ in self.selector.select(timeout):
+                self._drain(key.fileobj, key.data)
+            now = time.monotonic()
+            self._deliver(now)
+            self._expire(now)
+
+    def report(self):
+        for direction, counters in self.stats.items():
+            print(f"Emulador: {direction}: " + ", ".join(f"{counters[name]} {name}" for name in COUNTERS))
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def probability(text):
+    value = float(text)
+    if not 0.0 <= value <= 1.0:
+        raise argparse.ArgumentTypeError("deve estar entre 0 e 1")
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Proxy UDP que emula uma rede ruim entre os clientes e o servidor",
+        epilog="Exemplo: python3 server_chat.py --porta 5001 & python3 net_emulator.py --portas 2 --perda 0.01 --atraso 20")
+    parser.add_argument("--escuta", type=parse_address, default=("127.0.0.1", LISTEN_PORT),
+                        help=f"endereco onde os clientes chegam (padrao: 127.0.0.1:{LISTEN_PORT})")
+    parser.add_argument("--servidor", type=parse_address, default=("127.0.0.1", SERVER_PORT),
+                        help=f"endereco do servidor de verdade (padrao: 127.0.0.1:{SERVER_PORT})")
+    parser.add_argument("--portas", type=int, default=1,
+                        help="portas consecutivas por cliente (2 para o chat, que responde na porta + 1)")
+    parser.add_argument("--semente", type=int, default=0, help="semente dos sorteios; mesma semente, mesmas perdas")
+    parser.add_argument("--sentido", choices=["ambos", UPSTREAM, DOWNSTREAM], default="ambos",
+                        help="sentido degradado: ida = cliente -> servidor, volta = servidor -> cliente")
+    parser.add_argument("--perda", type=probability, default=0.0,
+                        help="probabilidade de perda (no estado bom, com --ge)")
+    parser.add_argument("--ge", type=probability, nargs=2, metavar=("P", "R"),
+                        help="perda em rajadas (Gilbert-Elliott): P = bom -> ruim, R = ruim -> bom, por datagrama")
+    parser.add_argument("--perda-ruim", type=probability, default=1.0,
+                        help="probabilidade de perda no estado ruim, com --ge (padrao: 1)")
+    parser.add_argument("--duplicacao", type=probability, default=0.0, help="probabilidade de duplicar um datagrama")
+    parser.add_argument("--atraso", type=float, default=0.0, help="atraso em um sentido, em ms")
+    parser.add_argument("--variacao", type=float, default=0.0, help="variacao do atraso (+- ms, uniforme)")
+    parser.add_argument("--reordem", type=probability, default=0.0,
+                        help="probabilidade de um datagrama ser segurado e chegar depois dos seguintes")
+    parser.add_argument("--atraso-reordem", type=float, default=10.0,
+                        help="quanto um datagrama reordenado e segurado, em ms (padrao: 10)")
+    parser.add_argument("--banda", type=float, default=0.0, help="limite de banda por sentido, em Mbit/s (0 = sem limite)")
+    parser.add_argument("--balde", type=int, default=64 * 1024, help="rajada permitida pelo limite de banda, em bytes")
+    parser.add_argument("--fila", type=int, default=256 * 1024,
+                        help="bytes esperando banda antes de descartar (drop-tail)")
+    args = parser.parse_args()
+    if args.portas < 1:
+        parser.error("--portas deve ser pelo menos 1")
+    if args.atraso < 0 or args.variacao < 0 or args.atraso_reordem < 0 or args.banda < 0:
+        parser.error("atrasos e banda nao podem ser negativos")
+
+    emulator = Emulator(args.escuta, args.servidor, args)
+    # kill tambem imprime o relatorio
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Emulador: {args.escuta[0]}:{args.escuta[1]} -> {args.servidor[0]}:{args.servidor[1]} (semente {args.semente})")
+    try:
+        emulator.run()
+    except KeyboardInterrupt:
+        print()
+    finally:
+        emulator.report()
@@ -1,92 +1,524 @@
+import itertools
+import random
 import socket
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+from rdt_timer import RtoEstimator, RetransmissionTimer
+from compression import NONE, compress, decompress
+from congestion import CongestionController, DUPACK_THRESHOLD
+from metrics import METRICS
 
 PACKET_SIZE = 1024  # tamanho total do datagrama udp
+MAX_RETRIES = 10    # retransmissoes de um mesmo segmento antes de desistir
+
+# cabecalho binario fixo: versao, flags, id da conexao, sequencia, id da mensagem,
+# indice do fragmento, total de fragmentos, tamanho da carga, checksum (crc32).
+# os acks sao cumulativos: o campo do indice leva quantos fragmentos da mensagem
+# chegaram em sequencia (o primeiro que falta), o do total a janela anunciada
+# pelo receptor, e a carga um mapa sack com os fragmentos que chegaram depois do
+# primeiro que falta (bit i = fragmento cumulativo + 1 + i)
+HEADER = struct.Struct('!BBHIIHHHI')
+PROTOCOL_VERSION = 3
+FLAG_ACK = 0x01
+FLAG_ACK_NOW = 0x20  # o remetente vai parar para esperar acks: este fragmento e confirmado na hora
+# flags tambem levam dois algoritmos de compressao (ver compression): o da carga
+# (bits 1-2, a mensagem inteira e comprimida antes de ser fragmentada) e o que
+# o remetente aceita receber (bits 3-4), que e como cliente e servidor combinam
+# o algoritmo da sessao
+CODEC_SHIFT = 1
+ACCEPT_SHIFT = 3
+CODEC_MASK = 0x03
+MAX_PAYLOAD = PACKET_SIZE - HEADER.size
+MAX_FRAGMENTS = 0xFFFF
+SACK = struct.Struct('!I')
+ACK_ALL = MAX_FRAGMENTS  # ack cumulativo de uma mensagem ja entregue inteira
+ACK_EVERY = 2            # acks atrasados: um para cada tantos fragmentos em sequencia
+
+FRAGMENT_WINDOW = 32                    # teto de fragmentos de uma mensagem em transito ao mesmo tempo
+REASSEMBLY_MAX_BYTES = 4 * 1024 * 1024  # memoria maxima reservada para mensagens incompletas
+REASSEMBLY_TIMEOUT = 30                 # segundos sem fragmentos novos antes de descartar a mensagem
+COMPLETED_HISTORY = 1024                # mensagens entregues lembradas para reconhecer duplicatas
+
+# dicionario do zlib conhecido pelas duas pontas: trechos que se repetem nos avisos
+# do servidor, para que mesmo mensagens curtas encolham (os mais comuns no fim)
+CHAT_DICTIONARY = (
+    "erro: comando invalido. conecte-se primeiro. nao encontrado ou offline. "
+    "voce adicionou ' a sua lista de amigos. voce removeu ' da sua lista de amigos. "
+    "sua lista de amigos:\n- usuarios conectados:\n- usuario"
+    "servidor: votacao para banir [] expirou. foi banido da sala por votacao. "
+    "servidor: votacao para banir [] - votos: /"
+    "conexao aceita: servidor:  saiu da sala. servidor:  entrou na sala. "
+    "127.0.0.1:/~: [ amigo ] /2025 /2026 "
+).encode('utf-8')
+
+# ids de mensagem comecam em um valor sorteado para nao repetir os de uma execucao anterior
+_message_ids = itertools.count(random.getrandbits(32))
+
+def encode_message(message):
+    # codifica a mensagem uma unica vez; bytes ja codificados passam direto
+    return message.encode('utf-8') if isinstance(message, str) else message
+
+def segment_message(message):
+    # fragmenta a mensagem (ja em bytes) em segmentos que cabem em um datagrama
+    data = memoryview(encode_message(message))
+    return [data[offset : offset + MAX_PAYLOAD] for offset in range(0, len(data), MAX_PAYLOAD)]
+
+def make_datagram(sequence_number, segment, connection_id=0, message_id=0, index=0, count=1, flags=0):
+    # constroi o datagrama uma vez; as retransmissoes reaproveitam o mesmo objeto
+    header = HEADER.pack(PROTOCOL_VERSION, flags, connection_id, sequence_number, message_id,
+                         index, count, len(segment), zlib.crc32(segment))
+    return header + segment
+
+@lru_cache(maxsize=4096)
+def make_ack(sequence_number, connection_id=0, message_id=0, cumulative=ACK_ALL, window=0, sack=0):
+    # acks sao sempre iguais para o mesmo estado da mensagem e a mesma janela: montados uma vez so
+    bitmap = SACK.pack(sack)
+    return HEADER.pack(PROTOCOL_VERSION, FLAG_ACK, connection_id, sequence_number, message_id,
+                       cumulative, window, len(bitmap), zlib.crc32(bitmap)) + bitmap
+
+def request_ack(datagram):
+    # o mesmo fragmento pedindo ack imediato. o crc cobre so a carga, entao basta trocar as flags
+    return datagram[:1] + bytes((datagram[1] | FLAG_ACK_NOW,)) + datagram[2:]
+
+class PreparedMessage(tuple):
+    # datagramas de uma mensagem ja codificada e enquadrada
+    pass
+
+def prepare_message(message, sequence_number=0, connection_id=0, codec=NONE, accept=NONE):
+    """
+    codifica e fragmenta a mensagem uma unica vez. todos os fragmentos levam o
+    mesmo numero de sequencia (o bit alternado e por mensagem) e um id de
+    mensagem novo, com o indice e o total de fragmentos para a remontagem. o
+    resultado pode ser enviado a varios destinatarios e retransmitido sem
+    remontar nenhum pacote; mensagens ja preparadas sao devolvidas como estao.
+
+    com codec a mensagem e comprimida antes de ser fragmentada (se encolher;
+    senao vai como esta), e accept anuncia ao destino o algoritmo que este
+    lado aceita receber.
+    """
+    if isinstance(message, PreparedMessage):
+        return message
+    used, data = compress(codec, encode_message(message), CHAT_DICTIONARY)
+    flags = used << CODEC_SHIFT | accept << ACCEPT_SHIFT
+    segments = segment_message(data)
+    if len(segments) > MAX_FRAGMENTS:
+        raise ValueError(f"mensagem grande demais: {len(segments)} fragmentos")
+    message_id = next(_message_ids) & 0xFFFFFFFF
+    return PreparedMessage(
+        make_datagram(sequence_number, segment, connection_id, message_id, index, len(segments), flags)
+        for index, segment in enumerate(segments))
+
+def datagram_sequence(datagram):
+    return HEADER.unpack_from(datagram)[3]
+
+def ack_key(packet):
+    # o que liga um ack a mensagem confirmada: (conexao, sequencia, id da mensagem).
+    # vale tanto para os datagramas de dados quanto para os acks deles
+    return HEADER.unpack_from(packet)[2:5]
+
+def acked_fragments(ack_packet, pending):
+    # indices de pending confirmados pelo ack: os abaixo do ack cumulativo e os marcados no sack
+    cumulative = HEADER.unpack_from(ack_packet)[5]
+    sack = SACK.unpack_from(ack_packet, HEADER.size)[0] if len(ack_packet) >= HEADER.size + SACK.size else 0
+    return [index for index in pending
+            if index < cumulative or (index > cumulative and sack >> (index - cumulative - 1) & 1)]
+
+def ack_window(packet):
+    # fragmentos que o receptor ainda aceita, anunciados no ack
+    return HEADER.unpack_from(packet)[6]
+
+def parse_packet(packet):
+    """
+    valida e separa um datagrama recebido.
+
+    returns:
+        tuple: (flags, id da conexao, sequencia, id da mensagem, indice do
+        fragmento, total de fragmentos, carga util), ou none se o pacote estiver
+        truncado, corrompido ou for de outra versao.
+    """
+    if len(packet) < HEADER.size:
+        return None
+    (version, flags, connection_id, sequence_number, message_id,
+     index, count, length, checksum) = HEADER.unpack_from(packet)
+    if version != PROTOCOL_VERSION or len(packet) - HEADER.size != length:
+        return None
+    # uma unica copia: a carga util ja sai pronta para ser entregue
+    payload = packet[HEADER.size:]
+    if zlib.crc32(payload) != checksum:
+        return None
+    return flags, connection_id, sequence_number, message_id, index, count, payload
+
+def decode_message(flags, message, max_size=REASSEMBLY_MAX_BYTES):
+    # desfaz a compressao de uma mensagem ja remontada (flags de qualquer fragmento dela)
+    return decompress(flags >> CODEC_SHIFT & CODEC_MASK, message, max_size, CHAT_DICTIONARY)
+
+def accepted_codec(flags):
+    # algoritmo que o remetente do pacote aceita receber
+    return flags >> ACCEPT_SHIFT & CODEC_MASK
+
+def is_ack(packet):
+    return len(packet) >= HEADER.size and packet[1] & FLAG_ACK
+
+class ReassemblyBuffer:
+    """
+    remonta mensagens fragmentadas, por (origem, id da mensagem).
+
+    a primeira vez que um fragmento de uma mensagem chega, o espaco da mensagem
+    inteira (total x MAX_PAYLOAD) e reservado; se nao couber em max_bytes o
+    fragmento e recusado sem ack e o remetente tenta de novo depois, entao a
+    memoria nunca passa do limite. mensagens sem fragmentos novos por timeout
+    segundos sao descartadas. os ids das ultimas mensagens entregues ficam
+    guardados para que uma retransmissao atrasada seja confirmada de novo, mas
+    nao entregue duas vezes.
+
+    o buffer tambem decide quando confirmar (acks atrasados): um ack a cada
+    ACK_EVERY fragmentos em sequencia, e na hora quando a mensagem termina, um
+    fragmento chega fora de ordem, fecha um buraco ou e repetido, ou quando o
+    remetente pede (FLAG_ACK_NOW).
+    """
+
+    def __init__(self, max_bytes=REASSEMBLY_MAX_BYTES, timeout=REASSEMBLY_TIMEOUT,
+                 history=COMPLETED_HISTORY):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.history = history
+        # {(origem, id): [prazo, total, {indice: carga}, ack cumulativo, fragmentos sem ack]}, mais antiga primeiro
+        self.partial = OrderedDict()
+        self.completed = OrderedDict()  # {(origem, id): None} mensagens ja entregues
+        self.reserved = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.partial)
+
+    def window(self, source, message_id):
+        # fragmentos que ainda cabem: o espaco livre mais o que falta da mensagem
+        # em andamento (ja reservado), para o ack dessa mensagem
+        with self.lock:
+            free = (self.max_bytes - self.reserved) // MAX_PAYLOAD
+            entry = self.partial.get((source, message_id))
+            if entry is not None:
+                free += entry[1] - len(entry[2])
+        return min(free, MAX_FRAGMENTS)
+
+    def acknowledgement(self, source, message_id):
+        # (ack cumulativo, mapa sack) da mensagem; ACK_ALL se ela ja foi entregue
+        with self.lock:
+            entry = self.partial.get((source, message_id))
+            if entry is None:
+                return ACK_ALL, 0
+            cumulative, sack = entry[3], 0
+            for index in entry[2]:
+                if cumulative < index <= cumulative + SACK.size * 8:
+                    sack |= 1 << (index - cumulative - 1)
+            return cumulative, sack
+
+    def add(self, source, message_id, index, count, payload, urgent=False):
+        """
+        guarda um fragmento.
+
+        returns:
+            tuple: (aceito, mensagem, confirmar). aceito e false quando o
+            fragmento foi recusado e nao deve ser confirmado; mensagem e a
+            mensagem completa quando este fragmento foi o ultimo que faltava,
+            senao none; confirmar diz se o ack deve sair agora ou pode esperar
+            o proximo fragmento.
+        """
+        key = (source, message_id)
+        now = time.monotonic()
+        with self.lock:
+            if key in self.completed:
+                return True, None, True
+            if count == 1:
+                self._complete(key)
+                return True, payload, True
+            if index >= count:
+                return False, None, False
+
+            entry = self.partial.get(key)
+            if entry is None:
+                self._expire(now)
+                size = count * MAX_PAYLOAD
+                if self.reserved + size > self.max_bytes:
+                    return False, None, False
+                self.reserved += size
+                entry = self.partial[key] = [now + self.timeout, count, {}, 0, 0]
+            elif entry[1] != count:
+                return False, None, False
+            else:
+                entry[0] = now + self.timeout
+                self.partial.move_to_end(key)
+
+            fragments = entry[2]
+            repeated = index in fragments
+            fragments[index] = payload
+            if len(fragments) < count:
+                cumulative = entry[3]
+                while entry[3] in fragments:
+                    entry[3] += 1
+                entry[4] += 1
+                # fora de ordem (ou fechando um buraco) e repetidos sao confirmados
+                # na hora: o remetente usa o sack para descobrir o que se perdeu
+                in_order = index == cumulative and entry[3] == cumulative + 1
+                confirm = urgent or repeated or not in_order or entry[4] >= ACK_EVERY
+                if confirm:
+                    entry[4] = 0
+                return True, None, confirm
+            del self.partial[key]
+            self.reserved -= count * MAX_PAYLOAD
+            self._complete(key)
+        return True, b"".join(fragments[position] for position in range(count)), True
+
+    def _complete(self, key):
+        self.completed[key] = None
+        if len(self.completed) > self.history:
+            self.completed.popitem(last=False)
+
+    def _expire(self, now):
+        # a ordem do dicionario e a da ultima atividade, entao as vencidas estao no inicio
+        while self.partial:
+            key, (deadline, count, *_) = next(iter(self.partial.items()))
+            if deadline > now:
+                break
+            del self.partial[key]
+            self.reserved -= count * MAX_PAYLOAD
+
+# buffer de remontagem usado por receive_data quando nenhum outro e informado
+REASSEMBLY = ReassemblyBuffer()
 
 def send_data(sock, message, destination_address, sequence_number_tracker):
     """
     envia dados de forma confiavel usando o protocolo rdt 3.0.
 
+    mensagens maiores que um datagrama sao fragmentadas, e varios fragmentos
+    ficam em transito ao mesmo tempo, cada um com seu ack e seu prazo de
+    retransmissao, em vez de um stop-and-wait por fragmento. os acks sao
+    cumulativos com sack, e o receptor so confirma na hora o fragmento que
+    fecha a rajada (FLAG_ACK_NOW) ou a cada ACK_EVERY fragmentos. quantos depende
+    da janela de congestionamento (slow start, aimd e recuperacao rapida, ate
+    FRAGMENT_WINDOW) e da janela anunciada pelo receptor nos acks, e os
+    fragmentos novos sao espacados ao longo do rtt. o timeout e estimado a
+    partir do rtt medido (srtt/rttvar, backoff exponencial e regra de karn).
+    o estimador, o controle de congestionamento e a ultima janela anunciada
+    ficam guardados em sequence_number_tracker['rto'], ['cc'] e ['janela']
+    para serem reaproveitados entre chamadas, e
+    sequence_number_tracker['conn_id'] (opcional) identifica a conexao,
+    sequence_number_tracker['codec'] e ['aceita'] (opcionais) sao o algoritmo de
+    compressao usado nas mensagens e o que este lado aceita receber, e
+    sequence_number_tracker['dupacks'] (opcional, padrao DUPACK_THRESHOLD) e
+    quantos acks repetidos disparam a retransmissao rapida.
+
     args:
         sock (socket.socket): o socket do remetente.
-        message (str): a mensagem a ser enviada.
+        message (str | bytes | PreparedMessage): a mensagem a ser enviada.
         destination_address (tuple): o endereco do destinatario (ip, porta).
         sequence_number_tracker (dict): um dicionario para rastrear o numero de sequencia.
+
+    returns:
+        bool: true se todos os fragmentos foram confirmados, false se o destino nao respondeu.
     """
-    offset = 0
-    delimiter = "::"
-    header_size = len(f"{sequence_number_tracker['num']}{delimiter}")
-    payload_size = PACKET_SIZE - header_size
-
-    # fragmenta a mensagem em segmentos e os envia um por um
-    while offset < len(message):
-        segment = message[offset : offset + payload_size]
-        ack_confirmed = False
-
-        # constroi o datagrama com o numero de sequencia
-        datagram = f"{sequence_number_tracker['num']}{delimiter}{segment}"
-        
-        # envia o datagrama e espera pelo ack
-        sock.sendto(datagram.encode('utf-8'), destination_address)
-
-        while not ack_confirmed:
+    rto = sequence_number_tracker.setdefault('rto', RtoEstimator())
+    cc = sequence_number_tracker.setdefault('cc', CongestionController(FRAGMENT_WINDOW))
+    connection_id = sequence_number_tracker.get('conn_id', 0)
+    datagrams = prepare_message(message, sequence_number_tracker['num'], connection_id,
+                                sequence_number_tracker.get('codec', NONE),
+                                sequence_number_tracker.get('aceita', NONE))
+    if not datagrams:
+        return True
+    METRICS.incr("rdt.mensagens_enviadas")
+    # os acks de todos os fragmentos levam a mesma chave, a da mensagem
+    message_key = ack_key(datagrams[0])
+    unacked = {}  # {indice: [ultimo envio em, retransmitido, tentativas]}
+    timer = RetransmissionTimer()
+    next_index = 0
+    dupacks = sequence_number_tracker.get('dupacks', DUPACK_THRESHOLD)
+    duplicate_acks = 0  # acks seguidos sem nada novo confirmado
+    held = None         # fragmento ja contado como segurado pelo espacamento
+    previous_timeout = sock.gettimeout()
+
+    def window():
+        return min(cc.window, sequence_number_tracker.get('janela', FRAGMENT_WINDOW))
+
+    def window_open():
+        # sem nada em transito sempre sai um fragmento, que traz de volta a janela do receptor
+        return next_index < len(datagrams) and (not unacked or len(unacked) < window())
+
+    try:
+        while next_index < len(datagrams) or unacked:
+            # enche a janela com os proximos fragmentos, no ritmo do espacamento
+            now = time.monotonic()
+            while window_open() and cc.pacing_delay(now) <= 0:
+                datagram = datagrams[next_index]
+                if next_index + 1 == len(datagrams) or len(unacked) + 1 >= window():
+                    # depois deste o remetente para e espera: o ack nao pode ficar para depois
+                    datagram = request_ack(datagram)
+                sock.sendto(datagram, destination_address)
+                unacked[next_index] = [now, False, 0]
+                timer.start(next_index, rto.timeout)
+                cc.on_send(rto.srtt, now)
+                next_index += 1
+                METRICS.incr("rdt.fragmentos_enviados")
+
+            expired = timer.pop_expired()
+            if expired:
+                # timeout: dobra o rto e corta a janela uma vez por rodada e reenvia os fragmentos vencidos
+                rto.backoff()
+                cc.on_timeout(len(unacked))
+                METRICS.incr("rdt.timeouts")
+                for index in expired:
+                    state = unacked[index]
+                    state[2] += 1
+                    if state[2] > MAX_RETRIES:
+                        print(f"aviso: {destination_address} nao confirmou o pacote, desistindo.")
+                        METRICS.incr("rdt.mensagens_abandonadas")
+                        return False
+                    state[0], state[1] = time.monotonic(), True
+                    METRICS.incr("rdt.retransmissoes")
+                    sock.sendto(request_ack(datagrams[index]), destination_address)
+                    timer.start(index, rto.timeout)
+                continue
+
+            # dorme ate o prazo do timer mais proximo (ou ate a vez do proximo
+            # fragmento), independente do timeout do chamador
+            wait = timer.time_left()
+            if window_open():
+                delay = cc.pacing_delay(time.monotonic())
+                if delay > 0 and held != next_index:
+                    # o proximo fragmento espera a sua vez: conta uma vez por fragmento
+                    held = next_index
+                    cc.paced += 1
+                wait = delay if wait is None else min(wait, delay)
             try:
+                sock.settimeout(max(wait, 0.001))
                 ack_packet, _ = sock.recvfrom(PACKET_SIZE)
-                # verifica se o ack corresponde a sequencia enviada
-                if ack_packet.decode('utf-8') == f"ACK{sequence_number_tracker['num']}":
-                    ack_confirmed = True
-                    # alterna o numero de sequencia (0 -> 1, 1 -> 0)
-                    sequence_number_tracker['num'] = 1 - sequence_number_tracker['num']
-                else:
-                    # ack incorreto, reenvia o pacote
-                    sock.sendto(datagram.encode('utf-8'), destination_address)
             except socket.timeout:
-                # timeout: reenvia o pacote
-                sock.sendto(datagram.encode('utf-8'), destination_address)
-            except ConnectionResetError:
+                # o prazo venceu; a retransmissao acontece no inicio do laco
+                continue
+            except (ConnectionResetError, ConnectionRefusedError):
                 print("aviso: a conexao foi resetada pelo outro lado.")
-                return
+                return False
 
-        offset += payload_size
+            if not is_ack(ack_packet):
+                continue
+            if ack_key(ack_packet) == message_key:
+                sequence_number_tracker['janela'] = ack_window(ack_packet)
+                acked = acked_fragments(ack_packet, unacked)
+            else:
+                # ack incorreto (de uma mensagem anterior, atrasado ou repetido): conta
+                # como ack repetido, em vez de reenviar um fragmento a cada um deles
+                METRICS.incr("rdt.acks_incorretos")
+                acked = ()
+            duplicate_acks = 0 if acked else duplicate_acks + 1
+            sent_at = None
+            for index in sorted(acked):
+                state = unacked.pop(index)
+                timer.cancel(index)
+                cc.on_ack(index)
+                # regra de karn: so mede o rtt de pacotes nao retransmitidos, e um
+                # ack cumulativo so vale como amostra do fragmento mais recente
+                if not state[1] and (sent_at is None or state[0] > sent_at):
+                    sent_at = state[0]
+            if sent_at is not None:
+                rtt = time.monotonic() - sent_at
+                rto.sample(rtt)
+                METRICS.observe("rdt.rtt", rtt)
+            if not unacked:
+                continue
+            # o fragmento mais antigo segue sem ack e dupacks posteriores ja foram
+            # confirmados (pelo sack), ou chegaram dupacks acks repetidos: e dado como
+            # perdido e reenviado sem esperar o timeout, no maximo uma vez por rtt
+            oldest = min(unacked)
+            later_acked = (next_index - oldest - 1) - (len(unacked) - 1)
+            state = unacked[oldest]
+            if max(later_acked, duplicate_acks) >= dupacks and not rto.within_rtt(state[0]):
+                duplicate_acks = 0
+                cc.on_loss(len(unacked), next_index - 1)
+                state[0], state[1] = time.monotonic(), True
+                state[2] += 1
+                METRICS.incr("rdt.retransmissoes")
+                METRICS.incr("rdt.retransmissoes_rapidas")
+                sock.sendto(request_ack(datagrams[oldest]), destination_address)
+                timer.start(oldest, rto.timeout)
+    finally:
+        sock.settimeout(previous_timeout)
 
-def receive_data(sock, received_packet, sender_address, expected_sequence_tracker):
+    # alterna o numero de sequencia (0 -> 1, 1 -> 0) para a proxima mensagem
+    sequence_number_tracker['num'] = 1 - datagram_sequence(datagrams[0])
+    return True
+
+def receive_data(sock, received_packet, sender_address, expected_sequence_tracker, reassembly=None,
+                 peer=None):
     """
     recebe dados de forma confiavel usando o protocolo rdt 3.0.
 
+    cada fragmento e guardado no buffer de remontagem; a mensagem so e
+    devolvida quando o ultimo fragmento chega. os acks sao cumulativos, com um
+    mapa sack dos fragmentos fora de ordem, e o buffer decide quando podem
+    esperar o proximo fragmento (ver ReassemblyBuffer).
+
     args:
         sock (socket.socket): o socket do receptor.
         received_packet (bytes): o pacote de dados recebido.
         sender_address (tuple): o endereco do remetente.
-        expected_sequence_tracker (dict): dicionario para rastrear a sequencia esperada.
+        expected_sequence_tracker (dict | none): dicionario para rastrear a sequencia
+            esperada. com none qualquer sequencia e aceita e as duplicatas sao
+            reconhecidas so pelo id da mensagem.
+        reassembly (ReassemblyBuffer): buffer de remontagem (padrao: REASSEMBLY).
+        peer (dict | none): se informado, recebe em peer['aceita'] o algoritmo de
+            compressao que o remetente aceita receber.
 
     returns:
-        bytes: o conteudo da mensagem se o pacote for recebido corretamente, caso contrario none.
+        bytes: o conteudo da mensagem quando ela estiver completa, caso contrario none.
     """
     try:
-        if not received_packet:
+        # separa cabecalho e carga util; pacotes malformados ou acks sao ignorados
+        parsed = parse_packet(received_packet)
+        if parsed is None or parsed[0] & FLAG_ACK:
             return None
-
-        # divide o pacote no cabecalho (numero de sequencia) e na carga util
-        delimiter = b"::"
-        header, payload = received_packet.split(delimiter, 1)
-        received_sequence_num = int(header.decode('utf-8'))
+        flags, connection_id, received_sequence_num, message_id, index, count, payload = parsed
+        buffer = REASSEMBLY if reassembly is None else reassembly
+        source = (sender_address, connection_id)
+        if peer is not None:
+            peer['aceita'] = accepted_codec(flags)
 
         # compara o numero de sequencia recebido com o esperado
-        if received_sequence_num == expected_sequence_tracker['num']:
-            # sequencia correta: envia ack e retorna a carga util
-            ack_msg = f"ACK{expected_sequence_tracker['num']}"
-            sock.sendto(ack_msg.encode('utf-8'), sender_address)
-            # alterna o numero de sequencia esperado para o proximo pacote
-            expected_sequence_tracker['num'] = 1 - expected_sequence_tracker['num']
-            return payload
+        if expected_sequence_tracker is not None and received_sequence_num != expected_sequence_tracker['num']:
+            # sequencia incorreta (mensagem ja entregue): confirma a mensagem inteira de novo e descarta
+            METRICS.incr("rdt.duplicados")
+            sock.sendto(make_ack(received_sequence_num, connection_id, message_id, ACK_ALL,
+                                 buffer.window(source, message_id)), sender_address)
+            return None
+
+        accepted, message, confirm = buffer.add(source, message_id, index, count, payload,
+                                                flags & FLAG_ACK_NOW)
+        if not accepted:
+            METRICS.incr("rdt.fragmentos_sem_espaco")
+            return None  # sem ack: o remetente retransmite quando houver espaco
+        METRICS.incr("rdt.fragmentos_recebidos")
+        if confirm:
+            # ack cumulativo com o sack e quantos fragmentos ainda cabem no buffer de remontagem
+            cumulative, sack = buffer.acknowledgement(source, message_id)
+            sock.sendto(make_ack(received_sequence_num, connection_id, message_id, cumulative,
+                                 buffer.window(source, message_id), sack), sender_address)
         else:
-            # sequencia incorreta (pacote duplicado): reenvia o ack da ultima sequencia correta
-            ack_msg = f"ACK{1 - expected_sequence_tracker['num']}"
-            sock.sendto(ack_msg.encode('utf-8'), sender_address)
-            return None  # descarta o pacote fora de ordem
-            
-    except (ValueError, IndexError):
-        # pacote malformado, ignora
-        return None
+            METRICS.incr("rdt.acks_adiados")
+        if message is None:
+            return None
+        try:
+            message = decode_message(flags, message, buffer.max_bytes)
+        except ValueError as e:
+            print(f"aviso: mensagem de {sender_address} descartada: {e}")
+            return None
+        if expected_sequence_tracker is not None:
+            # alterna o numero de sequencia esperado para a proxima mensagem
+            expected_sequence_tracker['num'] = 1 - expected_sequence_tracker['num']
+        METRICS.incr("rdt.mensagens_recebidas")
+        return message
+
     except ConnectionResetError:
         print("aviso: a conexao com o cliente foi encerrada.")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import time
+
+# --- estimativa do timeout de retransmissao (RFC 6298) ---
+ALPHA = 1 / 8        # peso de cada nova amostra no RTT suavizado
+BETA = 1 / 4         # peso de cada nova amostra na variacao do RTT
+K = 4                # quantas variacoes somar ao RTT suavizado
+GRANULARITY = 0.001  # resolucao do relogio (1 ms)
+
+INITIAL_RTO = 1.0  # antes da primeira amostra
+MIN_RTO = 0.01     # baixo o bastante para recuperar perdas em ms no loopback
+MAX_RTO = 60.0
+
+
+class RtoEstimator:
+    def __init__(self, initial_rto=INITIAL_RTO, min_rto=MIN_RTO, max_rto=MAX_RTO):
+        self.srtt = None    # RTT suavizado
+        self.rttvar = None  # variacao do RTT
+        self.rto = initial_rto
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.backoffs = 0   # timeouts seguidos desde a ultima amostra valida
+
+    @property
+    def timeout(self):
+        return self.rto
+
+    def sample(self, rtt):
+        # regra de Karn: so deve ser chamado com o RTT de pacotes que NAO
+        # foram retransmitidos, pois o ACK de um pacote retransmitido e ambiguo
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        rto = self.srtt + max(GRANULARITY, K * self.rttvar)
+        self.rto = min(max(rto, self.min_rto), self.max_rto)
+        self.backoffs = 0
+
+    def backoff(self):
+        # backoff exponencial: dobra o RTO a cada timeout ate chegar uma amostra nova
+        self.rto = min(self.rto * 2, self.max_rto)
+        self.backoffs += 1
+
+    def within_rtt(self, sent_at, now=None):
+        # se um pacote enviado em sent_at ainda pode estar em transito (menos de
+        # um RTT suavizado; o RTO antes da primeira amostra). reenvia-lo de novo
+        # nesse intervalo so duplicaria o trafego: a resposta nem teve tempo de chegar
+        now = time.monotonic() if now is None else now
+        return now - sent_at < (self.srtt if self.srtt is not None else self.rto)
+
+
+# --- timer de retransmissao orientado a eventos ---
+class RetransmissionTimer:
+    # guarda os prazos em um heap para que quem espera durma exatamente ate o
+    # proximo vencimento, em vez de acordar periodicamente para conferir
+
+    def __init__(self):
+        self._heap = []     # [(prazo, desempate, chave)]
+        self._active = {}   # {chave: prazo vigente}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._active)
+
+    def __contains__(self, key):
+        return key in self._active
+
+    def start(self, key, timeout, now=None):
+        # (Re)inicia o timer de uma chave; entradas antigas viram lixo no heap
+        deadline = (time.monotonic() if now is None else now) + timeout
+        self._active[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+
+    def cancel(self, key):
+        self._active.pop(key, None)
+
+    def deadline(self, key):
+        # prazo vigente de uma chave (None se nao houver timer para ela)
+        return self._active.get(key)
+
+    def clear(self):
+        self._heap.clear()
+        self._active.clear()
+
+    def next_deadline(self):
+        # descarta do topo do heap as entradas canceladas ou reiniciadas
+        while self._heap:
+            deadline, _, key = self._heap[0]
+            if self._active.get(key) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def time_left(self, now=None):
+        # segundos ate o proximo vencimento (0 se ja venceu, None se nao ha timers)
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(deadline - now, 0.0)
+
+    def pop_expired(self, now=None):
+        # remove e retorna as chaves cujo prazo ja passou, da mais antiga a mais nova
+        now = time.monotonic() if now is None else now
+        expired = []
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return expired
+            _, _, key = heapq.heappop(self._heap)
+            del self._active[key]
+            expired.append(key)
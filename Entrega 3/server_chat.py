@@ -1,102 +1,164 @@
+import argparse
+import asyncio
 import socket
 import datetime
+import ipaddress
 import time
-from threading import Thread, Timer
-from rdt_protocol import send_data, receive_data
+from threading import Thread
+from rdt_protocol import receive_data, prepare_message
+from compression import CODEC_NAMES, NONE, available, codec_name, negotiate_codec
+from async_rdt import AsyncRdtEndpoint, attach_batched_socket
+from datagram_io import BatchedSocket, DEFAULT_RCVBUF, DEFAULT_SNDBUF
+from fanout import FanoutEngine, ThreadPoolTransmitter, POLICIES, POLICY_DROP_OLDEST, DEFAULT_MAX_QUEUE
+from user_registry import UserRegistry
+from timer_wheel import TimerWheel
+from metrics import METRICS, serve_http
+from congestion import DUPACK_THRESHOLD
 
 # configuracao do servidor
 HOST = "localhost"
 MAIN_PORT = 5000
 BUFFER_SIZE = 1024
 CLIENT_TIMEOUT = 120  # timeout em segundos para detectar clientes inativos
+BAN_VOTE_TIMEOUT = 60  # votacoes de banimento sem desfecho expiram apos esse tempo
+TIMER_TICK = 0.5  # resolucao dos prazos de expiracao
 
 # estruturas de dados para gerenciamento de estado
-ACTIVE_USERS = {}       # {username: {"addr": (ip, port), "seq_num": int, "last_activity": timestamp}}
-FRIEND_LISTS = {}     # {user1: {friend1, friend2}, user2: {friend3}}
+REGISTRY = UserRegistry()  # sessoes por nome e por endereco, amigos e indice reverso de amigos
 BAN_VOTES = {}        # {target_user: {"voters": {user1, user2}, "required": int}}
+FANOUT = None         # FanoutEngine com uma fila de saida por cliente (criado ao iniciar o servidor)
+TIMERS = TimerWheel(TIMER_TICK)  # prazos de inatividade e de votacoes, rearmados em o(1)
+ALLOWED_CODECS = available()  # algoritmos de compressao que um cliente pode pedir
 
 # funcoes auxiliares
 def get_user_by_address(address):
-   # encontra um nome de usuario com base em seu endereco.
-    for user, data in ACTIVE_USERS.items():
-        if data["addr"] == address:
-            return user
-    return None
-
-def cleanup_inactive_users():
-    # remove usuarios que nao enviaram mensagens recentemente
-    current_time = time.time()
-    inactive_users = []
-    
-    for username, data in ACTIVE_USERS.items():
-        if current_time - data["last_activity"] > CLIENT_TIMEOUT:
-            inactive_users.append(username)
-    
-    for username in inactive_users:
-        print(f"Removendo usuario inativo: {username}")
-        if username in ACTIVE_USERS:
-            del ACTIVE_USERS[username]
-        # limpa listas de amigos que continham o usuario
-        for user in FRIEND_LISTS:
-            FRIEND_LISTS[user].discard(username)
-        # remove votacoes relacionadas ao usuario
-        if username in BAN_VOTES:
-            del BAN_VOTES[username]
-    
-    # agenda proxima verificacao
-    timer = Timer(10.0, cleanup_inactive_users)
-    timer.daemon = True
-    timer.start()
+    # encontra um nome de usuario com base em seu endereco, em o(1).
+    session = REGISTRY.by_address(address)
+    return session.name if session else None
+
+def expire_inactive_user(key):
+    # chamado pela roda de timers quando o usuario passa CLIENT_TIMEOUT sem enviar nada
+    username = key[1]
+    print(f"Removendo usuario inativo: {username}")
+    remove_user(username)
+
+def expire_ban_vote(key):
+    # a votacao nao atingiu a maioria a tempo
+    target_user = key[1]
+    if BAN_VOTES.pop(target_user, None) is not None:
+        broadcast_message(None, f"servidor: votacao para banir [{target_user}] expirou.")
+
+def response_address(client_address):
+    # o cliente recebe as respostas na porta seguinte a de onde envia os comandos
+    return (client_address[0], client_address[1] + 1)
+
+def remove_user(username, farewell=None):
+    # apaga o usuario e suas amizades (nos dois sentidos) em o(grau)
+    session = REGISTRY.remove(username)
+    TIMERS.cancel(("inativo", username))
+    # remove votacoes relacionadas ao usuario
+    if BAN_VOTES.pop(username, None) is not None:
+        TIMERS.cancel(("ban", username))
+    if session is not None:
+        # descarta o que ainda estava na fila para ele e o estado rdt de envio;
+        # so a ultima resposta (farewell), se houver, ainda e entregue
+        if farewell is not None:
+            farewell = prepare_message(farewell, codec=session.codec, accept=session.codec)
+        FANOUT.forget(response_address(session.addr), farewell)
+    return session
+
+def run_timers():
+    # avanca a roda de timers a cada tick (modo threads)
+    while True:
+        time.sleep(TIMER_TICK)
+        TIMERS.advance()
 
 def send_response(sock, message, client_address):
     # envia uma resposta para um cliente especifico.
-    response_addr = (client_address[0], client_address[1] + 1)
-    send_data(sock, message, response_addr, {'num': 0})
+    # a mensagem entra na fila de saida do cliente e e transmitida em paralelo
+    # com as dos outros clientes, sem bloquear quem chamou. ela e comprimida
+    # com o algoritmo combinado com o cliente (mensagens ja preparadas passam direto)
+    session = REGISTRY.by_address(client_address)
+    codec = session.codec if session else NONE
+    FANOUT.enqueue(response_address(client_address), prepare_message(message, codec=codec, accept=codec))
+
+def evict_slow_client(response_addr):
+    # politica evict: a fila do cliente encheu, entao ele e removido da sala
+    username = get_user_by_address((response_addr[0], response_addr[1] - 1))
+    if username:
+        print(f"Removendo usuario lento: {username}")
+        remove_user(username)
+        # o aviso sai no proximo tick da roda, nao daqui: estamos dentro do laco de
+        # um broadcast que ainda nao chegou aos outros, e um broadcast aninhado
+        # poderia encher outras filas e remover mais usuarios, um nivel a mais por vez
+        TIMERS.schedule(("lento", username), 0, announce_slow_client)
+
+def announce_slow_client(key):
+    # avisa a sala depois que o broadcast que encheu a fila terminou
+    broadcast_message(None, f"servidor: {key[1]} foi removido da sala (conexao lenta).")
 
 def broadcast_message(sock, message, sender_name=None):
     # envia uma mensagem para todos os usuarios conectados.
-    server_time = datetime.datetime.now().strftime("%H:%M:%S %d/%m/%Y")
-    
-    for user, data in ACTIVE_USERS.items():
+    # a versao com a tag [amigo] e montada uma unica vez, nao por destinatario
+    friend_message = message
+    if sender_name:
+        parts = message.split(":", 2)
+        if len(parts) == 3:
+            # adiciona a tag [amigo] conforme requisito
+            friend_message = f"{parts[0]}:[ amigo ] {parts[1]}: {parts[2]}"
+
+    # cada versao (com ou sem a tag, e por algoritmo de compressao) e codificada,
+    # comprimida e enquadrada uma unica vez para todos os destinatarios
+    prepared = {}  # {(mensagem, algoritmo): mensagem preparada}
+
+    # quem tem o remetente como amigo, direto do indice reverso
+    followers = REGISTRY.followers_of(sender_name) if sender_name else set()
+    METRICS.incr("chat.broadcasts")
+
+    for session in REGISTRY.sessions():
         # se um remetente e especificado, nao envia de volta para ele
-        if sender_name and sender_name == user:
+        if sender_name and sender_name == session.name:
             continue
 
         # personaliza a mensagem se for de um amigo
-        final_message = message
-        if sender_name and sender_name in FRIEND_LISTS.get(user, set()):
-            # adiciona a tag [amigo] conforme requisito
-            parts = message.split(":", 2)
-            final_message = f"{parts[0]}:[ amigo ] {parts[1]}: {parts[2]}"
+        final_message = friend_message if session.name in followers else message
+        key = (final_message, session.codec)
+        if key not in prepared:
+            prepared[key] = prepare_message(final_message, codec=session.codec, accept=session.codec)
         
-        send_response(sock, final_message, data["addr"])
+        send_response(sock, prepared[key], session.addr)
 
 # logica de tratamento de comandos   
-def handle_connect(sock, command_parts, client_address):
+def handle_connect(sock, command_parts, client_address, requested_codec=NONE):
     username = " ".join(command_parts[4:])
-    if username in ACTIVE_USERS:
-        send_response(sock, f"erro: nome de usuario '{username}' ja esta em uso.", client_address)
+    session = REGISTRY.add(username, client_address, seq_num=1)
+    if session is None:
+        current = get_user_by_address(client_address)
+        if current is not None:
+            # o prefixo e o mesmo do nome em uso, que os clientes ja reconhecem como recusa
+            send_response(sock, f"erro: nome de usuario '{username}' recusado: este endereco ja "
+                                f"esta conectado como '{current}'.", client_address)
+        else:
+            send_response(sock, f"erro: nome de usuario '{username}' ja esta em uso.", client_address)
     else:
-        ACTIVE_USERS[username] = {"addr": client_address, "seq_num": 1, "last_activity": time.time()}
-        FRIEND_LISTS[username] = set()
+        # o cliente anuncia no pedido o algoritmo que aceita; a resposta (e o que
+        # vier depois) usa esse algoritmo e o confirma nas flags, se o servidor puder usa-lo
+        session.codec = negotiate_codec(requested_codec, ALLOWED_CODECS)
+        print(f"{username}: compressao {codec_name(session.codec)}")
+        TIMERS.schedule(("inativo", username), CLIENT_TIMEOUT, expire_inactive_user)
         send_response(sock, f"conexao aceita: {username}", client_address)
         broadcast_message(sock, f"servidor: {username} entrou na sala.", sender_name=username)
 
 def handle_disconnect(sock, username, client_address):
-    if username in ACTIVE_USERS:
-        del ACTIVE_USERS[username]
-        # limpa listas de amigos que continham o usuario
-        for user in FRIEND_LISTS:
-            FRIEND_LISTS[user].discard(username)
-        send_response(sock, "voce foi desconectado.", client_address)
+    if remove_user(username, farewell="voce foi desconectado."):
         broadcast_message(sock, f"servidor: {username} saiu da sala.")
 
 def handle_list_users(sock, client_address):
-    user_list = "usuarios conectados:\n" + "\n".join(f"- {user}" for user in ACTIVE_USERS)
+    user_list = "usuarios conectados:\n" + "\n".join(f"- {user}" for user in REGISTRY.names())
     send_response(sock, user_list, client_address)
 
 def handle_list_friends(sock, username, client_address):
-    friends = FRIEND_LISTS.get(username, set())
+    friends = REGISTRY.friends_of(username)
     if not friends:
         send_response(sock, "voce nao tem amigos na sua lista.", client_address)
     else:
@@ -105,33 +167,35 @@ def handle_list_friends(sock, username, client_address):
 
 def handle_add_friend(sock, username, args, client_address):
     friend_to_add = args[0]
-    if friend_to_add not in ACTIVE_USERS:
+    if friend_to_add not in REGISTRY:
         send_response(sock, f"erro: usuario '{friend_to_add}' nao encontrado ou offline.", client_address)
     elif friend_to_add == username:
         send_response(sock, "erro: voce nao pode adicionar a si mesmo.", client_address)
-    else:
-        FRIEND_LISTS[username].add(friend_to_add)
+    elif REGISTRY.add_friend(username, friend_to_add):
         send_response(sock, f"voce adicionou '{friend_to_add}' a sua lista de amigos.", client_address)
+    else:
+        # um dos dois saiu da sala entre a verificacao e a insercao: toda requisicao tem resposta
+        send_response(sock, f"erro: usuario '{friend_to_add}' nao encontrado ou offline.", client_address)
 
 def handle_remove_friend(sock, username, args, client_address):
     friend_to_remove = args[0]
-    if friend_to_remove in FRIEND_LISTS.get(username, set()):
-        FRIEND_LISTS[username].remove(friend_to_remove)
+    if REGISTRY.remove_friend(username, friend_to_remove):
         send_response(sock, f"voce removeu '{friend_to_remove}' da sua lista de amigos.", client_address)
     else:
         send_response(sock, f"erro: '{friend_to_remove}' nao esta na sua lista de amigos.", client_address)
 
 def handle_ban(sock, voter, args, client_address):
     target_user = args[0]
-    if target_user not in ACTIVE_USERS:
+    if target_user not in REGISTRY:
         send_response(sock, f"erro: usuario '{target_user}' nao esta na sala.", client_address)
         return
     
-    required_votes = (len(ACTIVE_USERS) // 2) + 1
+    required_votes = (len(REGISTRY) // 2) + 1
 
     # inicia uma nova votacao se nao existir
     if target_user not in BAN_VOTES:
         BAN_VOTES[target_user] = {"voters": set(), "required": required_votes}
+        TIMERS.schedule(("ban", target_user), BAN_VOTE_TIMEOUT, expire_ban_vote)
     
     # adiciona voto
     BAN_VOTES[target_user]["voters"].add(voter)
@@ -143,9 +207,31 @@ def handle_ban(sock, voter, args, client_address):
     # verifica se o banimento foi atingido
     if current_votes >= required_votes:
         broadcast_message(sock, f"servidor: [{target_user}] foi banido da sala por votacao.")
-        target_address = ACTIVE_USERS[target_user]["addr"]
-        handle_disconnect(sock, target_user, target_address)
-        del BAN_VOTES[target_user]
+        target_session = REGISTRY.get(target_user)
+        if target_session:
+            handle_disconnect(sock, target_user, target_session.addr)
+        BAN_VOTES.pop(target_user, None)
+        TIMERS.cancel(("ban", target_user))
+
+def handle_stats(sock, client_address):
+    # metricas do servidor em texto; so para clientes na propria maquina do servidor
+    if not ipaddress.ip_address(client_address[0]).is_loopback:
+        send_response(sock, "erro: o comando stats so e aceito de clientes locais.", client_address)
+        return
+    send_response(sock, "metricas do servidor:\n" + METRICS.format(), client_address)
+
+def register_gauges(main_socket, endpoint=None):
+    # medidores lidos so quando alguem pede as metricas (stats ou --stats)
+    METRICS.gauge("usuarios.conectados", lambda: len(REGISTRY))
+    METRICS.gauge("votacoes.abertas", lambda: len(BAN_VOTES))
+    METRICS.gauge("fanout.fila", lambda: FANOUT.depth())
+    METRICS.gauge("fanout.em_transito", lambda: len(FANOUT.busy))
+    METRICS.gauge("fanout.descartadas", lambda: FANOUT.dropped)
+    METRICS.gauge("fanout.removidos", lambda: FANOUT.evicted)
+    METRICS.gauge("socket.envios_na_fila", lambda: len(main_socket.outbox))
+    if endpoint is not None:
+        METRICS.gauge("async.destinos", lambda: len(endpoint.sessions))
+        METRICS.gauge("async.fila_envio", lambda: sum(len(session.queue) for session in list(endpoint.sessions.values())))
 
 def handle_chat_message(sock, username, message, client_address):
     user_ip, user_port = client_address
@@ -154,56 +240,79 @@ def handle_chat_message(sock, username, message, client_address):
     formatted_message = f"{user_ip}:{user_port}/~{username}: {message} {server_time}"
     broadcast_message(sock, formatted_message, sender_name=username)
 
+# tratamento de uma requisicao (comum aos modos threads e asyncio)
+def process_request(sock, data, client_address):
+    session = REGISTRY.by_address(client_address)
+    username = session.name if session else None
+    expected_seq_num = session.seq_num if session else 0
+    
+    peer = {}
+    raw_command = receive_data(sock, data, client_address, {'num': expected_seq_num}, peer=peer)
+    if not raw_command:
+        return
+
+    # atualiza timestamp de atividade para usuarios conhecidos
+    if session:
+        session.seq_num = 1 - expected_seq_num
+        session.last_activity = time.time()
+        TIMERS.rearm(("inativo", username), CLIENT_TIMEOUT)
+
+    command_str = raw_command.decode('utf-8')
+    parts = command_str.split(' ')
+    command = parts[0].lower()
+
+    # tratamento de comandos (cada tipo com seu contador e seu histograma de tempo de tratamento)
+    started = time.perf_counter()
+    kind = command
+    if command_str.lower().startswith("hi, meu nome eh"):
+        kind = "hi"
+        handle_connect(sock, parts, client_address, peer.get('aceita', NONE))
+    elif not username:
+        kind = "sem_conexao"
+        send_response(sock, "erro: comando invalido. conecte-se primeiro.", client_address)
+    elif command == "stats":
+        handle_stats(sock, client_address)
+    elif command == "bye":
+        handle_disconnect(sock, username, client_address)
+    elif command == "list":
+        handle_list_users(sock, client_address)
+    elif command == "mylist":
+        handle_list_friends(sock, username, client_address)
+    elif command == "addtomylist" and len(parts) > 1:
+        handle_add_friend(sock, username, parts[1:], client_address)
+    elif command == "rmvfrommylist" and len(parts) > 1:
+        handle_remove_friend(sock, username, parts[1:], client_address)
+    elif command == "ban" and len(parts) > 1:
+        handle_ban(sock, username, parts[1:], client_address)
+    else:
+        # se nao for um comando, e uma mensagem de chat
+        kind = "chat"
+        handle_chat_message(sock, username, command_str, client_address)
+    METRICS.incr(f"comando.{kind}")
+    METRICS.observe(f"comando.{kind}", time.perf_counter() - started)
+
 # thread de tratamento de cliente
 def handle_client_request(data, client_address, thread_port):
     with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as thread_socket:
         thread_socket.bind((HOST, thread_port))
+        process_request(thread_socket, data, client_address)
 
-        username = get_user_by_address(client_address)
-        expected_seq_num = ACTIVE_USERS.get(username, {}).get("seq_num", 0)
-        
-        raw_command = receive_data(thread_socket, data, client_address, {'num': expected_seq_num})
-        if not raw_command:
-            return
-
-        # atualiza timestamp de atividade para usuarios conhecidos
-        if username in ACTIVE_USERS:
-            ACTIVE_USERS[username]["seq_num"] = 1 - expected_seq_num
-            ACTIVE_USERS[username]["last_activity"] = time.time()
-
-        command_str = raw_command.decode('utf-8')
-        parts = command_str.split(' ')
-        command = parts[0].lower()
-
-        # tratamento de comandos
-        if command_str.lower().startswith("hi, meu nome eh"):
-            handle_connect(thread_socket, parts, client_address)
-        elif not username:
-            send_response(thread_socket, "erro: comando invalido. conecte-se primeiro.", client_address)
-        elif command == "bye":
-            handle_disconnect(thread_socket, username, client_address)
-        elif command == "list":
-            handle_list_users(thread_socket, client_address)
-        elif command == "mylist":
-            handle_list_friends(thread_socket, username, client_address)
-        elif command == "addtomylist" and len(parts) > 1:
-            handle_add_friend(thread_socket, username, parts[1:], client_address)
-        elif command == "rmvfrommylist" and len(parts) > 1:
-            handle_remove_friend(thread_socket, username, parts[1:], client_address)
-        elif command == "ban" and len(parts) > 1:
-            handle_ban(thread_socket, username, parts[1:], client_address)
-        else:
-            # se nao for um comando, e uma mensagem de chat
-            handle_chat_message(thread_socket, username, command_str, client_address)
+def start_server(policy=POLICY_DROP_OLDEST, max_queue=DEFAULT_MAX_QUEUE,
+                 rcvbuf=DEFAULT_RCVBUF, sndbuf=DEFAULT_SNDBUF, dupacks=DUPACK_THRESHOLD):
+    # cria o socket principal do servidor e entra no loop de escuta (uma thread por datagrama).
+    global FANOUT
+    transmitter = ThreadPoolTransmitter(HOST, rcvbuf=rcvbuf, sndbuf=sndbuf, dupacks=dupacks)
+    FANOUT = FanoutEngine(transmitter, max_queue, policy, on_evict=evict_slow_client,
+                          release=transmitter.forget)
 
-def start_server():
-    # cria o socket principal do servidor e entra no loop de escuta.
-    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as main_socket:
+    # rajadas de clientes sao lidas em lote; o buffer maior segura o que chega enquanto isso
+    with BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), rcvbuf, sndbuf) as main_socket:
         main_socket.bind((HOST, MAIN_PORT))
+        register_gauges(main_socket)
         print(f"servidor de chat iniciado em {HOST}:{MAIN_PORT}. aguardando conexoes...")
         
-        # inicia o timer de limpeza de usuarios inativos
-        cleanup_inactive_users()
+        # inicia a roda de timers (inatividade e votacoes)
+        Thread(target=run_timers, daemon=True).start()
         
         thread_port_counter = 0
         while True:
@@ -218,5 +327,69 @@ def start_server():
                 print("\nservidor esta desligando.")
                 break
 
+def tick_timers(loop):
+    # avanca a roda de timers no proprio loop e agenda o proximo tick (modo asyncio)
+    TIMERS.advance()
+    loop.call_later(TIMER_TICK, tick_timers, loop)
+
+async def serve_async(policy, max_queue, rcvbuf=DEFAULT_RCVBUF, sndbuf=DEFAULT_SNDBUF,
+                      dupacks=DUPACK_THRESHOLD):
+    # um unico socket e um unico loop atendem todas as sessoes
+    global FANOUT
+    loop = asyncio.get_running_loop()
+    main_socket = BatchedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM), rcvbuf, sndbuf)
+    main_socket.bind((HOST, MAIN_PORT))
+    endpoint = AsyncRdtEndpoint(process_request, dupacks)
+    detach = attach_batched_socket(loop, main_socket, endpoint)
+    FANOUT = FanoutEngine(endpoint.send_message_to, max_queue, policy,
+                          on_evict=evict_slow_client, can_block=False, release=endpoint.forget)
+    register_gauges(main_socket, endpoint)
+    print(f"servidor de chat (asyncio) iniciado em {HOST}:{MAIN_PORT}. aguardando conexoes...")
+    tick_timers(loop)
+    try:
+        await asyncio.Future()  # roda ate ser interrompido
+    finally:
+        detach()
+
+def start_async_server(policy=POLICY_DROP_OLDEST, max_queue=DEFAULT_MAX_QUEUE,
+                       rcvbuf=DEFAULT_RCVBUF, sndbuf=DEFAULT_SNDBUF, dupacks=DUPACK_THRESHOLD):
+    try:
+        asyncio.run(serve_async(policy, max_queue, rcvbuf, sndbuf, dupacks))
+    except KeyboardInterrupt:
+        print("\nservidor esta desligando.")
+
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="servidor do chat de infracom")
+    parser.add_argument("--modo", choices=["async", "threads"], default="async",
+                        help="async = um socket e um loop de eventos; threads = uma thread por datagrama")
+    parser.add_argument("--politica", choices=POLICIES, default=POLICY_DROP_OLDEST,
+                        help="o que fazer quando a fila de saida de um cliente lento enche")
+    parser.add_argument("--fila", type=int, default=DEFAULT_MAX_QUEUE,
+                        help="mensagens pendentes por cliente antes de aplicar a politica")
+    parser.add_argument("--rcvbuf", type=int, default=DEFAULT_RCVBUF,
+                        help="SO_RCVBUF pedido para os sockets do servidor, em bytes")
+    parser.add_argument("--sndbuf", type=int, default=DEFAULT_SNDBUF,
+                        help="SO_SNDBUF pedido para os sockets do servidor, em bytes")
+    parser.add_argument("--compressao", nargs="+", choices=list(CODEC_NAMES),
+                        default=[codec_name(codec) for codec in sorted(available())],
+                        help="algoritmos de compressao que o servidor aceita usar (padrao: todos os disponiveis)")
+    parser.add_argument("--porta", type=int, default=MAIN_PORT,
+                        help="porta principal (outra que nao a 5000 para os clientes passarem pelo net_emulator.py)")
+    parser.add_argument("--dupacks", type=int, default=DUPACK_THRESHOLD,
+                        help="acks repetidos que disparam a retransmissao rapida, sem esperar o timeout")
+    parser.add_argument("--stats", type=int, default=None,
+                        help="porta de administracao (http, so em 127.0.0.1) que devolve as metricas em json")
+    args = parser.parse_args()
+    unavailable = [name for name in args.compressao if CODEC_NAMES[name] not in available()]
+    if unavailable:
+        parser.error(f"compressao indisponivel neste python: {', '.join(unavailable)}")
+    ALLOWED_CODECS = {NONE} | {CODEC_NAMES[name] for name in args.compressao}
+    MAIN_PORT = args.porta
+    if args.stats:
+        serve_http(args.stats)
+        print(f"metricas em http://127.0.0.1:{args.stats}/")
+
+    if args.modo == "threads":
+        start_server(args.politica, args.fila, args.rcvbuf, args.sndbuf, args.dupacks)
+    else:
+        start_async_server(args.politica, args.fila, args.rcvbuf, args.sndbuf, args.dupacks)
@@ -0,0 +1,186 @@
+import asyncio
+import time
+import unittest
+
+import server_chat
+from async_rdt import AsyncRdtEndpoint
+from fanout import POLICY_EVICT, FanoutEngine, ThreadPoolTransmitter
+from rdt_protocol import FRAGMENT_WINDOW, ack_key, make_ack
+from timer_wheel import TimerWheel
+from user_registry import UserRegistry
+
+CLIENT = ("127.0.0.1", 40000)
+RESPONSES = server_chat.response_address(CLIENT)
+OTHER = ("127.0.0.1", 40010)
+
+
+class FakeTransport:
+    # guarda os datagramas em vez de envia-los
+
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data, address):
+        self.sent.append((data, address))
+
+
+class RemoveUserTest(unittest.TestCase):
+    # um usuario que sai da sala nao deixa fila nem sessao rdt para tras
+
+    def setUp(self):
+        self.saved = (server_chat.REGISTRY, server_chat.FANOUT, server_chat.TIMERS)
+        self.loop = asyncio.new_event_loop()
+        self.endpoint = AsyncRdtEndpoint(lambda *args: None)
+        self.endpoint.loop = self.loop
+        self.endpoint.transport = FakeTransport()
+        server_chat.REGISTRY = UserRegistry()
+        server_chat.TIMERS = TimerWheel(server_chat.TIMER_TICK)
+        server_chat.FANOUT = FanoutEngine(self.endpoint.send_message_to, can_block=False,
+                                          release=self.endpoint.forget)
+        server_chat.REGISTRY.add("ana", CLIENT)
+        # o cliente nao confirma nada: a primeira mensagem fica em transito e as outras na fila
+        for number in range(5):
+            server_chat.send_response(None, f"mensagem {number}", CLIENT)
+
+    def tearDown(self):
+        self.loop.close()
+        server_chat.REGISTRY, server_chat.FANOUT, server_chat.TIMERS = self.saved
+
+    def test_queued_messages_before_logout(self):
+        self.assertEqual(server_chat.FANOUT.pending(RESPONSES), 4)
+        self.assertIn(RESPONSES, self.endpoint.sessions)
+
+    def test_expired_user_leaves_no_queue_or_session(self):
+        session = self.endpoint.sessions[RESPONSES]
+        timers = [state[3] for state in session.in_flight.values()]
+        server_chat.expire_inactive_user(("inativo", "ana"))
+        self.assertNotIn(RESPONSES, server_chat.FANOUT.queues)
+        self.assertNotIn(RESPONSES, server_chat.FANOUT.busy)
+        self.assertNotIn(RESPONSES, self.endpoint.sessions)
+        self.assertTrue(timers and all(timer.cancelled() for timer in timers))
+
+    def test_bye_sends_only_the_reply_then_forgets(self):
+        server_chat.handle_disconnect(None, "ana", CLIENT)
+        # o que estava na fila foi descartado; so a resposta do bye esta em transito
+        self.assertEqual(server_chat.FANOUT.pending(RESPONSES), 0)
+        session = self.endpoint.sessions[RESPONSES]
+        self.assertFalse(session.queue)
+        farewell, address = self.endpoint.transport.sent[-1]
+        self.assertEqual(address, RESPONSES)
+        self.assertIn(b"voce foi desconectado.", farewell)
+
+        # o cliente confirma a resposta: a fila e a sessao somem
+        connection_id, sequence, message_id = ack_key(farewell)
+        ack = make_ack(sequence, connection_id, message_id, window=FRAGMENT_WINDOW)
+        self.endpoint.datagram_received(ack, RESPONSES)
+        self.assertNotIn(RESPONSES, server_chat.FANOUT.queues)
+        self.assertNotIn(RESPONSES, server_chat.FANOUT.busy)
+        self.assertNotIn(RESPONSES, self.endpoint.sessions)
+
+
+class EvictSlowClientTest(unittest.TestCase):
+    # o aviso de remocao de um cliente lento so sai depois do broadcast em curso
+
+    def setUp(self):
+        self.saved = (server_chat.REGISTRY, server_chat.FANOUT, server_chat.TIMERS)
+        self.sent = []  # nada e confirmado: cada destino fica com uma mensagem em transito
+        server_chat.REGISTRY = UserRegistry()
+        server_chat.TIMERS = TimerWheel(server_chat.TIMER_TICK)
+        server_chat.FANOUT = FanoutEngine(lambda address, message, done: self.sent.append((address, message)),
+                                          max_queue=1, policy=POLICY_EVICT,
+                                          on_evict=server_chat.evict_slow_client)
+        server_chat.REGISTRY.add("ana", CLIENT)
+        server_chat.REGISTRY.add("bia", OTHER)
+        # a fila de ana fica cheia
+        server_chat.send_response(None, "mensagem 0", CLIENT)
+        server_chat.send_response(None, "mensagem 1", CLIENT)
+
+    def tearDown(self):
+        server_chat.REGISTRY, server_chat.FANOUT, server_chat.TIMERS = self.saved
+
+    def received(self, address):
+        return [b"".join(message) for destination, message in self.sent if destination == address]
+
+    def test_notice_follows_the_broadcast(self):
+        others = server_chat.response_address(OTHER)
+        server_chat.broadcast_message(None, "carlos: oi")
+        self.assertNotIn("ana", server_chat.REGISTRY)
+        self.assertEqual(len(self.received(others)), 1)
+        self.assertIn(b"carlos: oi", self.received(others)[0])
+
+        # a mensagem de bia ainda nao foi confirmada: o aviso espera na fila dela
+        server_chat.TIMERS.advance(time.monotonic() + server_chat.TIMER_TICK * 2)
+        self.assertEqual(server_chat.FANOUT.pending(others), 1)
+        notice = b"".join(server_chat.FANOUT.queues[others][0])
+        self.assertIn(b"ana foi removido da sala", notice)
+
+
+class FanoutEngineTest(unittest.TestCase):
+
+    def test_queue_drains_in_order(self):
+        sent = []
+        fanout = FanoutEngine(lambda address, message, done: sent.append((message, done)))
+        for message in ("a", "b", "c"):
+            fanout.enqueue(RESPONSES, message)
+        # cada confirmacao libera a proxima mensagem da fila
+        while len(sent) < 3:
+            sent[-1][1](True)
+        sent[-1][1](True)
+        self.assertEqual([message for message, _ in sent], ["a", "b", "c"])
+        self.assertNotIn(RESPONSES, fanout.queues)
+        self.assertNotIn(RESPONSES, fanout.busy)
+
+
+class UserRegistryTest(unittest.TestCase):
+
+    def test_second_name_on_the_same_address_is_refused(self):
+        registry = UserRegistry()
+        first = registry.add("ana", CLIENT)
+        self.assertIsNone(registry.add("bia", CLIENT))
+        self.assertNotIn("bia", registry)
+        # a primeira sessao continua alcancavel pelo endereco (para enviar e dar bye)
+        self.assertIs(registry.by_address(CLIENT), first)
+        registry.remove("ana")
+        self.assertIsNotNone(registry.add("bia", CLIENT))
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def test_cancel_during_rearm_is_kept(self):
+        wheel = TimerWheel(server_chat.TIMER_TICK, now=0)
+        wheel.schedule(("inativo", "ana"), 10, lambda key: None)
+        lock = wheel._lock
+
+        class CancelOnRelease:
+            # solta o lock e cancela a chave logo depois, como outra thread faria
+            def __enter__(self):
+                lock.acquire()
+
+            def __exit__(self, *exc):
+                lock.release()
+                wheel._lock = lock
+                wheel.cancel(("inativo", "ana"))
+
+        wheel._lock = CancelOnRelease()
+        wheel.rearm(("inativo", "ana"), 10)
+        self.assertNotIn(("inativo", "ana"), wheel)
+        self.assertEqual(wheel.advance(100), 0)
+
+
+class ThreadPoolTransmitterTest(unittest.TestCase):
+
+    def test_forget_drops_rtt_and_window(self):
+        transmitter = ThreadPoolTransmitter("127.0.0.1", workers=1)
+        try:
+            transmitter.rto[RESPONSES] = object()
+            transmitter.cc[RESPONSES] = object()
+            transmitter.forget(RESPONSES)
+            transmitter.forget(RESPONSES)  # esquecer duas vezes nao e erro
+            self.assertNotIn(RESPONSES, transmitter.rto)
+            self.assertNotIn(RESPONSES, transmitter.cc)
+        finally:
+            transmitter.pool.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
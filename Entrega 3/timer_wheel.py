@@ -0,0 +1,93 @@
+import math
+import threading
+import time
+
+DEFAULT_TICK = 0.5    # resolucao da roda em segundos
+DEFAULT_SLOTS = 512   # 512 x 0.5 s cobre 256 s sem dar mais de uma volta
+
+
+class TimerWheel:
+    """
+    roda de temporizadores (hashed timing wheel) para prazos de expiracao.
+
+    cada chave fica no slot do tick em que vence, entao agendar, reagendar a
+    cada atividade e cancelar custam o(1). avancar a roda so visita os slots
+    dos ticks que passaram; enquanto os prazos couberem em uma volta
+    (tick x slots), so as entradas que realmente venceram sao tocadas. as
+    chaves e callbacks sao livres, entao a mesma roda serve para inatividade
+    de sessoes, votacoes de banimento ou prazos de retransmissao (com um tick
+    menor).
+    """
+
+    def __init__(self, tick=DEFAULT_TICK, slots=DEFAULT_SLOTS, now=None):
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [{} for _ in range(slots)]  # slot: {chave: [tick de vencimento, callback]}
+        self._where = {}                          # {chave: indice do slot}
+        self._current = self._tick_of(time.monotonic() if now is None else now)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _tick_of(self, instant):
+        return int(instant / self.tick)
+
+    def schedule(self, key, delay, callback):
+        # agenda callback(key) para daqui a delay segundos, substituindo um prazo anterior
+        with self._lock:
+            self._schedule_locked(key, delay, callback)
+
+    def rearm(self, key, delay):
+        # empurra o prazo de uma chave ja agendada (ex.: usuario enviou algo).
+        # ler o callback e reagendar sob o mesmo lock: um cancel no meio (usuario
+        # saindo por outra thread) nao pode ser desfeito pelo reagendamento
+        with self._lock:
+            slot = self._where.get(key)
+            if slot is None:
+                return False
+            self._schedule_locked(key, delay, self._wheel[slot][key][1])
+            return True
+
+    def _schedule_locked(self, key, delay, callback):
+        # chamado com self._lock em maos
+        ticks = max(1, math.ceil(delay / self.tick))
+        self._remove(key)
+        due = self._current + ticks
+        slot = due % self.slots
+        self._wheel[slot][key] = [due, callback]
+        self._where[key] = slot
+
+    def cancel(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._wheel[slot][key]
+        return True
+
+    def advance(self, now=None):
+        # processa os ticks ate agora e chama os callbacks vencidos (fora do lock)
+        target = self._tick_of(time.monotonic() if now is None else now)
+        expired = []
+        with self._lock:
+            # mais de uma volta inteira: basta visitar cada slot uma vez
+            first = max(self._current + 1, target - self.slots + 1)
+            for current in range(first, target + 1):
+                bucket = self._wheel[current % self.slots]
+                for key, (due, callback) in list(bucket.items()):
+                    if due <= target:
+                        del bucket[key]
+                        del self._where[key]
+                        expired.append((callback, key))
+            self._current = max(self._current, target)
+
+        for callback, key in expired:
+            callback(key)
+        return len(expired)
@@ -0,0 +1,109 @@
+import threading
+import time
+from compression import NONE
+
+
+class Session:
+    # estado de um usuario conectado
+    __slots__ = ("name", "addr", "seq_num", "last_activity", "codec")
+
+    def __init__(self, name, addr, seq_num=0):
+        self.name = name
+        self.addr = addr              # (ip, porta) de onde o cliente envia comandos
+        self.seq_num = seq_num        # proximo numero de sequencia esperado do cliente
+        self.last_activity = time.time()
+        self.codec = NONE             # algoritmo de compressao combinado com o cliente
+
+
+class UserRegistry:
+    """
+    usuarios conectados indexados por nome e por endereco, com listas de amigos.
+
+    alem de "quem sao os amigos de x" o registro mantem o indice reverso "quem
+    tem x como amigo", entao entrar, sair, buscar por endereco e marcar
+    [ amigo ] num broadcast custam o(1) ou o(grau), e nao o(usuarios). todas as
+    operacoes usam o mesmo lock, servindo tanto ao modo threads quanto ao asyncio.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_name = {}    # {nome: Session}
+        self._by_addr = {}    # {(ip, porta): nome}
+        self._friends = {}    # {nome: {amigos de nome}}
+        self._followers = {}  # {nome: {usuarios que tem nome como amigo}}
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, name):
+        return name in self._by_name
+
+    def add(self, name, addr, seq_num=0):
+        # retorna a sessao criada, ou none se o nome ou o endereco ja estiverem em
+        # uso (um segundo nome no mesmo endereco deixaria a primeira sessao sem
+        # como ser encontrada por by_address, recebendo broadcasts para sempre)
+        with self._lock:
+            if name in self._by_name or addr in self._by_addr:
+                return None
+            session = Session(name, addr, seq_num)
+            self._by_name[name] = session
+            self._by_addr[addr] = name
+            self._friends[name] = set()
+            self._followers[name] = set()
+            return session
+
+    def remove(self, name):
+        # remove o usuario e as arestas de amizade dele, em o(grau)
+        with self._lock:
+            session = self._by_name.pop(name, None)
+            if session is None:
+                return None
+            if self._by_addr.get(session.addr) == name:
+                del self._by_addr[session.addr]
+            for friend in self._friends.pop(name):
+                self._followers[friend].discard(name)
+            for follower in self._followers.pop(name):
+                self._friends[follower].discard(name)
+            return session
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    def by_address(self, addr):
+        with self._lock:
+            name = self._by_addr.get(addr)
+            return self._by_name.get(name) if name is not None else None
+
+    def names(self):
+        with self._lock:
+            return list(self._by_name)
+
+    def sessions(self):
+        # copia, para iterar sem segurar o lock durante os envios
+        with self._lock:
+            return list(self._by_name.values())
+
+    def add_friend(self, name, friend):
+        with self._lock:
+            if name not in self._by_name or friend not in self._by_name:
+                return False
+            self._friends[name].add(friend)
+            self._followers[friend].add(name)
+            return True
+
+    def remove_friend(self, name, friend):
+        with self._lock:
+            if friend not in self._friends.get(name, ()):
+                return False
+            self._friends[name].discard(friend)
+            self._followers[friend].discard(name)
+            return True
+
+    def friends_of(self, name):
+        with self._lock:
+            return set(self._friends.get(name, ()))
+
+    def followers_of(self, name):
+        # usuarios que devem ver a tag [ amigo ] nas mensagens de name
+        with self._lock:
+            return set(self._followers.get(name, ()))